@@ -1,18 +1,87 @@
 import os
 import sys
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context, g, has_request_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import IntegrityError, TimeoutError as SATimeoutError
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.orm.exc import StaleDataError
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
+import logging
 import uuid
 import time
 import random
 import io
+import hashlib
+import base64
+import unicodedata
+import re
+import csv
+import zipfile
+import tarfile
+from collections import OrderedDict
+import threading
+import math
+import itertools
+import functools
+import importlib
+import socket
+import click
+import gzip
+import mimetypes
+import wave
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+try:
+    import soundfile  # Optional: native FLAC (and OGG) decoding through libsndfile
+except ImportError:
+    soundfile = None
+
+try:
+    import orjson  # Optional: faster JSON encoding
+except ImportError:
+    orjson = None
+
+try:
+    import brotli  # Optional: brotli response compression
+except ImportError:
+    brotli = None
+
+# JSON responses: UTF-8 rather than \u escapes (Arabic text is half the size),
+# no key sorting or indentation, and orjson when it is installed
+class FastJSONProvider(DefaultJSONProvider):
+    ensure_ascii = False
+    sort_keys = False
+    compact = True
+    
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self.dumps_bytes(obj).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+    
+    def dumps_bytes(self, obj):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+    
+    # jsonify() always passes separators or indent to dumps(), so compact
+    # responses are serialised here to reach orjson
+    def response(self, *args, **kwargs):
+        indented = self.compact is False or (self.compact is None and self._app.debug)
+        if orjson is None or indented:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
 
 # Create Flask app
-app = Flask(__name__, static_folder='src/static', static_url_path='/')
+app = Flask(__name__, static_folder=None)  # src/static is served by serve() below
+app.json = FastJSONProvider(app)
 
 # Configuration
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
@@ -22,9 +91,570 @@ app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Connection pool of each process, per database. Size it from the db_pool_*
+# series on /metrics: workers x (size + overflow) must fit max_connections.
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 30))  # Seconds to wait for a free connection
+app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # Reconnect connections older than this
+app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+# Postgres cancels statements running longer than this many milliseconds (0: no limit)
+app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+# Optional read replica for the read-only endpoints marked with @use_replica
+app.config['DATABASE_REPLICA_URL'] = os.environ.get('DATABASE_REPLICA_URL')
+
+# Dataset archives sent to /api/songs/import may be far larger than single uploads.
+# The whole import runs in one request: the server's worker timeout must cover it,
+# and a client cut off by the timeout resumes by re-sending the same import_id.
+app.config['IMPORT_MAX_CONTENT_LENGTH'] = int(os.environ.get('IMPORT_MAX_CONTENT_LENGTH', 10 * 1024 * 1024 * 1024))  # 10GB
+
+# Generation result cache: in-process LRU size, and whether to fall back to
+# earlier results stored in generated_songs when the LRU misses
+app.config['GENERATION_CACHE_SIZE'] = int(os.environ.get('GENERATION_CACHE_SIZE', 1024))
+app.config['GENERATION_CACHE_PERSISTENT'] = os.environ.get('GENERATION_CACHE_PERSISTENT', '1') == '1'
+
+# Audio formats without a built-in decoder are piped through this command
+# (ffmpeg-compatible arguments) by the feature worker
+app.config['AUDIO_DECODER_COMMAND'] = os.environ.get('AUDIO_DECODER_COMMAND', 'ffmpeg')
+
+# The feature worker records near-duplicate pairs scoring DUPLICATE_THRESHOLD or
+# above for /api/songs/duplicates. Uploads can also be checked in the request,
+# from their first DUPLICATE_CHECK_BYTES: matches are flagged in the response
+# ('warn') or refused with 409 ('reject'). The default 'off' leaves it to the worker.
+app.config['DUPLICATE_ACTION'] = os.environ.get('DUPLICATE_ACTION', 'off')
+app.config['DUPLICATE_THRESHOLD'] = float(os.environ.get('DUPLICATE_THRESHOLD', 0.15))
+app.config['DUPLICATE_CHECK_BYTES'] = int(os.environ.get('DUPLICATE_CHECK_BYTES', 4 * 1024 * 1024))
+
+# Admission control per process and endpoint class: 'transfer' (uploads, imports,
+# audio and dataset downloads), 'stream' (server-sent event streams) or 'metadata'
+# (everything else). Each class admits up to CONCURRENCY requests holding at most
+# BYTES of request bodies, waiting up to QUEUE_SECONDS for room before answering
+# 503. Transfers queue; metadata requests and streams fail fast. Every open stream
+# holds a worker thread, so keep STREAM_CONCURRENCY below the threads per process.
+app.config['ADMISSION_TRANSFER_CONCURRENCY'] = int(os.environ.get('ADMISSION_TRANSFER_CONCURRENCY', 4))
+app.config['ADMISSION_TRANSFER_BYTES'] = int(os.environ.get('ADMISSION_TRANSFER_BYTES', 256 * 1024 * 1024))
+app.config['ADMISSION_TRANSFER_QUEUE_SECONDS'] = float(os.environ.get('ADMISSION_TRANSFER_QUEUE_SECONDS', 10))
+app.config['ADMISSION_METADATA_CONCURRENCY'] = int(os.environ.get('ADMISSION_METADATA_CONCURRENCY', 64))
+app.config['ADMISSION_METADATA_BYTES'] = int(os.environ.get('ADMISSION_METADATA_BYTES', 16 * 1024 * 1024))
+app.config['ADMISSION_METADATA_QUEUE_SECONDS'] = float(os.environ.get('ADMISSION_METADATA_QUEUE_SECONDS', 0.1))
+app.config['ADMISSION_STREAM_CONCURRENCY'] = int(os.environ.get('ADMISSION_STREAM_CONCURRENCY', 4))
+app.config['ADMISSION_STREAM_BYTES'] = int(os.environ.get('ADMISSION_STREAM_BYTES', 0))
+app.config['ADMISSION_STREAM_QUEUE_SECONDS'] = float(os.environ.get('ADMISSION_STREAM_QUEUE_SECONDS', 0))
+# Requests per client and endpoint class, as "<count>/<second|minute|hour>" (empty: no limit).
+# RATE_LIMIT_STORE names a shared store class as "module:Class"; the default is per process.
+app.config['RATE_LIMIT_TRANSFER'] = os.environ.get('RATE_LIMIT_TRANSFER', '60/minute')
+app.config['RATE_LIMIT_METADATA'] = os.environ.get('RATE_LIMIT_METADATA', '1200/minute')
+app.config['RATE_LIMIT_STREAM'] = os.environ.get('RATE_LIMIT_STREAM', '60/minute')
+app.config['RATE_LIMIT_STORE'] = os.environ.get('RATE_LIMIT_STORE')
+
+# JSON responses of at least COMPRESS_MIN_BYTES are sent brotli- or gzip-compressed
+# to clients that accept it
+app.config['COMPRESS_MIN_BYTES'] = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 5))  # gzip level and brotli quality
+
+# DATABASE CONNECTIONS
+# QueuePool that times every checkout, including waits for a free connection
+# and opening new ones. One subclass per database, so the label survives
+# the pool being recreated by engine.dispose().
+class TimedQueuePool(QueuePool):
+    database = 'primary'
+    
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except SATimeoutError:
+            metrics.add('db_pool_checkout_timeouts_total', database=self.database)
+            raise
+        finally:
+            metrics.observe('db_pool_checkout_seconds', time.perf_counter() - started, database=self.database)
+
+def engine_options(url, database):
+    if not url or make_url(url).database in (None, '', ':memory:'):
+        return {}  # In-memory SQLite keeps its single static connection
+    options = {
+        'poolclass': type(f'{database.title()}QueuePool', (TimedQueuePool,), {'database': database}),
+        'pool_size': app.config['DB_POOL_SIZE'],
+        'max_overflow': app.config['DB_MAX_OVERFLOW'],
+        'pool_timeout': app.config['DB_POOL_TIMEOUT'],
+        'pool_recycle': app.config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': app.config['DB_POOL_PRE_PING'],
+    }
+    if app.config['DB_STATEMENT_TIMEOUT_MS'] and make_url(url).get_backend_name() == 'postgresql':
+        options['connect_args'] = {'options': f"-c statement_timeout={app.config['DB_STATEMENT_TIMEOUT_MS']}"}
+    return options
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], 'primary')
+if app.config['DATABASE_REPLICA_URL']:
+    app.config['SQLALCHEMY_BINDS'] = {
+        'replica': {'url': app.config['DATABASE_REPLICA_URL'], **engine_options(app.config['DATABASE_REPLICA_URL'], 'replica')}
+    }
+
+# Sends the reads of a @use_replica request to the replica. Flushes and
+# INSERT/UPDATE/DELETE statements always go to the primary.
+class RoutingSession(FlaskSession):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and not getattr(clause, 'is_dml', False)
+            and has_request_context()
+            and g.get('use_replica')
+        ):
+            return self._db.engines['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+# Route a read-only endpoint's queries to the replica, when one is configured.
+# Replicas may lag, so endpoints that must see the caller's own writes stay off it.
+def use_replica(view):
+    @functools.wraps(view)
+    def read_from_replica(*args, **kwargs):
+        g.use_replica = bool(app.config['DATABASE_REPLICA_URL'])
+        return view(*args, **kwargs)
+    return read_from_replica
+
 # Initialize extensions
 CORS(app)
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+
+# LOGGING AND METRICS
+# Structured logs: one JSON object per line on stderr (LOG_FORMAT=text for
+# plain lines), with keyword fields passed through `extra`
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO')
+app.config['LOG_FORMAT'] = os.environ.get('LOG_FORMAT', 'json')
+# Requests slower than this many seconds are logged with the SQL they issued (off when unset)
+app.config['SLOW_REQUEST_SECONDS'] = float(os.environ['SLOW_REQUEST_SECONDS']) if os.environ.get('SLOW_REQUEST_SECONDS') else None
+
+class JsonLogFormatter(logging.Formatter):
+    STANDARD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+    
+    def format(self, record):
+        entry = {
+            'time': datetime.utcfromtimestamp(record.created).isoformat(timespec='milliseconds') + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in self.STANDARD_FIELDS})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+logger = logging.getLogger('zatta')
+log_handler = logging.StreamHandler()
+if app.config['LOG_FORMAT'] == 'json':
+    log_handler.setFormatter(JsonLogFormatter())
+else:
+    log_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+logger.addHandler(log_handler)
+logger.setLevel(app.config['LOG_LEVEL'].upper())
+logger.propagate = False
+
+# In-process metrics rendered in the Prometheus text format at /metrics. Each
+# web worker process keeps its own values.
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.definitions = {}  # name -> (kind, help, buckets)
+        self.values = {}  # name -> {labels: value, or [bucket counts, sum, count] for histograms}
+    
+    def define(self, name, kind, help_text, buckets=None):
+        self.definitions[name] = (kind, help_text, buckets)
+        self.values[name] = {}
+    
+    # Counters and gauges
+    def add(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values[name]
+            series[key] = series.get(key, 0) + value
+    
+    # Gauges read at scrape time
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values[name][tuple(sorted(labels.items()))] = value
+    
+    def observe(self, name, value, **labels):
+        buckets = self.definitions[name][2]
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values[name]
+            if key not in series:
+                series[key] = [[0] * len(buckets), 0.0, 0]
+            counts, total, count = series[key]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[index] += 1
+            series[key][1] = total + value
+            series[key][2] = count + 1
+    
+    def render(self):
+        def label_text(labels):
+            if not labels:
+                return ''
+            escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+            return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+        
+        lines = []
+        with self.lock:
+            for name, (kind, help_text, buckets) in self.definitions.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in sorted(self.values[name].items()):
+                    if kind != 'histogram':
+                        lines.append(f'{name}{label_text(labels)} {value}')
+                        continue
+                    counts, total, count = value
+                    for bound, bucket_count in zip(buckets, counts):
+                        lines.append(f'{name}_bucket{label_text(labels + (("le", bound),))} {bucket_count}')
+                    lines.append(f'{name}_bucket{label_text(labels + (("le", "+Inf"),))} {count}')
+                    lines.append(f'{name}_sum{label_text(labels)} {total}')
+                    lines.append(f'{name}_count{label_text(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+metrics = MetricsRegistry()
+metrics.define('http_requests_total', 'counter', 'Requests handled, by endpoint and status.')
+metrics.define('http_request_duration_seconds', 'histogram', 'Request latency, including streaming.', LATENCY_BUCKETS)
+metrics.define('http_response_size_bytes', 'histogram', 'Response body bytes sent.', SIZE_BUCKETS)
+metrics.define('http_requests_in_flight', 'gauge', 'Requests being handled or streamed.')
+metrics.define('http_request_db_queries', 'histogram', 'SQL statements issued per request.', QUERY_COUNT_BUCKETS)
+metrics.define('http_request_db_seconds', 'histogram', 'Time spent in SQL per request.', LATENCY_BUCKETS)
+metrics.define('db_pool_checkout_seconds', 'histogram', 'Time to get a pooled connection, waiting included.', LATENCY_BUCKETS)
+metrics.define('db_pool_checkout_timeouts_total', 'counter', 'Checkouts that gave up after DB_POOL_TIMEOUT.')
+metrics.define('db_pool_size', 'gauge', 'Connections the pool keeps open (DB_POOL_SIZE).')
+metrics.define('db_pool_checked_out', 'gauge', 'Connections in use.')
+metrics.define('db_pool_overflow', 'gauge', 'Connections open beyond the pool size.')
+
+# Pool utilization of this process, for each database
+def collect_pool_metrics():
+    for database, engine in db.engines.items():
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            database = database or 'primary'
+            metrics.set('db_pool_size', pool.size(), database=database)
+            metrics.set('db_pool_checked_out', pool.checkedout(), database=database)
+            metrics.set('db_pool_overflow', max(pool.overflow(), 0), database=database)
+
+# Per-request SQL accounting; statements outside a request are not counted
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    if has_request_context() and 'request_metrics' in g:
+        stats = g.request_metrics
+        stats['db_queries'] += 1
+        stats['db_seconds'] += elapsed
+        if stats['sql'] is not None:
+            stats['sql'].append({'sql': statement, 'seconds': round(elapsed, 6)})
+
+# Count the bytes of a streamed body as it is sent
+def count_streamed_bytes(body, stats):
+    for chunk in body:
+        stats['bytes'] += len(chunk)
+        yield chunk
+
+@app.before_request
+def start_request_metrics():
+    g.request_metrics = {
+        'started': time.perf_counter(),
+        'endpoint': request.url_rule.rule if request.url_rule else 'unmatched',
+        'db_queries': 0,
+        'db_seconds': 0.0,
+        'bytes': 0,
+        'sql': [] if app.config['SLOW_REQUEST_SECONDS'] is not None else None,
+    }
+    metrics.add('http_requests_in_flight', 1, endpoint=g.request_metrics['endpoint'])
+
+# Metrics are recorded when the response is closed, so streamed downloads and
+# event streams are measured to their last byte
+@app.after_request
+def finish_request_metrics(response):
+    stats = g.get('request_metrics')
+    if stats is None:
+        return response
+    method, path, status = request.method, request.path, response.status_code
+    if response.is_streamed:
+        response.response = count_streamed_bytes(response.response, stats)
+    else:
+        stats['bytes'] = response.calculate_content_length() or 0
+    
+    def finish():
+        elapsed = time.perf_counter() - stats['started']
+        endpoint = stats['endpoint']
+        metrics.add('http_requests_in_flight', -1, endpoint=endpoint)
+        metrics.add('http_requests_total', method=method, endpoint=endpoint, status=status)
+        metrics.observe('http_request_duration_seconds', elapsed, method=method, endpoint=endpoint)
+        metrics.observe('http_response_size_bytes', stats['bytes'], endpoint=endpoint)
+        metrics.observe('http_request_db_queries', stats['db_queries'], endpoint=endpoint)
+        metrics.observe('http_request_db_seconds', stats['db_seconds'], endpoint=endpoint)
+        
+        slow = app.config['SLOW_REQUEST_SECONDS']
+        if slow is not None and elapsed >= slow:
+            logger.warning('Slow request', extra={
+                'method': method, 'path': path, 'status': status, 'seconds': round(elapsed, 4),
+                'db_queries': stats['db_queries'], 'db_seconds': round(stats['db_seconds'], 4),
+                'response_bytes': stats['bytes'], 'sql': stats['sql']
+            })
+    
+    response.call_on_close(finish)
+    return response
+
+# ADMISSION CONTROL
+ADMISSION_CLASSES = ('transfer', 'metadata', 'stream')
+ADMISSION_RETRY_AFTER = 5  # Seconds suggested to clients turned away for lack of capacity
+RATE_LIMIT_WINDOWS = {'second': 1, 'minute': 60, 'hour': 3600}
+
+metrics.define('admission_in_flight', 'gauge', 'Requests admitted and not yet finished, by class.')
+metrics.define('admission_bytes_in_flight', 'gauge', 'Request body bytes of admitted requests, by class.')
+metrics.define('admission_wait_seconds', 'histogram', 'Time requests queued for admission.', LATENCY_BUCKETS)
+metrics.define('admission_rejected_total', 'counter', 'Requests turned away, by class and reason.')
+
+# Concurrency and request-body byte budget of one endpoint class
+class AdmissionPool:
+    def __init__(self, name, concurrency, max_bytes, queue_seconds):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_bytes = max_bytes
+        self.queue_seconds = queue_seconds
+        self.in_flight = 0
+        self.bytes = 0
+        self.condition = threading.Condition()
+    
+    # Wait up to queue_seconds for room; a body larger than the whole budget
+    # is charged as the whole budget, so it is admitted once the pool is empty
+    def acquire(self, size):
+        size = min(size, self.max_bytes)
+        deadline = time.monotonic() + self.queue_seconds
+        with self.condition:
+            while self.in_flight >= self.concurrency or self.bytes + size > self.max_bytes:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            self.in_flight += 1
+            self.bytes += size
+            self.report()
+        return size
+    
+    def release(self, size):
+        with self.condition:
+            self.in_flight -= 1
+            self.bytes -= size
+            self.report()
+            self.condition.notify_all()
+    
+    def report(self):
+        metrics.set('admission_in_flight', self.in_flight, endpoint_class=self.name)
+        metrics.set('admission_bytes_in_flight', self.bytes, endpoint_class=self.name)
+
+admission_pools = {
+    name: AdmissionPool(
+        name,
+        app.config[f'ADMISSION_{name.upper()}_CONCURRENCY'],
+        app.config[f'ADMISSION_{name.upper()}_BYTES'],
+        app.config[f'ADMISSION_{name.upper()}_QUEUE_SECONDS'],
+    ) for name in ADMISSION_CLASSES
+}
+
+# Fixed-window counters in this process. A shared store (e.g. Redis INCR with
+# EXPIRE) only needs the same incr(key, ttl) method to apply limits across workers.
+class MemoryRateLimitStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}  # key -> [count, expires_at]
+    
+    def incr(self, key, ttl):
+        now = time.monotonic()
+        with self.lock:
+            if len(self.counters) > 10000:
+                self.counters = {k: v for k, v in self.counters.items() if v[1] > now}
+            counter = self.counters.get(key)
+            if counter is None or counter[1] <= now:
+                counter = self.counters[key] = [0, now + ttl]
+            counter[0] += 1
+            return counter[0]
+
+def load_rate_limit_store(path):
+    if not path:
+        return MemoryRateLimitStore()
+    module_name, _, class_name = path.partition(':')
+    return getattr(importlib.import_module(module_name), class_name)()
+
+rate_limit_store = load_rate_limit_store(app.config['RATE_LIMIT_STORE'])
+
+# "<count>/<window>" -> (count, window seconds), or None for no limit
+def parse_rate_limit(text):
+    if not text:
+        return None
+    count, _, window = text.partition('/')
+    if window not in RATE_LIMIT_WINDOWS:
+        raise ValueError(f'Invalid rate limit {text!r}: use <count>/second, /minute or /hour')
+    return int(count), RATE_LIMIT_WINDOWS[window]
+
+rate_limits = {name: parse_rate_limit(app.config[f'RATE_LIMIT_{name.upper()}']) for name in ADMISSION_CLASSES}
+
+# Put a view in an endpoint class; None exempts it (health checks, metrics,
+# static files). Unmarked views are 'metadata'.
+# max_bytes caps what the view's request body is charged against the budget.
+def admission_class(name, max_bytes=None):
+    def mark(view):
+        view.admission_class = name
+        view.admission_max_bytes = max_bytes
+        return view
+    return mark
+
+def admission_rejected(endpoint_class, reason, status, error, retry_after):
+    metrics.add('admission_rejected_total', endpoint_class=endpoint_class, reason=reason)
+    response = jsonify({'success': False, 'error': error})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+# Runs before the body is read, so refused uploads cost no memory
+@app.before_request
+def admit_request():
+    view = app.view_functions.get(request.endpoint)
+    endpoint_class = getattr(view, 'admission_class', 'metadata')
+    if view is None or endpoint_class is None:
+        return None
+    
+    limit = rate_limits[endpoint_class]
+    if limit:
+        count, window = limit
+        now = time.time()
+        window_start = int(now // window) * window
+        hits = rate_limit_store.incr(f'rate:{endpoint_class}:{request.remote_addr}:{window_start}', window)
+        if hits > count:
+            return admission_rejected(endpoint_class, 'rate_limit', 429, 'Too many requests', window_start + window - now)
+    
+    pool = admission_pools[endpoint_class]
+    started = time.perf_counter()
+    size = request.content_length or 0
+    if request.content_length is None and 'chunked' in request.headers.get('Transfer-Encoding', '').lower():
+        size = app.config['MAX_CONTENT_LENGTH'] or pool.max_bytes  # Unknown length: charge the largest allowed body
+    max_bytes = getattr(view, 'admission_max_bytes', None)
+    if max_bytes is not None:
+        size = min(size, max_bytes)
+    charged = pool.acquire(size)
+    metrics.observe('admission_wait_seconds', time.perf_counter() - started, endpoint_class=endpoint_class)
+    if charged is None:
+        return admission_rejected(endpoint_class, 'capacity', 503, 'Server busy, try again shortly', ADMISSION_RETRY_AFTER)
+    g.admission = {'pool': pool, 'bytes': charged, 'released': False}
+    return None
+
+def release_admission(admission):
+    if not admission['released']:
+        admission['released'] = True
+        admission['pool'].release(admission['bytes'])
+
+# Streamed responses keep their slot until the last byte is sent
+@app.after_request
+def hand_off_admission(response):
+    admission = g.pop('admission', None)
+    if admission is not None:
+        response.call_on_close(lambda: release_admission(admission))
+    return response
+
+# Requests that end without a response object (unhandled errors) release here
+@app.teardown_request
+def release_unfinished_admission(exc):
+    admission = g.pop('admission', None)
+    if admission is not None:
+        release_admission(admission)
+
+@app.route('/metrics')
+@admission_class(None)
+def prometheus_metrics():
+    collect_pool_metrics()
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Audio is stored, uploaded and streamed in chunks of this size
+AUDIO_CHUNK_SIZE = 256 * 1024  # 256KB
+
+# List endpoints return pages of this many rows (clients may ask for up to MAX_PAGE_SIZE)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Columns the list endpoints can filter on
+LIST_FILTERS = ('maqam', 'style', 'emotion', 'region', 'poem_bahr')
+
+# Training runs in a separate worker process (`flask --app app training-worker`).
+# It reports progress at most every TRAINING_REPORT_SECONDS and a session whose
+# heartbeat is older than TRAINING_LEASE_SECONDS is reclaimed and resumed.
+TRAINING_REPORT_SECONDS = 1.0
+TRAINING_LEASE_SECONDS = 60
+TRAINING_STEP_SECONDS = float(os.environ.get('TRAINING_STEP_SECONDS', 0.05))
+ACTIVE_TRAINING_STATUSES = ('queued', 'training')
+
+# Dataset export reads songs in keyset pages of this many rows, and cuts
+# shards of DATASET_SHARD_SIZE songs by default
+DATASET_PAGE_SIZE = 100
+DATASET_SHARD_SIZE = 1000
+DATASET_METADATA_FIELDS = ('id', 'title', 'maqam', 'style', 'tempo', 'duration', 'emotion', 'region',
+                           'composer', 'poem_bahr', 'filename', 'file_size', 'created_at')
+
+# Audio features are extracted once per stored file by `flask --app app
+# feature-worker`. Analysis frames are FEATURE_FRAME_SIZE samples every
+# FEATURE_HOP_SIZE, transformed FEATURE_BLOCK_FRAMES at a time.
+FEATURE_FRAME_SIZE = 4096
+FEATURE_HOP_SIZE = 512
+FEATURE_BLOCK_FRAMES = 256
+FEATURE_LEASE_SECONDS = 600
+FEATURE_TEMPO_RANGE = (60, 200)  # BPM
+FEATURE_PITCH_RANGE = (100.0, 5000.0)  # Hz of spectral peaks counted in the pitch histogram
+PITCH_CLASSES = 24  # Quarter tones per octave, starting at C
+
+# Waveform peaks (min/max pairs) are precomputed at these bucket counts; each
+# must divide the largest. Stored as int16, served as int8 or int16.
+PEAK_RESOLUTIONS = (256, 1024, 4096)
+DEFAULT_PEAK_RESOLUTION = 1024
+PEAKS_MAX_AGE = 365 * 24 * 3600  # A song's audio never changes, so neither do its peaks
+
+# Fingerprint spectrogram: FINGERPRINT_FRAME_SIZE samples at FINGERPRINT_SAMPLE_RATE
+# every FINGERPRINT_HOP_SIZE, with one candidate peak per band (bin edges) per frame
+FINGERPRINT_SAMPLE_RATE = 11025
+FINGERPRINT_FRAME_SIZE = 1024
+FINGERPRINT_HOP_SIZE = 256
+FINGERPRINT_BANDS = (10, 20, 40, 80, 160, 511)
+FINGERPRINT_PEAK_SPREAD = 10  # Frames a peak must dominate on either side
+FINGERPRINT_FAN_OUT = 5  # Later peaks paired with each anchor peak
+FINGERPRINT_MAX_DT = 512  # Frames; must fit the 9 bits it is packed into
+FINGERPRINT_MIN_MATCHES = 10  # Aligned hashes needed before a file counts as a match
+FINGERPRINT_LOOKUP_BATCH = 500
+
+# Archive imports commit after every IMPORT_BATCH_SIZE manifest entries
+IMPORT_BATCH_SIZE = 50
+IMPORT_FIELDS = ('title', 'maqam', 'style', 'emotion', 'region', 'composer', 'poem_bahr')
+# Archives are spooled to disk and read a chunk at a time, so an import is
+# charged at most this much of the transfer class's byte budget
+IMPORT_ADMISSION_BYTES = 16 * 1024 * 1024
+
+# Generation jobs run in `flask --app app generation-worker`, which groups up to
+# GENERATION_BATCH_SIZE queued jobs sharing maqam/style/model_version per batch
+GENERATION_BATCH_SIZE = 16
+GENERATION_LEASE_SECONDS = 300  # A running batch without a heartbeat this long is requeued
+GENERATION_HEARTBEAT_SECONDS = 30
+MAX_JOBS_PER_REQUEST = 1000
+MODEL_VERSION = 'v1.0'
+DEFAULT_CREATIVITY = 7
+TRAINING_SESSION_ID = 'demo'  # Weights used for generation
+
+# Bulk edits select at most MAX_BULK_ROWS rows and may only set these fields
+MAX_BULK_ROWS = 10000
+BULK_UPDATE_FIELDS = ('maqam', 'style', 'emotion', 'region', 'composer', 'poem_bahr')
+
+# Watchers in each web worker share a single DB read per TRAINING_POLL_SECONDS
+TRAINING_POLL_SECONDS = 1.0
+# Event streams close after this long; EventSource reconnects with Last-Event-ID
+TRAINING_STREAM_SECONDS = 60  # Then the browser reconnects, going through admission again
+TRAINING_STREAM_RETRY_MS = 2000
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'mp3', 'wav', 'flac', 'm4a'}
@@ -35,6 +665,15 @@ def allowed_file(filename):
 # Database Models
 class Song(db.Model):
     __tablename__ = 'songs'
+    __table_args__ = (
+        # Keyset pagination order, plus one per list filter
+        db.Index('ix_songs_created_at_id', 'created_at', 'id'),
+        *[db.Index(f'ix_songs_{name}_created_at_id', name, 'created_at', 'id') for name in LIST_FILTERS],
+    )
+    
+    API_FIELDS = ('id', 'title', 'artist', 'lyrics', 'maqam', 'style', 'tempo', 'duration', 'emotion', 'region',
+                  'composer', 'poem_bahr', 'detected_bahr', 'bahr_confidence', 'filename', 'file_size',
+                  'file_size_mb', 'created_at')
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -42,53 +681,185 @@ class Song(db.Model):
     lyrics = db.Column(db.Text, nullable=False)
     maqam = db.Column(db.String(50), nullable=False)
     style = db.Column(db.String(50), nullable=False)
-    tempo = db.Column(db.Integer, nullable=False)  # Kept for compatibility
+    tempo = db.Column(db.Integer, nullable=False)  # Estimated BPM once features are extracted
+    duration = db.Column(db.Float)  # Seconds, filled in by the feature worker
     emotion = db.Column(db.String(50), nullable=False)
     region = db.Column(db.String(50), nullable=False)
     composer = db.Column(db.String(200))
     poem_bahr = db.Column(db.String(50))
+    # Bahr found by analyse_meter (None when no bahr reached METER_MIN_CONFIDENCE),
+    # and its share of the scanned lines; bahr_confidence is None until analysed
+    detected_bahr = db.Column(db.String(50))
+    bahr_confidence = db.Column(db.Float)
+    meter_version = db.Column(db.Integer)  # METER_VERSION of the analysis
     filename = db.Column(db.String(255))
     file_size = db.Column(db.Integer)
     file_type = db.Column(db.String(10))
-    audio_data = db.Column(db.LargeBinary)  # Store actual audio file data
+    # Audio bytes live in the content-addressed chunk store, keyed by SHA-256
+    audio_sha256 = db.Column(db.String(64), db.ForeignKey('audio_contents.sha256'), index=True)
+    version = db.Column(db.Integer, nullable=False, default=1)  # Bumped on every update
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Every UPDATE checks and increments version, so concurrent edits fail loudly
+    __mapper_args__ = {'version_id_col': version}
+    
+    @property
+    def etag(self):
+        return f'song-{self.id}-v{self.version}'
+    
+    def to_dict(self, fields=None):
+        data = {}
+        for field in fields or self.API_FIELDS:
+            if field == 'file_size_mb':
+                data[field] = round(self.file_size / (1024*1024), 2) if self.file_size else 0
+            elif field == 'created_at':
+                data[field] = self.created_at.isoformat() if self.created_at else None
+            else:
+                data[field] = getattr(self, field)
+        return data
+
+class AudioContent(db.Model):
+    __tablename__ = 'audio_contents'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # Songs pointing at this file
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class AudioChunk(db.Model):
+    __tablename__ = 'audio_chunks'
+    
+    sha256 = db.Column(db.String(64), db.ForeignKey('audio_contents.sha256', ondelete='CASCADE'), primary_key=True)
+    seq = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)  # Store actual audio file data
+
+# Features decoded from one stored audio file, shared by every song that references it
+class AudioFeature(db.Model):
+    __tablename__ = 'audio_features'
+    
+    sha256 = db.Column(db.String(64), db.ForeignKey('audio_contents.sha256', ondelete='CASCADE'), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, running, done, failed
+    worker_id = db.Column(db.String(100))
+    claimed_at = db.Column(db.DateTime)
+    sample_rate = db.Column(db.Integer)
+    channels = db.Column(db.Integer)
+    duration = db.Column(db.Float)  # Seconds
+    rms = db.Column(db.Float)  # Linear RMS of the mono mix, full scale = 1.0
+    loudness_db = db.Column(db.Float)  # RMS in dBFS
+    tempo = db.Column(db.Float)  # BPM
+    pitch_histogram = db.Column(db.LargeBinary)  # PITCH_CLASSES little-endian float32, summing to 1
+    error = db.Column(db.Text)
+    extracted_at = db.Column(db.DateTime)
     
     def to_dict(self):
+        histogram = np.frombuffer(self.pitch_histogram, dtype='<f4') if self.pitch_histogram else None
         return {
-            'id': self.id,
-            'title': self.title,
-            'artist': self.artist,  # Kept for compatibility
-            'lyrics': self.lyrics,
-            'maqam': self.maqam,
-            'style': self.style,
-            'tempo': self.tempo,  # Kept for compatibility
-            'emotion': self.emotion,
-            'region': self.region,
-            'composer': self.composer,
-            'poem_bahr': self.poem_bahr,
-            'filename': self.filename,
-            'file_size': self.file_size,
-            'file_size_mb': round(self.file_size / (1024*1024), 2) if self.file_size else 0,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'sha256': self.sha256,
+            'status': self.status,
+            'sample_rate': self.sample_rate,
+            'channels': self.channels,
+            'duration': self.duration,
+            'rms': self.rms,
+            'loudness_db': self.loudness_db,
+            'tempo': self.tempo,
+            'pitch_histogram': [round(float(value), 5) for value in histogram] if histogram is not None else None,
+            'error': self.error,
+            'extracted_at': self.extracted_at.isoformat() if self.extracted_at else None
         }
 
+# Waveform peaks of one stored file at one resolution: interleaved
+# (min, max) little-endian int16 pairs, one per bucket
+class AudioPeaks(db.Model):
+    __tablename__ = 'audio_peaks'
+    
+    sha256 = db.Column(db.String(64), db.ForeignKey('audio_contents.sha256', ondelete='CASCADE'), primary_key=True)
+    resolution = db.Column(db.Integer, primary_key=True)  # Number of buckets
+    data = db.Column(db.LargeBinary, nullable=False)
+
+# Inverted fingerprint index: landmark hash -> (stored file, frame offset)
+class AudioFingerprint(db.Model):
+    __tablename__ = 'audio_fingerprints'
+    __table_args__ = (
+        db.Index('ix_audio_fingerprints_hash', 'hash'),
+    )
+    
+    sha256 = db.Column(db.String(64), db.ForeignKey('audio_contents.sha256', ondelete='CASCADE'), primary_key=True)
+    hash = db.Column(db.Integer, primary_key=True)  # f1 << 18 | f2 << 9 | dt
+    offset = db.Column(db.Integer, primary_key=True)  # Anchor frame
+
+# Near-duplicate stored files found by the feature worker, one row per pair
+# with sha256 < other_sha256
+class AudioDuplicate(db.Model):
+    __tablename__ = 'audio_duplicates'
+    __table_args__ = (
+        db.Index('ix_audio_duplicates_score', 'score', 'sha256', 'other_sha256'),
+    )
+    
+    sha256 = db.Column(db.String(64), db.ForeignKey('audio_contents.sha256', ondelete='CASCADE'), primary_key=True)
+    other_sha256 = db.Column(db.String(64), db.ForeignKey('audio_contents.sha256', ondelete='CASCADE'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)  # Best fraction of either file's fingerprint aligned with the other
+    found_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, nullable=False)
+
+class StatCounter(db.Model):
+    __tablename__ = 'stat_counters'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+class FacetCount(db.Model):
+    __tablename__ = 'facet_counts'
+    
+    facet = db.Column(db.String(20), primary_key=True)  # 'maqam' or 'region'
+    value = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
 class TrainingSession(db.Model):
     __tablename__ = 'training_sessions'
+    __table_args__ = (
+        # At most one queued or running session per model
+        db.Index(
+            'uq_training_sessions_active_model', 'model_name', unique=True,
+            postgresql_where=db.text("status IN ('queued', 'training')"),
+            sqlite_where=db.text("status IN ('queued', 'training')")
+        ),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(36), unique=True, nullable=False)
-    status = db.Column(db.String(20), default='training')
+    model_name = db.Column(db.String(50), nullable=False, default='default')
+    status = db.Column(db.String(20), default='queued')  # queued, training, completed, stopped, failed
     progress = db.Column(db.Integer, default=0)
     epochs = db.Column(db.Integer, default=25)
     learning_rate = db.Column(db.Float, default=0.001)
     batch_size = db.Column(db.Integer, default=32)
     songs_used = db.Column(db.Integer, default=0)
     final_accuracy = db.Column(db.Float)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    current_epoch = db.Column(db.Integer, default=0)
+    current_loss = db.Column(db.Float)
+    worker_id = db.Column(db.String(100))  # Training worker that holds the session
+    heartbeat_at = db.Column(db.DateTime)
+    checkpoint = db.Column(db.Text)  # JSON state saved after every completed epoch
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     completed_at = db.Column(db.DateTime)
 
 class GeneratedSong(db.Model):
     __tablename__ = 'generated_songs'
+    __table_args__ = (
+        db.Index('ix_generated_songs_created_at_id', 'created_at', 'id'),
+        *[db.Index(f'ix_generated_songs_{name}_created_at_id', name, 'created_at', 'id') for name in LIST_FILTERS],
+    )
+    
+    API_FIELDS = ('id', 'title', 'lyrics', 'maqam', 'style', 'tempo', 'emotion', 'region', 'composer',
+                  'poem_bahr', 'duration', 'instruments', 'creativity', 'generation_time',
+                  'model_version', 'created_at')
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -106,123 +877,984 @@ class GeneratedSong(db.Model):
     generation_time = db.Column(db.Float)
     model_version = db.Column(db.String(50))
     training_session_id = db.Column(db.String(36))
+    cache_key = db.Column(db.String(64), index=True)  # Hash of normalized lyrics + parameters
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self, fields=None):
+        data = {}
+        for field in fields or self.API_FIELDS:
+            if field == 'created_at':
+                data[field] = self.created_at.isoformat() if self.created_at else None
+            else:
+                data[field] = getattr(self, field)
+        return data
+
+class GenerationJob(db.Model):
+    __tablename__ = 'generation_jobs'
+    __table_args__ = (
+        # Claim order, and the lookup for batch-compatible queued jobs
+        db.Index('ix_generation_jobs_status_created_at', 'status', 'created_at', 'id'),
+        db.Index('ix_generation_jobs_batch', 'status', 'maqam', 'style', 'model_version', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(36), unique=True, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    maqam = db.Column(db.String(50), nullable=False)
+    style = db.Column(db.String(50), nullable=False)
+    model_version = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.Text, nullable=False)  # JSON generation parameters, lyrics included
+    generated_song_id = db.Column(db.Integer, db.ForeignKey('generated_songs.id', ondelete='SET NULL'))
+    cached = db.Column(db.Boolean, nullable=False, default=False)  # Answered from the generation cache
+    error = db.Column(db.Text)
+    worker_id = db.Column(db.String(100))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # Refreshed by the worker while the batch runs
+    completed_at = db.Column(db.DateTime)
     
     def to_dict(self):
         return {
-            'id': self.id,
-            'title': self.title,
-            'lyrics': self.lyrics,
+            'job_id': self.job_id,
+            'status': self.status,
             'maqam': self.maqam,
             'style': self.style,
-            'tempo': self.tempo,
-            'emotion': self.emotion,
-            'region': self.region,
-            'composer': self.composer,
-            'poem_bahr': self.poem_bahr,
-            'duration': self.duration,
-            'instruments': self.instruments,
-            'creativity': self.creativity,
-            'generation_time': self.generation_time,
             'model_version': self.model_version,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'song_id': self.generated_song_id,
+            'cached': self.cached,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
 
-# Function to check and add the audio_data column if it doesn't exist
-def add_audio_data_column():
-    try:
-        # Check if the column exists
-        inspector = db.inspect(db.engine)
-        columns = [column['name'] for column in inspector.get_columns('songs')]
+class ImportEntry(db.Model):
+    __tablename__ = 'import_entries'
+    
+    import_id = db.Column(db.String(64), primary_key=True)
+    row = db.Column(db.Integer, primary_key=True)  # 1-based manifest entry
+    status = db.Column(db.String(20), nullable=False)  # imported or failed
+    song_id = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SearchDocument(db.Model):
+    __tablename__ = 'search_documents'
+    
+    doc_type = db.Column(db.String(10), primary_key=True)  # 'song' or 'generated'
+    doc_id = db.Column(db.Integer, primary_key=True)
+    length = db.Column(db.Integer, nullable=False)  # Indexed terms, for BM25 length normalisation
+    # Copied from the song so filtered searches need no join
+    maqam = db.Column(db.String(50), index=True)
+    region = db.Column(db.String(50), index=True)
+    poem_bahr = db.Column(db.String(50), index=True)
+
+class SearchPosting(db.Model):
+    __tablename__ = 'search_postings'
+    __table_args__ = (
+        db.Index('ix_search_postings_doc', 'doc_type', 'doc_id'),
+    )
+    
+    term = db.Column(db.String(64), primary_key=True)
+    doc_type = db.Column(db.String(10), primary_key=True)
+    doc_id = db.Column(db.Integer, primary_key=True)
+    tf = db.Column(db.Integer, nullable=False)  # Occurrences of term in the document
+
+# Store audio in the chunk table, returning (sha256, size, is_new).
+# open_chunks must return a fresh iterator of AUDIO_CHUNK_SIZE pieces on each
+# call: the first pass hashes, the second (only for new content) writes.
+def store_audio(open_chunks):
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in open_chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    sha256 = digest.hexdigest()
+    
+    for _ in range(2):
+        # Identical file already stored: just add a reference
+        referenced = db.session.execute(
+            db.update(AudioContent)
+            .where(AudioContent.sha256 == sha256)
+            .values(ref_count=AudioContent.ref_count + 1)
+        ).rowcount
+        if referenced:
+            return sha256, size, False
         
-        if 'audio_data' not in columns:
-            print("Adding audio_data column to songs table...")
-            with db.engine.connect() as conn:
-                conn.execute(db.text("ALTER TABLE songs ADD COLUMN audio_data BYTEA"))
-                conn.commit()
-            print("✅ audio_data column added successfully!")
-        else:
-            print("✅ audio_data column already exists")
-    except Exception as e:
-        print(f"❌ Error adding audio_data column: {e}")
-
-# Create tables and add sample data
-with app.app_context():
-    try:
-        db.create_all()
-        print("✅ Database tables created successfully!")
-        
-        # Add the audio_data column if it doesn't exist
-        add_audio_data_column()
-        
-        # Add sample song if database is empty
-        if Song.query.count() == 0:
-            sample_song = Song(
-                title="Sample Arabic Song",
-                artist="Test Artist",  # Kept for compatibility
-                lyrics="هذه أغنية تجريبية\nبكلمات عربية جميلة\nللاختبار والتجربة",
-                maqam="hijaz",
-                style="classical",
-                tempo=120,  # Kept for compatibility
-                emotion="romantic",
-                region="egyptian",
-                composer="Test Composer",
-                poem_bahr="baseet",
-                filename="sample.mp3",
-                file_size=5242880,  # 5MB
-                file_type="mp3",
-                audio_data=None  # No actual audio data for sample
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(AudioContent).values(
+                    sha256=sha256, size=size, chunk_size=AUDIO_CHUNK_SIZE,
+                    ref_count=1, created_at=datetime.utcnow()
+                ))
+                # Core inserts, so written chunks are not kept in the session
+                for seq, chunk in enumerate(open_chunks()):
+                    db.session.execute(db.insert(AudioChunk).values(sha256=sha256, seq=seq, data=chunk))
+                # Queue the new file for the feature worker
+                db.session.execute(db.insert(AudioFeature).values(sha256=sha256, status='pending'))
+            return sha256, size, True
+        except IntegrityError:
+            pass  # Same file stored concurrently; reference that copy instead
+    
+    raise RuntimeError(f'Could not store audio {sha256}')
+
+# Drop one reference to stored audio, deleting its chunks when none are left
+def release_audio(sha256):
+    if not sha256:
+        return
+    db.session.execute(
+        db.update(AudioContent)
+        .where(AudioContent.sha256 == sha256)
+        .values(ref_count=AudioContent.ref_count - 1)
+    )
+    purge_unreferenced_audio([sha256])
+
+# Delete the chunks and derived data of those files whose last reference is gone
+def purge_unreferenced_audio(sha256s):
+    unreferenced = db.session.query(AudioContent.sha256).filter(
+        AudioContent.sha256.in_(sha256s), AudioContent.ref_count <= 0
+    ).scalar_subquery()
+    AudioDuplicate.query.filter(AudioDuplicate.other_sha256.in_(unreferenced)).delete(synchronize_session=False)
+    for model in (AudioChunk, AudioFeature, AudioPeaks, AudioFingerprint, AudioDuplicate, AudioContent):
+        model.query.filter(model.sha256.in_(unreferenced)).delete(synchronize_session=False)
+
+# Dashboard statistics are kept in stat_counters / facet_counts and adjusted
+# inside the same transaction as the change they describe.
+STAT_FACETS = ('maqam', 'region')
+
+# Atomically add delta to model.field on the row matching keys, creating it if needed
+def increment_row(model, keys, field, delta):
+    column = getattr(model, field)
+    conditions = [getattr(model, key) == value for key, value in keys.items()]
+    for _ in range(2):
+        updated = db.session.execute(
+            db.update(model).where(*conditions).values({field: column + delta})
+        ).rowcount
+        if updated:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(model).values(**keys, **{field: delta}))
+            return
+        except IntegrityError:
+            pass  # Row created concurrently; update it instead
+
+def adjust_counter(name, delta):
+    if delta:
+        increment_row(StatCounter, {'name': name}, 'value', delta)
+
+def adjust_facet(facet, value, delta):
+    if delta and value is not None:
+        increment_row(FacetCount, {'facet': facet, 'value': value}, 'count', delta)
+
+# Count a song in (sign=1) or out of (sign=-1) the catalog statistics
+def record_song_stats(song, sign):
+    adjust_counter('songs_count', sign)
+    adjust_counter('total_size', sign * (song.file_size or 0))
+    for facet in STAT_FACETS:
+        adjust_facet(facet, getattr(song, facet), sign)
+
+# Recompute all statistics from the source tables
+def rebuild_stats():
+    counters = {
+        'songs_count': Song.query.count(),
+        'total_size': db.session.query(db.func.sum(Song.file_size)).scalar() or 0,
+        'generated_count': GeneratedSong.query.count(),
+        'training_sessions': TrainingSession.query.count(),
+    }
+    # The search index keeps its own counters in the same table
+    StatCounter.query.filter(StatCounter.name.in_(list(counters))).delete(synchronize_session=False)
+    FacetCount.query.delete()
+    for name, value in counters.items():
+        db.session.add(StatCounter(name=name, value=value))
+    for facet in STAT_FACETS:
+        column = getattr(Song, facet)
+        for value, count in db.session.query(column, db.func.count()).group_by(column).all():
+            if value is not None:
+                db.session.add(FacetCount(facet=facet, value=value, count=count))
+    db.session.commit()
+    logger.info("Dashboard statistics rebuilt")
+
+# Arabic text normalisation for search: fold presentation forms, drop tashkeel
+# and tatweel, unify alef/hamza/ta marbuta/ya variants and Arabic-Indic digits
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+ARABIC_FOLDING = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ؤ': 'و', 'ئ': 'ي', 'ى': 'ي', 'ة': 'ه',
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+    **{chr(0x06f0 + d): str(d) for d in range(10)},
+})
+ARABIC_ARTICLES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال')
+SEARCH_TOKEN = re.compile(r'\w+')
+
+def normalize_arabic(text):
+    text = unicodedata.normalize('NFKC', text or '')
+    text = ARABIC_DIACRITICS.sub('', text)
+    return text.translate(ARABIC_FOLDING).lower()
+
+# Light stemming: drop a leading definite article when enough of the word remains
+def search_terms(text):
+    terms = []
+    for token in SEARCH_TOKEN.findall(normalize_arabic(text)):
+        for article in ARABIC_ARTICLES:
+            if token.startswith(article) and len(token) - len(article) >= 2:
+                token = token[len(article):]
+                break
+        terms.append(token[:64])
+    return terms
+
+# Replace the index entries of one song ('song') or generated song ('generated')
+def index_document(doc_type, doc):
+    unindex_document(doc_type, doc.id)
+    terms = search_terms(f'{doc.title}\n{doc.lyrics}')
+    counts = {}
+    for term in terms:
+        counts[term] = counts.get(term, 0) + 1
+    
+    db.session.execute(db.insert(SearchDocument).values(
+        doc_type=doc_type, doc_id=doc.id, length=len(terms),
+        maqam=doc.maqam, region=doc.region, poem_bahr=doc.poem_bahr
+    ))
+    if counts:
+        db.session.execute(db.insert(SearchPosting), [
+            {'term': term, 'doc_type': doc_type, 'doc_id': doc.id, 'tf': tf} for term, tf in counts.items()
+        ])
+    adjust_counter('search_documents', 1)
+    adjust_counter('search_terms', len(terms))
+
+def unindex_document(doc_type, doc_id):
+    length = db.session.query(SearchDocument.length).filter_by(doc_type=doc_type, doc_id=doc_id).scalar()
+    if length is None:
+        return
+    SearchPosting.query.filter_by(doc_type=doc_type, doc_id=doc_id).delete(synchronize_session=False)
+    SearchDocument.query.filter_by(doc_type=doc_type, doc_id=doc_id).delete(synchronize_session=False)
+    adjust_counter('search_documents', -1)
+    adjust_counter('search_terms', -length)
+
+# Set-based unindex_document for many documents of one type
+def unindex_documents(doc_type, doc_ids):
+    count, length = db.session.query(db.func.count(), db.func.sum(SearchDocument.length)).filter(
+        SearchDocument.doc_type == doc_type, SearchDocument.doc_id.in_(doc_ids)
+    ).one()
+    if not count:
+        return
+    for model in (SearchPosting, SearchDocument):
+        model.query.filter(model.doc_type == doc_type, model.doc_id.in_(doc_ids)).delete(synchronize_session=False)
+    adjust_counter('search_documents', -count)
+    adjust_counter('search_terms', -(length or 0))
+
+# Rebuild the whole search index from songs and generated songs
+def rebuild_search_index():
+    SearchPosting.query.delete()
+    SearchDocument.query.delete()
+    StatCounter.query.filter(StatCounter.name.in_(('search_documents', 'search_terms'))).delete()
+    for doc_type, model in (('song', Song), ('generated', GeneratedSong)):
+        for doc in model.query.options(db.load_only(
+            model.id, model.title, model.lyrics, model.maqam, model.region, model.poem_bahr
+        )).yield_per(500):
+            index_document(doc_type, doc)
+    db.session.commit()
+    logger.info("Search index rebuilt")
+
+# Rank documents matching the query terms with BM25. Returns [(doc_type, doc_id, score, matched_terms)].
+# Scoring, ranking and the limit run in SQL grouped by document, so a term found in
+# most songs does not pull every one of its postings into the worker.
+def search_index(terms, doc_types, filters, match_all, limit):
+    counters = dict(db.session.query(StatCounter.name, StatCounter.value).filter(
+        StatCounter.name.in_(('search_documents', 'search_terms'))
+    ).all())
+    total_docs = counters.get('search_documents', 0)
+    if not terms or not total_docs:
+        return []
+    avg_length = counters.get('search_terms', 0) / total_docs or 1
+    
+    # Document frequencies are counted from the primary key index
+    doc_freq = dict(db.session.query(SearchPosting.term, db.func.count()).filter(
+        SearchPosting.term.in_(terms), SearchPosting.doc_type.in_(doc_types)
+    ).group_by(SearchPosting.term).all())
+    if not doc_freq:
+        return []
+    idf = db.case({
+        term: math.log(1 + (total_docs - count + 0.5) / (count + 0.5)) for term, count in doc_freq.items()
+    }, value=SearchPosting.term)
+    
+    k1, b = 1.2, 0.75
+    score = db.func.sum(
+        idf * SearchPosting.tf * (k1 + 1)
+        / (SearchPosting.tf + k1 * (1 - b) + (k1 * b / avg_length) * SearchDocument.length)
+    ).label('score')
+    query = db.session.query(SearchPosting.doc_type, SearchPosting.doc_id, score).join(SearchDocument, db.and_(
+        SearchDocument.doc_type == SearchPosting.doc_type, SearchDocument.doc_id == SearchPosting.doc_id
+    )).filter(SearchPosting.term.in_(terms), SearchPosting.doc_type.in_(doc_types))
+    for name, value in filters.items():
+        query = query.filter(getattr(SearchDocument, name) == value)
+    query = query.group_by(SearchPosting.doc_type, SearchPosting.doc_id)
+    if match_all:
+        query = query.having(db.func.count() == len(terms))
+    ranked = query.order_by(score.desc(), SearchPosting.doc_type, SearchPosting.doc_id).limit(limit).all()
+    if not ranked:
+        return []
+    
+    # Matched terms of the ranked page only
+    matched = {}
+    for term, doc_type, doc_id in db.session.query(
+        SearchPosting.term, SearchPosting.doc_type, SearchPosting.doc_id
+    ).filter(SearchPosting.term.in_(terms), db.or_(*[
+        db.and_(SearchPosting.doc_type == doc_type, SearchPosting.doc_id == doc_id) for doc_type, doc_id, _ in ranked
+    ])):
+        matched.setdefault((doc_type, doc_id), []).append(term)
+    return [(doc_type, doc_id, round(score, 4), sorted(matched[(doc_type, doc_id)], key=terms.index))
+            for doc_type, doc_id, score in ranked]
+
+# POETIC METER
+# Lyrics lines are scanned into their prosodic pattern: '1' for a letter carrying
+# a vowel (haraka), '0' for a silent one (sukun or a long vowel), and '?' where
+# unvocalised text leaves it open. Patterns run through a trie compiled from every
+# variant of the classical bahr templates, so a line is matched in one pass.
+# Fully vocalised text matches most reliably.
+
+# Feet (tafa'il) and their common variations (zihafat), as haraka/sukun patterns
+FAOOLON = ('11010', '1101')  # fa'ulun, fa'ulu
+MAFAAEELON = ('1101010', '110110', '110101')  # mafa'ilun, mafa'ilun (qabd), mafa'ilu (kaff)
+FAAILAATON = ('1011010', '111010', '101101', '11101')  # fa'ilatun with khabn and kaff
+FAAILON = ('10110', '1110')  # fa'ilun, fa'ilun (khabn)
+MUSTAFILON = ('1010110', '110110', '101110', '11110')  # mustaf'ilun with khabn, tayy and khabl
+MUTAFAAILON = ('1110110', '1010110')  # mutafa'ilun, mutfa'ilun (idmar)
+MUFAALATON = ('1101110', '1101010')  # mufa'alatun, mufa'altun ('asb)
+MAFOOLAATU = ('1010101', '110101', '101101')  # maf'ulatu with khabn and tayy
+
+# Bahr name -> hemistich templates, each a list of feet (tuples of variants).
+# The last foot lists the endings (arud/darb) the bahr allows. Names follow the
+# upload form's; earlier entries win ties.
+METER_TEMPLATES = {
+    'Taweel': [[FAOOLON, MAFAAEELON, FAOOLON, ('1101010', '110110', '11010')]],
+    'Kamel': [
+        [MUTAFAAILON, MUTAFAAILON, ('1110110', '1010110', '111010', '101010', '1110', '1010')],
+        [MUTAFAAILON, ('1110110', '1010110', '111010', '101010')],
+    ],
+    'Basset': [[MUSTAFILON, FAAILON, MUSTAFILON, ('10110', '1110', '1010')]],
+    'Wafer': [[MUFAALATON, MUFAALATON, ('11010',)], [MUFAALATON, MUFAALATON]],
+    'Khafeef': [[FAAILAATON, ('1010110', '110110'), ('1011010', '111010', '10110', '1110', '101010')]],
+    'Rajaz': [
+        [MUSTAFILON, MUSTAFILON, MUSTAFILON + ('101010',)],
+        [MUSTAFILON, MUSTAFILON + ('101010',)],
+    ],
+    'Ramal': [
+        [FAAILAATON, FAAILAATON, ('10110', '1110', '1011010', '111010')],
+        [FAAILAATON, ('1011010', '111010', '10110', '1110')],
+    ],
+    'Motaqareb': [[FAOOLON, FAOOLON, FAOOLON, ('11010', '1101', '110', '10')]],
+    'Saree': [[MUSTAFILON, MUSTAFILON, ('10110', '1110', '1010')]],
+    'Monsareh': [[MUSTAFILON, MAFOOLAATU, ('1010110', '101110', '110110', '101010')]],
+    'Madeed': [[FAAILAATON, FAAILON, ('1011010', '111010', '10110', '1110', '1010')]],
+    'Hazg': [[MAFAAEELON, ('1101010', '11010')]],
+    'Motadarak': [[FAAILON + ('1010',)] * 3 + [('10110', '1110', '1010')]],
+    'Mojtath': [[('1010110', '110110'), ('1011010', '111010', '101010')]],
+    'Modare': [[('1101010', '110101'), ('1011010',)]],
+    'Moqtadab': [[('101101', '110101'), ('101110',)]],
+}
+METER_VERSION = 2  # Stored per song; bump when scanning or templates change so analyse-meters redoes older songs
+METER_HEMISTICH_BREAK = re.compile(r'\s{3,}|\t|\*+|…|\.{3,}|//')  # Between hemistichs written on one line
+METER_MIN_SYLLABLES = 8  # Shorter lines (refrains, interjections) are not scanned
+METER_MIN_CONFIDENCE = 0.5  # Share of scanned lines that must agree before poem_bahr is filled
+app.config['METER_CACHE_SIZE'] = int(os.environ.get('METER_CACHE_SIZE', 65536))  # Scanned lines memoized per process
+
+# Binary trie over every hemistich the templates allow. A line is one hemistich
+# or two of the same bahr, matched by walking the trie with a set of live states.
+class MeterTrie:
+    def __init__(self, templates):
+        self.children = [[-1, -1]]
+        self.silent = [False]  # Node reached through a '0'
+        self.accepts = [()]  # Bahrs with a hemistich ending at the node
+        self.order = list(templates)
+        for bahr, forms in templates.items():
+            for feet in forms:
+                for variant in itertools.product(*feet):
+                    self.insert(''.join(variant), bahr)
+    
+    def insert(self, pattern, bahr):
+        node = 0
+        for char in pattern:
+            bit = int(char)
+            if self.children[node][bit] < 0:
+                self.children[node][bit] = len(self.children)
+                self.children.append([-1, -1])
+                self.silent.append(bit == 0)
+                self.accepts.append(())
+            node = self.children[node][bit]
+        if bahr not in self.accepts[node]:
+            self.accepts[node] += (bahr,)
+    
+    # Bahrs the pattern fits, in template order. '?' matches either, except that
+    # it is never read as a second silent letter in a row.
+    def match(self, pattern):
+        states = {(0, None)}  # (node, bahr of the first hemistich when in the second)
+        last = len(pattern) - 1
+        for index, char in enumerate(pattern):
+            bits = (0, 1) if char == '?' else (int(char),)
+            following = set()
+            for node, first in states:
+                for bit in bits:
+                    child = self.children[node][bit]
+                    if child < 0 or (char == '?' and bit == 0 and self.silent[node]):
+                        continue
+                    following.add((child, first))
+                    if first is None and index < last:
+                        following.update((0, bahr) for bahr in self.accepts[child])
+            states = following
+            if not states:
+                return ()
+        matched = {bahr for node, first in states for bahr in self.accepts[node] if first in (None, bahr)}
+        return tuple(bahr for bahr in self.order if bahr in matched)
+
+meter_trie = MeterTrie(METER_TEMPLATES)
+
+HARAKAT = set('َُِ')  # fatha, damma, kasra
+TANWEEN = set('ًٌٍ')
+SUKUN, SHADDA, DAGGER_ALEF = 'ْ', 'ّ', 'ٰ'
+ARABIC_LETTER = re.compile('[ء-يٱ]')
+METER_NOISE = re.compile('[^ء-يً-ْٰٱ\\s]')
+PROCLITICS = set('وفبكل')
+
+# Line as scanned: Arabic letters and vowel marks only, single-spaced
+def normalize_meter_line(line):
+    line = unicodedata.normalize('NFKC', line or '').replace('ـ', '')
+    return ' '.join(METER_NOISE.sub(' ', line).split())
+
+# Haraka/sukun pattern of one normalized line
+def scan_meter_line(line):
+    pattern = []
+    madd = False  # The last '0' is a long vowel, shortened before a hamzat wasl
+    for word_index, word in enumerate(line.split()):
+        letters = []
+        for char in word:
+            if ARABIC_LETTER.match(char):
+                letters.append([char, set()])
+            elif letters:
+                letters[-1][1].add(char)
+        if not letters:
+            continue
+        
+        # Definite article, possibly after a one-letter proclitic ("wal-", "bil-")
+        article = None
+        if len(letters) > 2 and letters[0][0] in 'اٱ' and letters[1][0] == 'ل':
+            article = 0
+        elif len(letters) > 3 and letters[0][0] in PROCLITICS and letters[1][0] in 'اٱ' and letters[2][0] == 'ل':
+            article = 1
+        elif len(letters) > 3 and letters[0][0] == 'ل' and letters[1][0] == 'ل':
+            pattern.append('1')  # li- + article, its alef dropped
+            letters, article = letters[1:], -1
+        
+        last = len(letters) - 1
+        for index, (char, marks) in enumerate(letters):
+            # Hamzat wasl: the alef of the article, or a bare alef before an explicit
+            # sukun at the start of a word or after a proclitic ("fa-sbahi", "wa-stantiq")
+            wasl = index == article or (
+                char in 'اٱ' and index < last and not marks & HARAKAT and SUKUN in letters[index + 1][1]
+                and (index == 0 or (index == 1 and letters[0][0] in PROCLITICS))
             )
-            db.session.add(sample_song)
-            db.session.commit()
-            print("✅ Sample song added!")
+            if wasl:
+                if not pattern:
+                    pattern.append('1')  # Opening the line, the hamza is pronounced
+                elif pattern[-1] == '0':
+                    if madd:
+                        pattern.pop()  # A long vowel before it is shortened
+                    else:
+                        pattern[-1] = '1'  # A silent letter before it takes a kasra
+                madd = False
+                continue
+            if article is not None and index == article + 1:
+                # Silent lam, or the sun letter it assimilates into (unless that carries its own shadda)
+                if index == last or SHADDA not in letters[index + 1][1]:
+                    pattern.append('0')
+                continue
             
-    except Exception as e:
-        print(f"❌ Database setup error: {e}")
+            if char in 'اى' and index > 0:
+                # Alef after the plural waw or tanween fath is written, not pronounced
+                silent = char == 'ا' and index == last and (letters[index - 1][0] == 'و' or letters[index - 1][1] & TANWEEN)
+                if not silent:
+                    pattern.append('0')
+                    madd = True
+                continue
+            if char == 'آ':
+                pattern += ['1', '0']
+                madd = True
+                continue
+            if char in 'وي' and index > 0 and not marks and pattern and pattern[-1] != '0':
+                pattern.append('0')
+                madd = True
+                continue
+            
+            madd = False
+            if SHADDA in marks:
+                pattern += ['0', '1']
+            elif SUKUN in marks:
+                pattern.append('0')
+            elif marks & HARAKAT or index == 0:
+                pattern.append('1')
+            elif marks & TANWEEN:
+                pattern += ['1']
+            else:
+                pattern.append('1' if pattern and pattern[-1] == '0' else '?')
+            if marks & TANWEEN:
+                pattern.append('0')  # The nun of tanween
+            if DAGGER_ALEF in marks:
+                pattern.append('0')
+    return ''.join(pattern)
+
+# Pattern and matching bahrs of one line; a final vowel is lengthened (ishba')
+@functools.lru_cache(maxsize=app.config['METER_CACHE_SIZE'])
+def analyse_meter_line(line):
+    pattern = scan_meter_line(line)
+    if len(pattern) < METER_MIN_SYLLABLES:
+        return pattern, None
+    endings = {'1': ['10'], '?': ['10', '0'], '0': ['0']}[pattern[-1]]
+    matched = set()
+    for ending in endings:
+        matched.update(meter_trie.match(pattern[:-1] + ending))
+    return pattern, tuple(bahr for bahr in meter_trie.order if bahr in matched)
+
+# Bahr of a lyric by vote over its lines (hemistichs written on one line count
+# separately): each scanned line splits one vote among
+# the bahrs it fits. Returns {'bahr', 'confidence', 'lines', 'matched_lines', 'votes'}.
+def analyse_meter(lyrics, details=False):
+    votes = {}
+    scanned = matched = 0
+    results = []
+    hemistichs = (part for line in (lyrics or '').splitlines() for part in METER_HEMISTICH_BREAK.split(line))
+    for text in hemistichs:
+        line = normalize_meter_line(text)
+        if not line:
+            continue
+        pattern, bahrs = analyse_meter_line(line)
+        if details:
+            results.append({'line': text.strip(), 'pattern': pattern, 'bahrs': list(bahrs or ())})
+        if bahrs is None:
+            continue
+        scanned += 1
+        if bahrs:
+            matched += 1
+            for bahr in bahrs:
+                votes[bahr] = votes.get(bahr, 0) + 1 / len(bahrs)
+    
+    best = max(meter_trie.order, key=lambda bahr: votes.get(bahr, 0)) if votes else None
+    confidence = round(votes[best] / scanned, 4) if best else 0.0
+    analysis = {
+        'bahr': best if confidence >= METER_MIN_CONFIDENCE else None,
+        'confidence': confidence,
+        'lines': scanned,
+        'matched_lines': matched,
+        'votes': {bahr: round(count, 3) for bahr, count in sorted(votes.items(), key=lambda item: -item[1])},
+    }
+    if details:
+        analysis['line_results'] = results
+    return analysis
+
+# poem_bahr after a new analysis: an empty value is filled, one filled from the
+# previous detection follows the new one, and one chosen by hand is kept
+def filled_poem_bahr(poem_bahr, previous_bahr, detected_bahr):
+    if not poem_bahr:
+        return detected_bahr or poem_bahr
+    if poem_bahr == previous_bahr:
+        return detected_bahr
+    return poem_bahr
+
+# Store the analysis on a song and fill in its poem_bahr
+def apply_meter_analysis(song):
+    analysis = analyse_meter(song.lyrics)
+    song.poem_bahr = filled_poem_bahr(song.poem_bahr, song.detected_bahr, analysis['bahr'])
+    song.detected_bahr = analysis['bahr']
+    song.bahr_confidence = analysis['confidence']
+    song.meter_version = METER_VERSION
+    return analysis
+
+# Columns added after the first release; create_all does not alter existing tables
+ADDED_COLUMNS = [
+    ('songs', 'audio_sha256', 'VARCHAR(64)'),
+    ('songs', 'version', 'INTEGER NOT NULL DEFAULT 1'),
+    ('training_sessions', 'current_epoch', 'INTEGER DEFAULT 0'),
+    ('training_sessions', 'current_loss', 'FLOAT'),
+    ('training_sessions', 'model_name', "VARCHAR(50) NOT NULL DEFAULT 'default'"),
+    ('training_sessions', 'worker_id', 'VARCHAR(100)'),
+    ('training_sessions', 'heartbeat_at', 'TIMESTAMP'),
+    ('training_sessions', 'checkpoint', 'TEXT'),
+    ('generated_songs', 'cache_key', 'VARCHAR(64)'),
+    ('songs', 'duration', 'FLOAT'),
+    ('songs', 'detected_bahr', 'VARCHAR(50)'),
+    ('songs', 'bahr_confidence', 'FLOAT'),
+    ('songs', 'meter_version', 'INTEGER'),
+    ('generation_jobs', 'heartbeat_at', 'TIMESTAMP'),
+]
+
+def add_missing_columns():
+    inspector = db.inspect(db.engine)
+    for table, column, ddl in ADDED_COLUMNS:
+        if column not in [c['name'] for c in inspector.get_columns(table)]:
+            with db.engine.begin() as conn:
+                conn.execute(db.text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            logger.info('Column added', extra={'table': table, 'column': column})
+
+# Move audio from older layouts (songs.audio_data, then song_audio) into the chunk store
+def migrate_audio_storage():
+    inspector = db.inspect(db.engine)
+    columns = [column['name'] for column in inspector.get_columns('songs')]
+    
+    sources = []
+    if 'audio_data' in columns:
+        sources.append(('songs', 'id', 'audio_data'))
+    if inspector.has_table('song_audio'):
+        sources.append(('song_audio', 'song_id', 'data'))
+    
+    if not sources:
+        logger.info("Audio storage already migrated")
+        return
+    
+    for table, key, column in sources:
+        rows = db.session.execute(db.text(
+            f"SELECT t.{key}, length(t.{column}) FROM {table} t "
+            f"JOIN songs s ON s.id = t.{key} "
+            f"WHERE t.{column} IS NOT NULL AND s.audio_sha256 IS NULL"
+        )).all()
+        logger.info('Moving audio files to the chunk store', extra={'source_table': table, 'files': len(rows)})
+        
+        for song_id, length in rows:
+            # Read the legacy blob back in slices so only one chunk is in memory
+            def legacy_chunks():
+                for offset in range(0, length, AUDIO_CHUNK_SIZE):
+                    yield bytes(db.session.execute(
+                        db.text(f"SELECT substr({column}, :start, :n) FROM {table} WHERE {key} = :id"),
+                        {'start': offset + 1, 'n': AUDIO_CHUNK_SIZE, 'id': song_id}
+                    ).scalar())
+            
+            sha256, _, _ = store_audio(legacy_chunks)
+            db.session.execute(db.update(Song).where(Song.id == song_id).values(audio_sha256=sha256))
+            # One commit per song, so an interrupted migration resumes where it stopped
+            db.session.commit()
+    
+    with db.engine.begin() as conn:
+        if 'audio_data' in columns:
+            conn.execute(db.text("ALTER TABLE songs DROP COLUMN audio_data"))
+        if inspector.has_table('song_audio'):
+            conn.execute(db.text("DROP TABLE song_audio"))
+    logger.info("Audio storage migrated to the chunk store")
+
+# Create indexes declared on the models that older databases are missing
+def ensure_indexes():
+    stop_legacy_training_sessions()  # Would break the one-active-session-per-model index
+    for table in (Song.__table__, GeneratedSong.__table__, TrainingSession.__table__):
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    logger.info("Indexes are up to date")
+
+# Recompute every duplicate pair from the stored fingerprints, one file at a time
+def rebuild_duplicates():
+    AudioDuplicate.__table__.create(db.engine, checkfirst=True)
+    AudioDuplicate.query.delete()
+    fingerprinted = [sha256 for (sha256,) in db.session.query(AudioFingerprint.sha256).distinct()]
+    for sha256 in fingerprinted:
+        rows = db.session.query(AudioFingerprint.hash, AudioFingerprint.offset).filter_by(sha256=sha256).all()
+        hashes = np.array([row[0] for row in rows], dtype=np.int64)
+        offsets = np.array([row[1] for row in rows], dtype=np.int64)
+        record_duplicates(sha256, hashes, offsets)
+        db.session.commit()
+    logger.info('Duplicate pairs rebuilt', extra={'files': len(fingerprinted), 'pairs': AudioDuplicate.query.count()})
+
+# Sessions the old in-process trainer left marked 'training' were never claimed
+# by a worker (no worker_id): stop them rather than let a worker resume them
+def stop_legacy_training_sessions():
+    count = TrainingSession.query.filter(
+        TrainingSession.status == 'training', TrainingSession.worker_id.is_(None)
+    ).update({TrainingSession.status: 'stopped'}, synchronize_session=False)
+    db.session.commit()
+    if count:
+        logger.info('Stopped legacy training sessions', extra={'sessions': count})
+
+# Example content for a new, empty library
+def add_sample_song():
+    if Song.query.first() is not None:
+        return
+    sample_song = Song(
+        title="Sample Arabic Song",
+        artist="Test Artist",  # Kept for compatibility
+        lyrics="هذه أغنية تجريبية\nبكلمات عربية جميلة\nللاختبار والتجربة",
+        maqam="hijaz",
+        style="classical",
+        tempo=120,  # Kept for compatibility
+        emotion="romantic",
+        region="egyptian",
+        composer="Test Composer",
+        poem_bahr="baseet",
+        filename="sample.mp3",
+        file_size=5242880,  # 5MB
+        file_type="mp3"  # No actual audio data for sample
+    )
+    db.session.add(sample_song)
+    db.session.flush()
+    record_song_stats(sample_song, 1)
+    index_document('song', sample_song)
+    db.session.commit()
+    logger.info("Sample song added")
+
+# Rows from before created_at had a default get the oldest time in their table,
+# so keyset pages on (created_at, id) can page through them with the oldest rows
+def fill_missing_created_at():
+    for model in (Song, GeneratedSong):
+        missing = model.query.filter(model.created_at.is_(None))
+        if missing.first() is None:
+            continue
+        oldest = db.session.query(db.func.min(model.created_at)).scalar() or datetime.utcnow()
+        count = missing.update({model.created_at: oldest}, synchronize_session=False)
+        logger.info('Filled in missing creation times', extra={'table': model.__tablename__, 'rows': count})
+    db.session.commit()
+
+# Schema and data migrations, applied in order by `flask --app app db-upgrade`
+# at deploy time and recorded in schema_migrations. Importing the app runs no
+# DDL or schema inspection. Append new steps; never renumber applied ones.
+MIGRATIONS = [
+    (1, 'Create tables', db.create_all),
+    # Databases created before the migration table existed
+    (2, 'Add columns missing from older databases', add_missing_columns),
+    (3, 'Move audio into the chunk store', migrate_audio_storage),
+    (4, 'Create indexes missing from older databases', ensure_indexes),
+    (5, 'Compute dashboard statistics', rebuild_stats),
+    (6, 'Build the search index', rebuild_search_index),
+    (7, 'Add a sample song to an empty library', add_sample_song),
+    (8, 'Add meter analysis columns', add_missing_columns),
+    (9, 'Fill in missing creation times', fill_missing_created_at),
+    (10, 'Stop training sessions left by the in-process trainer', stop_legacy_training_sessions),
+    (11, 'Record near-duplicate pairs', rebuild_duplicates),
+    (12, 'Add the meter version column', add_missing_columns),
+    (13, 'Add the generation job heartbeat column', add_missing_columns),
+]
+MIGRATION_LOCK_KEY = 0x5A177A  # Postgres advisory lock held while migrating
+
+# Apply pending migrations, returning the versions applied. Concurrent runs
+# against Postgres wait on an advisory lock, so each step runs once.
+def run_migrations():
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    applied = []
+    with db.engine.connect() as lock:
+        if db.engine.dialect.name == 'postgresql':
+            lock.execute(db.text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+            lock.commit()  # Session-level lock; don't sit idle in a transaction
+        try:
+            done = {version for (version,) in db.session.query(SchemaMigration.version)}
+            db.session.commit()
+            for version, name, migrate in MIGRATIONS:
+                if version in done:
+                    continue
+                logger.info('Applying migration', extra={'version': version, 'migration': name})
+                migrate()
+                db.session.add(SchemaMigration(version=version, name=name, applied_at=datetime.utcnow()))
+                db.session.commit()
+                applied.append(version)
+        finally:
+            if db.engine.dialect.name == 'postgresql':
+                lock.execute(db.text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_KEY})
+                lock.commit()
+    return applied
+
+@app.cli.command('db-upgrade')
+def db_upgrade():
+    """Apply pending schema migrations. Run once per deploy, before starting web workers."""
+    started = time.monotonic()
+    try:
+        applied = run_migrations()
+    except Exception:
+        db.session.rollback()
+        logger.exception('Migration failed')
+        sys.exit(1)
+    if applied:
+        logger.info('Migrations applied', extra={'versions': applied, 'seconds': round(time.monotonic() - started, 1)})
+    else:
+        logger.info("Database is up to date")
+
+@app.cli.command('db-status')
+def db_status():
+    """List schema migrations and whether each has been applied."""
+    applied = {}
+    if db.inspect(db.engine).has_table(SchemaMigration.__tablename__):
+        applied = {row.version: row.applied_at for row in SchemaMigration.query}
+    for version, name, _ in MIGRATIONS:
+        when = applied.get(version)
+        print(f"{version:>3}  {when.isoformat(' ', 'seconds') if when else 'pending':<19}  {name}")
+
+# Keyset pagination cursors are opaque, URL-safe encodings of (created_at, id)
+def encode_cursor(row):
+    raw = f'{row.created_at.isoformat()}|{row.id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+# Run a list request against model: filters, fields= projection and keyset
+# pagination on (created_at, id), newest first. Returns (rows, next_cursor, fields).
+def list_page(model):
+    fields = None
+    if request.args.get('fields'):
+        fields = [f.strip() for f in request.args['fields'].split(',') if f.strip()]
+        unknown = [f for f in fields if f not in model.API_FIELDS]
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+    
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    
+    query = model.query
+    for name in LIST_FILTERS:
+        value = request.args.get(name, '').strip()
+        if value:
+            query = query.filter(getattr(model, name) == value)
+    
+    if fields:
+        # Only load the requested columns (plus the ones the cursor needs)
+        columns = {'file_size' if f == 'file_size_mb' else f for f in fields} | {'id', 'created_at'}
+        query = query.options(db.load_only(*[getattr(model, c) for c in columns]))
+    
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = query.filter(db.tuple_(model.created_at, model.id) < decode_cursor(cursor))
+    
+    # Fetch one extra row to learn whether another page exists
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor, fields
+
+# Body of a list endpoint: one object per row, or with ?format=columns the
+# field names once and each row as an array of values in that order
+def list_response(model, rows, fields, next_cursor):
+    fields = fields or model.API_FIELDS
+    output_format = request.args.get('format', 'objects')
+    if output_format == 'columns':
+        body = {'success': True, 'fields': list(fields), 'rows': [list(row.to_dict(fields).values()) for row in rows]}
+    elif output_format == 'objects':
+        body = {'success': True, 'songs': [row.to_dict(fields) for row in rows]}
+    else:
+        raise ValueError('format must be objects or columns')
+    body['next_cursor'] = next_cursor
+    body['has_more'] = next_cursor is not None
+    return jsonify(body)
+
+# Codings compress_response appends to a response's ETag, so each encoded body
+# has its own validator (as static_response does for assets)
+ETAG_CODINGS = ('br', 'gzip')
+
+# Whether an If-Match / If-None-Match header names etag in any content coding.
+# If-Match needs a strong match; If-None-Match compares weakly.
+def etag_matches(etags, etag, weak=False):
+    if etags.star_tag:
+        return True
+    variants = {etag, *(f'{etag}-{coding}' for coding in ETAG_CODINGS)}
+    return not variants.isdisjoint(etags.as_set(include_weak=weak))
+
+# Compress JSON bodies for clients that accept it. Registered after the
+# metrics hook, so it runs first and the metrics count compressed bytes.
+@app.after_request
+def compress_response(response):
+    if (
+        response.mimetype != 'application/json'
+        or response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or 'Content-Encoding' in response.headers
+    ):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < app.config['COMPRESS_MIN_BYTES']:
+        return response
+    
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        encoding, body = 'br', brotli.compress(body, quality=app.config['COMPRESS_LEVEL'])
+    elif accepted['gzip']:
+        encoding, body = 'gzip', gzip.compress(body, compresslevel=app.config['COMPRESS_LEVEL'])
+    else:
+        return response
+    
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
 
 # Routes
 @app.route('/health')
+@admission_class(None)
 def health_check():
     return jsonify({'status': 'healthy'})
 
+# Store the audio and add a song with its stats and search index entries, in
+# the current transaction. Returns (song, is_new_audio).
+def add_song(fields, filename, open_chunks):
+    audio_sha256, file_size, is_new_audio = store_audio(open_chunks)
+    # Audio seen before may already be analysed; otherwise the worker fills these in
+    features = None if is_new_audio else db.session.get(AudioFeature, audio_sha256)
+    if features is None or features.status != 'done':
+        features = None
+    song = Song(
+        title=fields['title'],
+        artist=fields.get('artist') or 'Unknown Artist',
+        lyrics=fields['lyrics'],
+        maqam=fields.get('maqam') or 'unknown',
+        style=fields.get('style') or 'modern',
+        tempo=round(features.tempo) if features and features.tempo else fields.get('tempo') or 120,
+        duration=features.duration if features else None,
+        emotion=fields.get('emotion') or 'neutral',
+        region=fields.get('region') or 'mixed',
+        composer=fields.get('composer'),
+        poem_bahr=fields.get('poem_bahr'),
+        filename=filename,
+        file_size=file_size,
+        file_type=filename.split('.')[-1] if '.' in filename else 'mp3',
+        audio_sha256=audio_sha256,  # Reference to the stored audio file
+        created_at=datetime.utcnow()
+    )
+    apply_meter_analysis(song)
+    db.session.add(song)
+    db.session.flush()
+    record_song_stats(song, 1)
+    index_document('song', song)
+    return song, is_new_audio
+
 # UPLOAD ENDPOINT
 @app.route('/api/songs/upload', methods=['POST'])
+@admission_class('transfer')
 def upload_song():
     try:
-        print("=== UPLOAD REQUEST RECEIVED ===")
-        print(f"Files in request: {list(request.files.keys())}")
-        print(f"Form data: {dict(request.form)}")
+        logger.debug('Upload received', extra={'files': list(request.files), 'form_fields': list(request.form)})
         
         # Check audio file
         if 'audio_file' not in request.files:
-            print("❌ No audio_file in request")
             return jsonify({'success': False, 'error': 'No audio file provided'}), 400
         
         audio_file = request.files['audio_file']
-        print(f"Audio file: {audio_file.filename}")
         
         if audio_file.filename == '':
-            print("❌ Empty audio filename")
             return jsonify({'success': False, 'error': 'No audio file selected'}), 400
         
         # Check lyrics file
         if 'lyrics_file' not in request.files:
-            print("❌ No lyrics_file in request")
             return jsonify({'success': False, 'error': 'No lyrics file provided'}), 400
         
         lyrics_file = request.files['lyrics_file']
-        print(f"Lyrics file: {lyrics_file.filename}")
         
         if lyrics_file.filename == '':
-            print("❌ Empty lyrics filename")
             return jsonify({'success': False, 'error': 'No lyrics file selected'}), 400
         
         # Read lyrics
         try:
             lyrics_content = lyrics_file.read().decode('utf-8')
-            print(f"✅ Lyrics read successfully, length: {len(lyrics_content)}")
         except Exception as e:
-            print(f"❌ Error reading lyrics: {e}")
+            logger.info('Upload rejected: unreadable lyrics file', extra={'error': str(e)})
             return jsonify({'success': False, 'error': 'Could not read lyrics file'}), 400
         
         # Get form data
@@ -234,91 +1866,255 @@ def upload_song():
         region = request.form.get('region', '').strip()
         poem_bahr = request.form.get('poem_bahr', '').strip()
         
-        print(f"Form data - Title: '{title}', Composer: '{composer}', Maqam: '{maqam}'")
-        
         # Basic validation
         if not title:
-            print("❌ Missing title")
             return jsonify({'success': False, 'error': 'Title is required'}), 400
         
         # Set default values for removed fields
         artist = "Unknown Artist"  # Default since we removed the field
         tempo = 120  # Default since we removed the field
         
-        # Get file info
-        audio_data = audio_file.read()
-        file_size = len(audio_data)
+        # Stream the upload into the chunk store, hashing as we go.
+        # Werkzeug spools large uploads to disk, so memory stays at one chunk.
+        def upload_chunks():
+            audio_file.stream.seek(0)
+            return iter(lambda: audio_file.stream.read(AUDIO_CHUNK_SIZE), b'')
+        
         filename = secure_filename(audio_file.filename) if audio_file.filename else 'unknown.mp3'
         
-        print(f"Creating song object...")
+        # Optional near-duplicate check of the upload's first bytes against the fingerprint index
+        duplicates = []
+        if app.config['DUPLICATE_ACTION'] in ('warn', 'reject'):
+            audio_file.stream.seek(0)
+            duplicates = check_upload_duplicates(audio_file.stream.read(app.config['DUPLICATE_CHECK_BYTES']))
+            if duplicates:
+                logger.info('Upload matches existing songs', extra={'song_ids': [match['id'] for match in duplicates]})
+            if duplicates and app.config['DUPLICATE_ACTION'] == 'reject':
+                return jsonify({
+                    'success': False,
+                    'error': 'This recording matches songs already in the library',
+                    'duplicates': duplicates
+                }), 409
         
         # Create song
-        song = Song(
-            title=title,
-            artist=artist,  # Default value
-            lyrics=lyrics_content,
-            maqam=maqam or 'unknown',
-            style=style or 'modern',
-            tempo=tempo,  # Default value
-            emotion=emotion or 'neutral',
-            region=region or 'mixed',
-            composer=composer,
-            poem_bahr=poem_bahr,
-            filename=filename,
-            file_size=file_size,
-            file_type=filename.split('.')[-1] if '.' in filename else 'mp3',
-            audio_data=audio_data,  # Store the actual audio file data
-            created_at=datetime.utcnow()
-        )
-        
-        print(f"Saving to database...")
-        
-        # Save to database
-        db.session.add(song)
+        song, is_new_audio = add_song({
+            'title': title,
+            'artist': artist,  # Default value
+            'lyrics': lyrics_content,
+            'maqam': maqam,
+            'style': style,
+            'tempo': tempo,  # Default value
+            'emotion': emotion,
+            'region': region,
+            'composer': composer,
+            'poem_bahr': poem_bahr,
+        }, filename, upload_chunks)
+        file_size = song.file_size
         db.session.commit()
         
-        print(f"✅ Song saved successfully with ID: {song.id}")
-        
-        # Verify it was saved
-        saved_song = Song.query.get(song.id)
-        if saved_song:
-            print(f"✅ Verification: Song exists in database")
-        else:
-            print(f"❌ Verification: Song NOT found in database")
+        logger.info('Song uploaded', extra={
+            'song_id': song.id, 'audio_sha256': song.audio_sha256, 'file_size': file_size, 'new_audio': is_new_audio
+        })
         
         return jsonify({
             'success': True,
             'message': f'Song "{title}" uploaded successfully!',
             'song_id': song.id,
-            'file_size': f'{file_size / (1024*1024):.2f} MB'
+            'file_size': f'{file_size / (1024*1024):.2f} MB',
+            'deduplicated': not is_new_audio,
+            'duplicates': duplicates
         })
         
     except Exception as e:
-        print(f"❌ Upload error: {e}")
+        logger.exception('Upload failed')
         db.session.rollback()
         return jsonify({'success': False, 'error': f'Upload failed: {str(e)}'}), 500
 
+# Open an uploaded ZIP or TAR (optionally compressed) without extracting it.
+# Returns ({member name: offset in the archive}, open_member), where
+# open_member(name) gives a file object. Reading members
+# in offset order reads a compressed tar front to back in one pass; out of order,
+# each backward seek decompresses the stream again from its start.
+def open_archive(file_storage):
+    stream = file_storage.stream
+    stream.seek(0)
+    if zipfile.is_zipfile(stream):
+        stream.seek(0)
+        archive = zipfile.ZipFile(stream)
+        offsets = {info.filename: info.header_offset for info in archive.infolist() if not info.is_dir()}
+        return offsets, archive.open
+    stream.seek(0)
+    archive = tarfile.open(fileobj=stream, mode='r:*')
+    members = {member.name: member for member in archive if member.isfile()}
+    # By TarInfo, not name: a name lookup scans the whole member list
+    return {name: member.offset_data for name, member in members.items()}, lambda name: archive.extractfile(members[name])
+
+def archive_path(path):
+    path = (path or '').strip().replace('\\', '/')
+    while path.startswith('./'):
+        path = path[2:]
+    return path.lstrip('/')
+
+# Yield manifest entries from a CSV or JSONL file object. A JSONL line that
+# does not parse is yielded as None and reported as a failed entry.
+def read_manifest(manifest_file, name):
+    text = io.TextIOWrapper(manifest_file, encoding='utf-8-sig')
+    if name.lower().endswith('.jsonl'):
+        for line in text:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+    else:
+        yield from csv.DictReader(text)
+
+# Check one manifest entry against the archive, returning (title, audio name, lyrics name)
+def check_manifest_entry(entry, members):
+    if not isinstance(entry, dict):
+        raise ValueError('Manifest entry must be an object')
+    title = (entry.get('title') or '').strip()
+    audio_name = archive_path(entry.get('audio') or entry.get('audio_path'))
+    lyrics_name = archive_path(entry.get('lyrics_path'))
+    if not title:
+        raise ValueError('Title is required')
+    if audio_name not in members:
+        raise ValueError(f'Audio file not found in archive: {audio_name or "(none)"}')
+    if not allowed_file(audio_name):
+        raise ValueError(f'Unsupported audio type: {audio_name}')
+    if lyrics_name and lyrics_name not in members:
+        raise ValueError(f'Lyrics file not found in archive: {lyrics_name}')
+    if not lyrics_name and not (entry.get('lyrics') or '').strip():
+        raise ValueError('Lyrics are required')
+    return title, audio_name, lyrics_name
+
+# IMPORT ENDPOINT
+# The archive is read in member order: the manifest first, then the lyrics
+# files it names, then each audio file, so every member is read once.
+# Runs within the request; progress is committed every IMPORT_BATCH_SIZE rows.
+@app.route('/api/songs/import', methods=['POST'])
+@admission_class('transfer', max_bytes=IMPORT_ADMISSION_BYTES)
+def import_songs():
+    try:
+        # Must be raised before the multipart body is parsed
+        request.max_content_length = app.config['IMPORT_MAX_CONTENT_LENGTH']
+        
+        if 'archive' not in request.files or request.files['archive'].filename == '':
+            return jsonify({'success': False, 'error': 'No archive provided'}), 400
+        
+        try:
+            members, open_member = open_archive(request.files['archive'])
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            return jsonify({'success': False, 'error': f'Could not read archive: {e}'}), 400
+        
+        # Manifest as its own file part, or manifest.csv / manifest.jsonl inside the archive
+        if 'manifest' in request.files and request.files['manifest'].filename:
+            manifest_name = request.files['manifest'].filename
+            manifest_file = request.files['manifest'].stream
+        else:
+            manifest_name = next((n for n in ('manifest.jsonl', 'manifest.csv') if n in members), None)
+            if not manifest_name:
+                return jsonify({'success': False, 'error': 'No manifest provided'}), 400
+            manifest_file = open_member(manifest_name)
+        
+        # Re-sending the same import_id resumes: entries already imported are skipped
+        import_id = request.form.get('import_id') or str(uuid.uuid4())
+        done = {row for (row,) in db.session.query(ImportEntry.row).filter_by(import_id=import_id, status='imported')}
+        
+        results = {}
+        planned = []  # (row, entry, title, audio name, lyrics name)
+        for row, entry in enumerate(read_manifest(manifest_file, manifest_name), start=1):
+            if row in done:
+                results[row] = {'row': row, 'status': 'skipped'}
+                continue
+            try:
+                planned.append((row, entry, *check_manifest_entry(entry, members)))
+            except Exception as e:
+                title = entry.get('title') if isinstance(entry, dict) else None
+                db.session.merge(ImportEntry(import_id=import_id, row=row, status='failed', error=str(e)))
+                results[row] = {'row': row, 'status': 'failed', 'title': title, 'error': str(e)}
+        
+        lyrics_texts = {}
+        for lyrics_name in sorted({plan[4] for plan in planned if plan[4]}, key=members.get):
+            try:
+                with open_member(lyrics_name) as lyrics_file:
+                    lyrics_texts[lyrics_name] = lyrics_file.read().decode('utf-8')
+            except Exception as e:
+                lyrics_texts[lyrics_name] = e  # Fails the entries that use it
+        
+        pending = 0
+        for row, entry, title, audio_name, lyrics_name in sorted(planned, key=lambda plan: members[plan[3]]):
+            try:
+                lyrics = lyrics_texts[lyrics_name] if lyrics_name else entry.get('lyrics')
+                if isinstance(lyrics, Exception):
+                    raise ValueError(f'Could not read lyrics file {lyrics_name}: {lyrics}')
+                if not lyrics.strip():
+                    raise ValueError('Lyrics are required')
+                
+                def entry_chunks():
+                    member = open_member(audio_name)
+                    return iter(lambda: member.read(AUDIO_CHUNK_SIZE), b'')
+                
+                fields = {name: (entry.get(name) or '').strip() for name in IMPORT_FIELDS}
+                fields['lyrics'] = lyrics
+                with db.session.begin_nested():
+                    song, _ = add_song(fields, secure_filename(os.path.basename(audio_name)), entry_chunks)
+                    db.session.merge(ImportEntry(import_id=import_id, row=row, status='imported', song_id=song.id))
+                results[row] = {'row': row, 'status': 'imported', 'title': title, 'song_id': song.id}
+            except Exception as e:
+                db.session.merge(ImportEntry(import_id=import_id, row=row, status='failed', error=str(e)))
+                results[row] = {'row': row, 'status': 'failed', 'title': title, 'error': str(e)}
+            
+            pending += 1
+            if pending >= IMPORT_BATCH_SIZE:
+                db.session.commit()
+                pending = 0
+        db.session.commit()
+        
+        results = [results[row] for row in sorted(results)]
+        summary = {status: sum(1 for r in results if r['status'] == status) for status in ('imported', 'skipped', 'failed')}
+        logger.info('Import processed', extra={'import_id': import_id, **summary})
+        return jsonify({'success': True, 'import_id': import_id, 'summary': summary, 'results': results})
+        
+    except Exception as e:
+        logger.exception('Import failed')
+        try:
+            db.session.commit()  # Keep the entries already processed so the import can resume
+        except Exception:
+            db.session.rollback()
+        return jsonify({'success': False, 'error': f'Import failed: {str(e)}'}), 500
+
 # LIST SONGS ENDPOINT
 @app.route('/api/songs/list')
+@use_replica
 def list_songs():
     try:
-        print("=== LIST SONGS REQUEST ===")
-        songs = Song.query.order_by(Song.created_at.desc()).all()
-        print(f"Found {len(songs)} songs in database")
+        songs, next_cursor, fields = list_page(Song)
+        return list_response(Song, songs, fields, next_cursor)
         
-        songs_data = []
-        for song in songs:
-            song_dict = song.to_dict()
-            songs_data.append(song_dict)
-            print(f"Song: {song_dict['title']} by {song_dict['composer']}")
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.exception('List songs error')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# GET SONG ENDPOINT
+@app.route('/api/songs/<int:song_id>', methods=['GET'])
+def get_song(song_id):
+    try:
+        song = db.session.get(Song, song_id)
+        if not song:
+            return jsonify({'success': False, 'error': 'Song not found'}), 404
         
-        return jsonify({
-            'success': True,
-            'songs': songs_data
-        })
+        response = jsonify({'success': True, 'song': song.to_dict()})
+        response.set_etag(song.etag)
+        response.cache_control.no_cache = True  # Always revalidate; unchanged songs cost a 304
+        if etag_matches(request.if_none_match, song.etag, weak=True):
+            response.status_code = 304
+        return response
         
     except Exception as e:
-        print(f"❌ List songs error: {e}")
+        logger.exception('Get song error')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # UPDATE SONG ENDPOINT
@@ -326,7 +2122,17 @@ def list_songs():
 def update_song(song_id):
     try:
         song = Song.query.get_or_404(song_id)
+        
+        # Optimistic concurrency: refuse to overwrite a version the client has not seen
+        if request.if_match and not etag_matches(request.if_match, song.etag):
+            return jsonify({
+                'success': False,
+                'error': 'Song was modified by someone else. Reload it and try again.'
+            }), 412
+        
         data = request.get_json()
+        old_facets = {facet: getattr(song, facet) for facet in STAT_FACETS}
+        old_lyrics = song.lyrics
         
         # Update fields
         song.title = data.get('title', song.title)
@@ -339,17 +2145,35 @@ def update_song(song_id):
         song.region = data.get('region', song.region)
         song.composer = data.get('composer', song.composer)
         song.poem_bahr = data.get('poem_bahr', song.poem_bahr)
+        if song.lyrics != old_lyrics or not song.poem_bahr:
+            apply_meter_analysis(song)
         
-        db.session.commit()
+        try:
+            # Autoflush may run the versioned UPDATE here, so keep it inside the try
+            for facet, old_value in old_facets.items():
+                if getattr(song, facet) != old_value:
+                    adjust_facet(facet, old_value, -1)
+                    adjust_facet(facet, getattr(song, facet), 1)
+            index_document('song', song)
+            db.session.commit()
+        except StaleDataError:
+            # Another request updated the row between our read and write
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'error': 'Song was modified by someone else. Reload it and try again.'
+            }), 412
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'message': f'Song "{song.title}" updated successfully!',
             'song_id': song.id
         })
+        response.set_etag(song.etag)
+        return response
         
     except Exception as e:
-        print(f"❌ Update song error: {e}")
+        logger.exception('Update song error')
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -358,38 +2182,233 @@ def update_song(song_id):
 def delete_song(song_id):
     try:
         song = Song.query.get_or_404(song_id)
+        audio_sha256 = song.audio_sha256
+        record_song_stats(song, -1)
+        unindex_document('song', song.id)
         db.session.delete(song)
+        db.session.flush()
+        release_audio(audio_sha256)
         db.session.commit()
         return jsonify({'success': True, 'message': 'Song deleted successfully!'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Rows a bulk request acts on: {"ids": [...]} or {"filter": {name: value or [values]}}
+# over LIST_FILTERS. The ids are read (and on Postgres locked, in id order) once,
+# so every statement of the change sees the same rows.
+def bulk_selection(model, data):
+    ids, filters = data.get('ids'), data.get('filter')
+    if (ids is None) == (filters is None):
+        raise ValueError('Give either ids or filter')
+    
+    query = db.session.query(model.id)
+    if ids is not None:
+        if not isinstance(ids, list) or not all(type(row_id) is int for row_id in ids):
+            raise ValueError('ids must be a list of integers')
+        if len(ids) > MAX_BULK_ROWS:
+            raise ValueError(f'At most {MAX_BULK_ROWS} ids per request')
+        query = query.filter(model.id.in_(ids))
+    else:
+        if not isinstance(filters, dict) or not filters:
+            raise ValueError(f'filter must name at least one of: {", ".join(LIST_FILTERS)}')
+        unknown = [name for name in filters if name not in LIST_FILTERS]
+        if unknown:
+            raise ValueError(f'Unknown filters: {", ".join(unknown)}')
+        for name, value in filters.items():
+            query = query.filter(getattr(model, name).in_(value if isinstance(value, list) else [value]))
+    
+    selected = [row_id for row_id, in query.order_by(model.id).limit(MAX_BULK_ROWS + 1).with_for_update()]
+    if len(selected) > MAX_BULK_ROWS:
+        raise ValueError(f'filter matches more than {MAX_BULK_ROWS} rows; narrow it down')
+    return selected
+
+# The "set" object of a bulk update, checked against BULK_UPDATE_FIELDS and model's NOT NULL columns
+def bulk_values(model, data):
+    values = data.get('set')
+    if not isinstance(values, dict) or not values:
+        raise ValueError(f'set must name at least one of: {", ".join(BULK_UPDATE_FIELDS)}')
+    unknown = [name for name in values if name not in BULK_UPDATE_FIELDS]
+    if unknown:
+        raise ValueError(f'Fields cannot be bulk updated: {", ".join(unknown)}')
+    
+    cleaned = {}
+    for name, value in values.items():
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f'{name} must be a string')
+        value = (value or '').strip() or None
+        if value is None and not model.__table__.c[name].nullable:
+            raise ValueError(f'{name} cannot be empty')
+        cleaned[name] = value
+    return cleaned
+
+# Keep the filter columns copied into search_documents in step with a bulk update
+def update_search_filters(doc_type, doc_ids, values):
+    copied = {name: value for name, value in values.items() if name in ('maqam', 'region', 'poem_bahr')}
+    if copied:
+        db.session.execute(
+            db.update(SearchDocument)
+            .where(SearchDocument.doc_type == doc_type, SearchDocument.doc_id.in_(doc_ids))
+            .values(copied)
+        )
+
+# Take the selected songs out of the counts of their current facet values
+def remove_song_facets(song_ids, facets):
+    for facet in facets:
+        column = getattr(Song, facet)
+        for value, count in db.session.query(column, db.func.count()).filter(Song.id.in_(song_ids)).group_by(column):
+            adjust_facet(facet, value, -count)
+
+# BULK SONG ENDPOINTS
+# One UPDATE or DELETE over the selected ids, with statistics, search index and
+# audio references adjusted by aggregate queries in the same transaction
+@app.route('/api/songs/bulk', methods=['PATCH'])
+def bulk_update_songs():
+    try:
+        data = request.get_json(silent=True) or {}
+        values = bulk_values(Song, data)
+        song_ids = bulk_selection(Song, data)
+        updated = 0
+        if song_ids:
+            changed_facets = [facet for facet in STAT_FACETS if facet in values]
+            remove_song_facets(song_ids, changed_facets)
+            for facet in changed_facets:
+                adjust_facet(facet, values[facet], len(song_ids))
+            updated = db.session.execute(
+                db.update(Song)
+                .where(Song.id.in_(song_ids))
+                .values(**values, version=Song.version + 1)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            update_search_filters('song', song_ids, values)
+        db.session.commit()
+        return jsonify({'success': True, 'updated': updated})
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.exception('Bulk update songs error')
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/songs/bulk_delete', methods=['POST'])
+def bulk_delete_songs():
+    try:
+        song_ids = bulk_selection(Song, request.get_json(silent=True) or {})
+        deleted = 0
+        if song_ids:
+            selected = Song.id.in_(song_ids)
+            count, total_size = db.session.query(db.func.count(), db.func.sum(Song.file_size)).filter(selected).one()
+            adjust_counter('songs_count', -count)
+            adjust_counter('total_size', -(total_size or 0))
+            remove_song_facets(song_ids, STAT_FACETS)
+            unindex_documents('song', song_ids)
+            
+            # Drop each file's references from the selection in one correlated UPDATE
+            sha256s = [sha256 for sha256, in db.session.query(Song.audio_sha256).filter(
+                selected, Song.audio_sha256.isnot(None)
+            ).distinct()]
+            if sha256s:
+                references = db.session.query(db.func.count(Song.id)).filter(
+                    selected, Song.audio_sha256 == AudioContent.sha256
+                ).scalar_subquery()
+                db.session.execute(
+                    db.update(AudioContent)
+                    .where(AudioContent.sha256.in_(sha256s))
+                    .values(ref_count=AudioContent.ref_count - references)
+                )
+            
+            deleted = Song.query.filter(selected).delete(synchronize_session=False)
+            if sha256s:
+                purge_unreferenced_audio(sha256s)
+        db.session.commit()
+        return jsonify({'success': True, 'deleted': deleted})
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.exception('Bulk delete songs error')
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Yield bytes [start, stop) of a stored audio file, one chunk row at a time
+def iter_audio_chunks(sha256, chunk_size, start, stop):
+    seq, offset = divmod(start, chunk_size)
+    remaining = stop - start
+    while remaining > 0:
+        chunk = db.session.query(AudioChunk.data).filter_by(sha256=sha256, seq=seq).scalar()
+        if chunk is None:
+            break
+        piece = bytes(chunk[offset:offset + remaining])
+        yield piece
+        remaining -= len(piece)
+        offset = 0
+        seq += 1
+
 # DOWNLOAD AUDIO ENDPOINT
 @app.route('/api/songs/<int:song_id>/download_audio')
+@use_replica
+@admission_class('transfer')
 def download_audio(song_id):
     try:
         song = Song.query.get_or_404(song_id)
+        content = db.session.get(AudioContent, song.audio_sha256) if song.audio_sha256 else None
         
-        if not song.audio_data:
+        if not content or not content.size:
             return jsonify({'success': False, 'error': 'Audio file not found'}), 404
         
-        # Create a file-like object from the binary data
-        audio_file = io.BytesIO(song.audio_data)
+        total_size = content.size
+        etag = content.sha256  # Content-addressed, so the hash is a strong validator
         
-        return send_file(
-            audio_file,
-            as_attachment=True,
-            download_name=song.filename,
-            mimetype=f'audio/{song.file_type}'
+        response = Response(mimetype=f'audio/{song.file_type}')
+        response.set_etag(etag)
+        response.last_modified = song.created_at
+        response.headers['Accept-Ranges'] = 'bytes'
+        response.headers.set('Content-Disposition', 'attachment', filename=song.filename)
+        response.cache_control.private = True
+        response.cache_control.max_age = 3600
+        
+        # Conditional GET: the browser already has this file
+        if request.if_none_match:
+            if request.if_none_match.contains(etag):
+                response.status_code = 304
+                return response
+        elif request.if_modified_since and song.created_at:
+            if song.created_at.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None):
+                response.status_code = 304
+                return response
+        
+        start, stop = 0, total_size
+        byte_range = request.range
+        if byte_range and request.if_range.etag and request.if_range.etag != etag:
+            byte_range = None  # Stale If-Range: send the whole file
+        if byte_range and len(byte_range.ranges) > 1:
+            byte_range = None  # No multipart/byteranges: answer a multi-range request with the whole file
+        if byte_range:
+            bounds = byte_range.range_for_length(total_size)
+            if bounds is None:
+                response.status_code = 416
+                response.headers['Content-Range'] = f'bytes */{total_size}'
+                return response
+            start, stop = bounds
+            response.status_code = 206
+            response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{total_size}'
+        
+        response.response = stream_with_context(
+            iter_audio_chunks(content.sha256, content.chunk_size, start, stop)
         )
+        response.content_length = stop - start
+        return response
         
     except Exception as e:
-        print(f"❌ Download audio error: {e}")
+        logger.exception('Download audio error')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # DOWNLOAD LYRICS ENDPOINT
 @app.route('/api/songs/<int:song_id>/download_lyrics')
+@use_replica
 def download_lyrics(song_id):
     try:
         song = Song.query.get_or_404(song_id)
@@ -410,21 +2429,252 @@ def download_lyrics(song_id):
         )
         
     except Exception as e:
-        print(f"❌ Download lyrics error: {e}")
+        logger.exception('Download lyrics error')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Songs for export/training in id order, filtered like the list endpoints.
+# Reads DATASET_PAGE_SIZE rows per query (keyset on id), so memory stays flat and
+# callers can commit between samples without invalidating a cursor.
+def iter_dataset_songs(after_id=0, limit=None, filters=None):
+    remaining = limit
+    while remaining is None or remaining > 0:
+        query = Song.query.filter(Song.id > after_id)
+        for name, value in (filters or {}).items():
+            query = query.filter(getattr(Song, name) == value)
+        page_size = DATASET_PAGE_SIZE if remaining is None else min(DATASET_PAGE_SIZE, remaining)
+        page = query.order_by(Song.id).limit(page_size).all()
+        if not page:
+            return
+        yield from page
+        after_id = page[-1].id
+        if remaining is not None:
+            remaining -= len(page)
+        db.session.expunge_all()  # Release the page's objects
+
+# Sample metadata, with the precomputed audio features once they are extracted
+def dataset_metadata(song):
+    metadata = song.to_dict(DATASET_METADATA_FIELDS)
+    features = db.session.get(AudioFeature, song.audio_sha256) if song.audio_sha256 else None
+    metadata['features'] = features.to_dict() if features and features.status == 'done' else None
+    return metadata
+
+# Training/export samples: {'key', 'metadata', 'lyrics', 'audio', 'audio_ext'}.
+# With include_audio the whole file of one sample is in memory at a time.
+def iter_dataset_samples(after_id=0, limit=None, filters=None, include_audio=True):
+    for song in iter_dataset_songs(after_id, limit, filters):
+        audio = None
+        if include_audio and song.audio_sha256:
+            content = db.session.get(AudioContent, song.audio_sha256)
+            if content:
+                audio = b''.join(iter_audio_chunks(content.sha256, content.chunk_size, 0, content.size))
+        yield {
+            'key': f'{song.id:08d}',
+            'metadata': dataset_metadata(song),
+            'lyrics': song.lyrics,
+            'audio': audio,
+            'audio_ext': song.file_type
+        }
+
+# Group samples into lists of batch_size (the last batch may be shorter)
+def iter_batches(samples, batch_size):
+    batch = []
+    for sample in samples:
+        batch.append(sample)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def iter_dataset_batches(batch_size, **kwargs):
+    return iter_batches(iter_dataset_samples(**kwargs), batch_size)
+
+# Read samples back from an exported shard (any readable tar stream), grouping
+# the <key>.json / <key>.txt / <key>.<ext> members written by the export
+def iter_shard_samples(fileobj, include_audio=True):
+    sample = None
+    with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+        for member in archive:
+            key, _, ext = member.name.partition('.')
+            if sample and sample['key'] != key:
+                yield sample
+                sample = None
+            if sample is None:
+                sample = {'key': key, 'metadata': None, 'lyrics': None, 'audio': None, 'audio_ext': None}
+            if ext == 'json':
+                sample['metadata'] = json.loads(archive.extractfile(member).read().decode('utf-8'))
+            elif ext == 'txt':
+                sample['lyrics'] = archive.extractfile(member).read().decode('utf-8')
+            else:
+                sample['audio_ext'] = ext
+                if include_audio:
+                    sample['audio'] = archive.extractfile(member).read()
+    if sample:
+        yield sample
+
+# One tar member, streamed: header, data chunks, padding to the 512-byte block
+def tar_member(name, chunks, size, mtime):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = mtime
+    info.mode = 0o644
+    yield info.tobuf(format=tarfile.PAX_FORMAT)
+    yield from chunks
+    if size % tarfile.BLOCKSIZE:
+        yield b'\0' * (tarfile.BLOCKSIZE - size % tarfile.BLOCKSIZE)
+
+def iter_dataset_tar(after_id, limit, filters, include_audio):
+    for song in iter_dataset_songs(after_id, limit, filters):
+        key = f'{song.id:08d}'
+        mtime = int(song.created_at.timestamp()) if song.created_at else 0
+        
+        metadata = json.dumps(dataset_metadata(song), ensure_ascii=False).encode('utf-8')
+        yield from tar_member(f'{key}.json', [metadata], len(metadata), mtime)
+        
+        lyrics = (song.lyrics or '').encode('utf-8')
+        yield from tar_member(f'{key}.txt', [lyrics], len(lyrics), mtime)
+        
+        if include_audio and song.audio_sha256:
+            content = db.session.get(AudioContent, song.audio_sha256)
+            if content:
+                chunks = iter_audio_chunks(content.sha256, content.chunk_size, 0, content.size)
+                yield from tar_member(f'{key}.{song.file_type}', chunks, content.size, mtime)
+    
+    yield b'\0' * (2 * tarfile.BLOCKSIZE)  # End-of-archive marker
+
+def dataset_filters():
+    return {name: request.args[name].strip() for name in LIST_FILTERS if request.args.get(name, '').strip()}
+
+# DATASET ENDPOINTS
+# Shard boundaries for a full export: each shard is fetched with
+# /api/dataset/export?after_id=<after_id>&limit=<count>
+@app.route('/api/dataset/shards')
+@use_replica
+def dataset_shards():
+    try:
+        shard_size = max(1, request.args.get('shard_size', DATASET_SHARD_SIZE, type=int))
+        query = db.session.query(Song.id)
+        for name, value in dataset_filters().items():
+            query = query.filter(getattr(Song, name) == value)
+        
+        shards = []
+        after_id = last_id = 0
+        count = 0
+        for (last_id,) in query.order_by(Song.id).execution_options(yield_per=5000):
+            count += 1
+            if count == shard_size:
+                shards.append({'shard': len(shards), 'after_id': after_id, 'last_id': last_id, 'count': count})
+                after_id, count = last_id, 0
+        if count:
+            shards.append({'shard': len(shards), 'after_id': after_id, 'last_id': last_id, 'count': count})
+        
+        return jsonify({'success': True, 'shard_size': shard_size, 'shards': shards})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Stream a WebDataset-style tar: <id>.json metadata, <id>.txt lyrics, <id>.<ext> audio
+@app.route('/api/dataset/export')
+@use_replica
+@admission_class('transfer')
+def export_dataset():
+    try:
+        after_id = request.args.get('after_id', 0, type=int)
+        limit = request.args.get('limit', type=int)
+        include_audio = request.args.get('audio', '1') != '0'
+        filters = dataset_filters()
+        
+        response = Response(
+            stream_with_context(iter_dataset_tar(after_id, limit, filters, include_audio)),
+            mimetype='application/x-tar'
+        )
+        response.headers.set('Content-Disposition', 'attachment', filename=f'dataset-{after_id:08d}.tar')
+        return response
+    except Exception as e:
+        logger.exception('Dataset export error')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# SEARCH ENDPOINT
+SEARCH_DOC_TYPES = {'songs': 'song', 'generated': 'generated'}
+
+@app.route('/api/search')
+@use_replica
+def search():
+    try:
+        query_text = request.args.get('q', '').strip()
+        terms = list(dict.fromkeys(search_terms(query_text)))
+        if not terms:
+            return jsonify({'success': False, 'error': 'Search query is required'}), 400
+        
+        scope = request.args.get('type', 'all')
+        if scope == 'all':
+            doc_types = list(SEARCH_DOC_TYPES.values())
+        elif scope in SEARCH_DOC_TYPES:
+            doc_types = [SEARCH_DOC_TYPES[scope]]
+        else:
+            return jsonify({'success': False, 'error': 'type must be songs, generated or all'}), 400
+        
+        filters = {}
+        for name in ('maqam', 'region', 'poem_bahr'):
+            value = request.args.get(name, '').strip()
+            if value:
+                filters[name] = value
+        
+        limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+        match_all = request.args.get('match', 'any') == 'all'
+        
+        hits = search_index(terms, doc_types, filters, match_all, limit)
+        
+        # Only the ranked page is loaded from the song tables
+        docs = {}
+        for doc_type, model in (('song', Song), ('generated', GeneratedSong)):
+            ids = [doc_id for hit_type, doc_id, _, _ in hits if hit_type == doc_type]
+            if ids:
+                for doc in model.query.filter(model.id.in_(ids)).all():
+                    docs[(doc_type, doc.id)] = doc
+        
+        results = []
+        for doc_type, doc_id, score, matched_terms in hits:
+            doc = docs.get((doc_type, doc_id))
+            if not doc:
+                continue
+            # First lyric line containing a matched term
+            snippet = next((line.strip() for line in doc.lyrics.splitlines()
+                            if set(search_terms(line)) & set(matched_terms)), None)
+            results.append({
+                'type': 'song' if doc_type == 'song' else 'generated',
+                'id': doc.id,
+                'title': doc.title,
+                'maqam': doc.maqam,
+                'region': doc.region,
+                'poem_bahr': doc.poem_bahr,
+                'score': score,
+                'matched_terms': matched_terms,
+                'snippet': snippet
+            })
+        
+        return jsonify({'success': True, 'query': query_text, 'terms': terms, 'results': results})
+    except Exception as e:
+        logger.exception('Search error')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # DASHBOARD STATS ENDPOINT
 @app.route('/api/dashboard/stats')
+@use_replica
 def dashboard_stats():
     try:
-        songs_count = Song.query.count()
-        total_size = db.session.query(db.func.sum(Song.file_size)).scalar() or 0
+        counters = dict(db.session.query(StatCounter.name, StatCounter.value).all())
+        facets = {facet: {} for facet in STAT_FACETS}
+        for facet, value, count in db.session.query(
+            FacetCount.facet, FacetCount.value, FacetCount.count
+        ).filter(FacetCount.count > 0).order_by(FacetCount.count.desc()).all():
+            facets[facet][value] = count
         
-        maqams = db.session.query(Song.maqam).distinct().all()
-        regions = db.session.query(Song.region).distinct().all()
+        songs_count = counters.get('songs_count', 0)
+        total_size = counters.get('total_size', 0)
+        generated_count = counters.get('generated_count', 0)
         
         latest_training = TrainingSession.query.order_by(TrainingSession.created_at.desc()).first()
-        is_training = latest_training and latest_training.status == 'training' if latest_training else False
+        is_training = latest_training.status in ACTIVE_TRAINING_STATUSES if latest_training else False
         model_accuracy = latest_training.final_accuracy if latest_training and latest_training.final_accuracy else 0
         
         return jsonify({
@@ -434,11 +2684,13 @@ def dashboard_stats():
                 'total_songs': songs_count,
                 'total_size': total_size,
                 'total_size_mb': round(total_size / (1024 * 1024), 2) if total_size else 0,
-                'maqams': [m[0] for m in maqams],
-                'regions': [r[0] for r in regions],
-                'training_sessions': TrainingSession.query.count(),
-                'generated_songs': GeneratedSong.query.count(),
-                'generated_count': GeneratedSong.query.count(),
+                'maqams': list(facets['maqam']),
+                'regions': list(facets['region']),
+                'maqam_counts': facets['maqam'],
+                'region_counts': facets['region'],
+                'training_sessions': counters.get('training_sessions', 0),
+                'generated_songs': generated_count,
+                'generated_count': generated_count,
                 'is_training': is_training,
                 'model_accuracy': model_accuracy
             }
@@ -446,43 +2698,267 @@ def dashboard_stats():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Read-only snapshot of the latest training session
+def read_training_status():
+    latest_session = TrainingSession.query.order_by(TrainingSession.created_at.desc()).first()
+    
+    if not latest_session:
+        return {
+            'is_training': False, 'progress': 0, 'current_epoch': 0,
+            'current_loss': 0, 'status': 'not_started'
+        }
+    
+    return {
+        'is_training': latest_session.status in ACTIVE_TRAINING_STATUSES,
+        'progress': latest_session.progress,
+        'current_epoch': latest_session.current_epoch or 0,
+        'current_loss': latest_session.current_loss or 0,
+        'status': latest_session.status,
+        'session_id': latest_session.session_id,
+        'model_name': latest_session.model_name
+    }
+
+# Identifies a status snapshot, so watchers can ask for "anything newer than this"
+def status_token(status):
+    return f"{status.get('session_id', '')}:{status['status']}:{status['progress']}:{status['current_epoch']}"
+
+# One optimisation step over a batch of dataset samples, returning the batch loss.
+# This is where the model's forward/backward pass plugs in; until then it
+# follows a decaying loss curve so the job machinery can be exercised end to end.
+def train_step(state, samples, learning_rate):
+    time.sleep(TRAINING_STEP_SECONDS)
+    state['steps'] = state.get('steps', 0) + 1
+    decay = math.exp(-state['steps'] * learning_rate * 100)
+    return round(0.1 + 2.0 * decay + random.uniform(0, 0.05), 4)
+
+# Write progress for a session this worker still owns. Returns False once the
+# session was stopped or reclaimed by another worker, which ends the job.
+def report_training_progress(session_id, worker_id, **values):
+    updated = db.session.execute(
+        db.update(TrainingSession)
+        .where(TrainingSession.session_id == session_id,
+               TrainingSession.status == 'training',
+               TrainingSession.worker_id == worker_id)
+        .values(heartbeat_at=datetime.utcnow(), **values)
+    ).rowcount
+    db.session.commit()
+    return bool(updated)
+
+# Run (or resume from its checkpoint) one training session. Executes in a
+# training worker process, never in a web worker.
+def train_session(session_id, worker_id):
+    with app.app_context():
+        try:
+            session = TrainingSession.query.filter_by(session_id=session_id).first()
+            checkpoint = json.loads(session.checkpoint) if session.checkpoint else {}
+            epochs = session.epochs
+            batch_size = max(1, session.batch_size or 1)
+            learning_rate = session.learning_rate
+            state = checkpoint.get('state', {})
+            loss = checkpoint.get('loss')
+            db.session.commit()
+            
+            songs_count = db.session.query(StatCounter.value).filter_by(name='songs_count').scalar() or 0
+            batches_per_epoch = max(1, math.ceil(songs_count / batch_size))
+            total_steps = epochs * batches_per_epoch
+            
+            logger.info('Training started', extra={'session_id': session_id, 'from_epoch': checkpoint.get('epoch', 0), 'epochs': epochs})
+            last_report = 0
+            for epoch in range(checkpoint.get('epoch', 0), epochs):
+                # The stand-in train_step needs no audio; a real model would load it
+                batches = iter_dataset_batches(batch_size, include_audio=False)
+                for batch_index, batch in enumerate(batches):
+                    loss = train_step(state, batch, learning_rate)
+                    
+                    if time.monotonic() - last_report >= TRAINING_REPORT_SECONDS:
+                        last_report = time.monotonic()
+                        step = epoch * batches_per_epoch + batch_index + 1
+                        if not report_training_progress(
+                            session_id, worker_id, current_epoch=epoch, current_loss=loss,
+                            progress=min(99, int(step * 100 / total_steps))
+                        ):
+                            logger.info('Training stopped', extra={'session_id': session_id, 'epoch': epoch})
+                            return
+                
+                # Checkpoint after every epoch so a stop or crash resumes here
+                checkpoint = {'epoch': epoch + 1, 'loss': loss, 'state': state}
+                if not report_training_progress(
+                    session_id, worker_id, current_epoch=epoch + 1, current_loss=loss,
+                    progress=min(99, int((epoch + 1) * 100 / epochs)), checkpoint=json.dumps(checkpoint)
+                ):
+                    logger.info('Training stopped', extra={'session_id': session_id, 'epoch': epoch + 1})
+                    return
+            
+            report_training_progress(
+                session_id, worker_id, status='completed', progress=100,
+                final_accuracy=round(max(0.0, 1 - (loss or 0) / 2), 4), completed_at=datetime.utcnow()
+            )
+            logger.info('Training completed', extra={'session_id': session_id, 'loss': loss})
+        except Exception:
+            db.session.rollback()
+            logger.exception('Training failed', extra={'session_id': session_id})
+            report_training_progress(session_id, worker_id, status='failed', completed_at=datetime.utcnow())
+
+# Give each forked worker process its own DB connections
+def init_worker_process():
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+# Shared loop of the background worker commands: claim(worker_id) returns the
+# next unit of work (or None) and run(work, worker_id) executes it in a bounded
+# process pool. Unfinished work is picked up again once its lease expires.
+def run_worker_pool(name, processes, poll_seconds, claim, run):
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    logger.info('Worker started', extra={'worker': name, 'worker_id': worker_id, 'processes': processes})
+    running = set()
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_worker_process) as executor:
+        try:
+            while True:
+                running = {future for future in running if not future.done()}
+                while len(running) < processes:
+                    with app.app_context():
+                        work = claim(worker_id)
+                    if not work:
+                        break
+                    running.add(executor.submit(run, work, worker_id))
+                time.sleep(poll_seconds)
+        except KeyboardInterrupt:
+            logger.info('Worker shutting down', extra={'worker': name, 'worker_id': worker_id})
+            executor.shutdown(cancel_futures=True)
+
+# Claim the oldest queued session, or one whose worker stopped heartbeating.
+# SKIP LOCKED lets several training workers poll the same table safely.
+def claim_training_session(worker_id):
+    stale = datetime.utcnow() - timedelta(seconds=TRAINING_LEASE_SECONDS)
+    session = (
+        TrainingSession.query
+        .filter(db.or_(
+            TrainingSession.status == 'queued',
+            db.and_(TrainingSession.status == 'training',
+                    db.or_(TrainingSession.heartbeat_at.is_(None), TrainingSession.heartbeat_at < stale))
+        ))
+        .order_by(TrainingSession.created_at)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if not session:
+        db.session.commit()
+        return None
+    
+    session.status = 'training'
+    session.worker_id = worker_id
+    session.heartbeat_at = datetime.utcnow()
+    db.session.commit()
+    return session.session_id
+
+@app.cli.command('training-worker')
+@click.option('--processes', default=1, show_default=True, help='Training sessions run in parallel.')
+@click.option('--poll-seconds', default=2.0, show_default=True, help='How often to look for queued sessions.')
+def training_worker(processes, poll_seconds):
+    """Run queued training sessions in a pool of worker processes."""
+    run_worker_pool('Training', processes, poll_seconds, claim_training_session, train_session)
+
+# Fans training status out to every watcher in this worker from one polling thread.
+# The thread runs only while someone is watching.
+class TrainingStatusHub:
+    def __init__(self, poll_seconds):
+        self.poll_seconds = poll_seconds
+        self.condition = threading.Condition()
+        self.status = None
+        self.watchers = 0
+        self.thread = None
+    
+    def _poll(self):
+        while True:
+            try:
+                with app.app_context():
+                    status = read_training_status()
+            except Exception:
+                logger.exception('Training status poll error')
+                status = self.status
+            with self.condition:
+                if status != self.status:
+                    self.status = status
+                    self.condition.notify_all()
+                if self.watchers == 0:
+                    self.thread = None
+                    return
+            time.sleep(self.poll_seconds)
+    
+    # Block until the status differs from since_token (or timeout), then return it
+    def wait(self, since_token, timeout):
+        with self.condition:
+            self.watchers += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._poll, daemon=True)
+                self.thread.start()
+            try:
+                self.condition.wait_for(
+                    lambda: self.status is not None and status_token(self.status) != since_token,
+                    timeout
+                )
+                return self.status
+            finally:
+                self.watchers -= 1
+
+training_hub = TrainingStatusHub(TRAINING_POLL_SECONDS)
+
 # TRAINING ENDPOINTS
 @app.route('/api/training/status')
 def training_status():
     try:
-        latest_session = TrainingSession.query.order_by(TrainingSession.created_at.desc()).first()
-        
-        if not latest_session:
-            return jsonify({
-                'success': True,
-                'status': {
-                    'is_training': False, 'progress': 0, 'current_epoch': 0,
-                    'current_loss': 0, 'status': 'not_started'
-                }
-            })
-        
-        if latest_session.status == 'training' and latest_session.progress < 100:
-            latest_session.progress = min(100, latest_session.progress + random.randint(2, 8))
-            if latest_session.progress >= 100:
-                latest_session.status = 'completed'
-                latest_session.final_accuracy = random.uniform(0.85, 0.95)
-                latest_session.completed_at = datetime.utcnow()
-            db.session.commit()
+        # Long-poll fallback: ?since=<token>&wait=<seconds> holds until the status changes
+        since = request.args.get('since')
+        wait = min(request.args.get('wait', 0, type=float), 30)
+        if since is not None and wait > 0:
+            status = training_hub.wait(since, wait) or read_training_status()
+        else:
+            status = read_training_status()
         
-        return jsonify({
-            'success': True,
-            'status': {
-                'is_training': latest_session.status == 'training',
-                'progress': latest_session.progress,
-                'current_epoch': int(latest_session.progress * latest_session.epochs / 100),
-                'current_loss': round(random.uniform(0.1, 0.5), 3),
-                'status': latest_session.status,
-                'session_id': latest_session.session_id
-            }
-        })
+        return jsonify({'success': True, 'status': status, 'token': status_token(status)})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/training/stream')
+@admission_class('stream')
+def training_stream():
+    last_event_id = request.headers.get('Last-Event-ID')  # Set by EventSource on reconnect
+    
+    # The client already saw the session finish: tell it to stop reconnecting
+    if last_event_id:
+        status = read_training_status()
+        finished = status['status'] not in ACTIVE_TRAINING_STATUSES and status_token(status) == last_event_id
+    else:
+        finished = False
+    
+    # Ends after a terminal status or TRAINING_STREAM_SECONDS, whichever comes first
+    def events():
+        yield f'retry: {TRAINING_STREAM_RETRY_MS}\n\n'
+        if finished:
+            yield 'event: end\ndata: {}\n\n'
+            return
+        token = last_event_id
+        deadline = time.monotonic() + TRAINING_STREAM_SECONDS
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            status = training_hub.wait(token, min(15, remaining))
+            if status is None or status_token(status) == token:
+                yield ': keepalive\n\n'
+                continue
+            token = status_token(status)
+            yield f'event: progress\nid: {token}\ndata: {json.dumps(status)}\n\n'
+            if status['status'] not in ACTIVE_TRAINING_STATUSES:
+                yield 'event: end\ndata: {}\n\n'
+                return
+    
+    response = Response(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Let proxies pass events through immediately
+    return response
+
 @app.route('/api/training/start', methods=['POST'])
 def start_training():
     try:
@@ -494,10 +2970,24 @@ def start_training():
             }), 400
         
         data = request.get_json() or {}
+        model_name = data.get('model_name', 'default')
+        
+        active = TrainingSession.query.filter(
+            TrainingSession.model_name == model_name,
+            TrainingSession.status.in_(ACTIVE_TRAINING_STATUSES)
+        ).first()
+        if active:
+            return jsonify({
+                'success': False,
+                'error': f'Model "{model_name}" already has an active training session.',
+                'session_id': active.session_id
+            }), 409
+        
         session_id = str(uuid.uuid4())
         
+        # Queued for the training worker, which claims it and reports progress
         training_session = TrainingSession(
-            session_id=session_id, status='training', progress=0,
+            session_id=session_id, model_name=model_name, status='queued', progress=0,
             epochs=int(data.get('epochs', 25)),
             learning_rate=float(data.get('learning_rate', 0.001)),
             batch_size=int(data.get('batch_size', 32)),
@@ -505,7 +2995,16 @@ def start_training():
         )
         
         db.session.add(training_session)
-        db.session.commit()
+        adjust_counter('training_sessions', 1)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Lost a race with another start for the same model
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'error': f'Model "{model_name}" already has an active training session.'
+            }), 409
         
         return jsonify({
             'success': True, 'session_id': session_id,
@@ -519,9 +3018,13 @@ def start_training():
 @app.route('/api/training/stop', methods=['POST'])
 def stop_training():
     try:
-        latest_session = TrainingSession.query.filter_by(status='training').order_by(TrainingSession.created_at.desc()).first()
+        latest_session = TrainingSession.query.filter(
+            TrainingSession.status.in_(ACTIVE_TRAINING_STATUSES)
+        ).order_by(TrainingSession.created_at.desc()).first()
         
         if latest_session:
+            # The worker sees this at its next report and exits; the last
+            # epoch checkpoint is kept so the session can be resumed
             latest_session.status = 'stopped'
             latest_session.completed_at = datetime.utcnow()
             db.session.commit()
@@ -532,6 +3035,951 @@ def stop_training():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/training/resume', methods=['POST'])
+def resume_training():
+    try:
+        data = request.get_json(silent=True) or {}
+        model_name = data.get('model_name', 'default')
+        
+        latest_session = TrainingSession.query.filter(
+            TrainingSession.model_name == model_name,
+            TrainingSession.status.in_(('stopped', 'failed'))
+        ).order_by(TrainingSession.created_at.desc()).first()
+        
+        if not latest_session:
+            return jsonify({'success': False, 'error': 'No stopped training session found'}), 400
+        
+        # Requeue; the worker continues from the last completed epoch
+        latest_session.status = 'queued'
+        latest_session.worker_id = None
+        latest_session.completed_at = None
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({
+                'success': False,
+                'error': f'Model "{model_name}" already has an active training session.'
+            }), 409
+        
+        return jsonify({
+            'success': True, 'session_id': latest_session.session_id,
+            'message': 'Training resumed successfully!'
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Normalise one set of generation parameters, applying the defaults
+def generation_params(data):
+    return {
+        'lyrics': data.get('lyrics'),
+        'title': data.get('title') or None,
+        'maqam': data.get('maqam', 'hijaz'),
+        'style': data.get('style', 'modern'),
+        'emotion': data.get('emotion', 'neutral'),
+        'region': data.get('region', 'mixed'),
+        'composer': data.get('composer') or None,
+        'poem_bahr': data.get('poem_bahr') or None,
+        'creativity': int(data.get('creativity', DEFAULT_CREATIVITY)),
+        'model_version': data.get('model_version', MODEL_VERSION)
+    }
+
+# Identical lyrics (ignoring whitespace and Unicode form) with identical musical
+# parameters and model give the same key. Creativity is only part of the key when
+# it is not the default, so keys stored before it was added still match.
+def generation_cache_key(params):
+    lyrics = unicodedata.normalize('NFC', params['lyrics'] or '')
+    lyrics = '\n'.join(' '.join(line.split()) for line in lyrics.strip().splitlines() if line.strip())
+    key = [lyrics, params['maqam'], params['style'], params['emotion'], params['region'],
+           params['model_version'], TRAINING_SESSION_ID]
+    if params['creativity'] != DEFAULT_CREATIVITY:
+        key.append(params['creativity'])
+    return hashlib.sha256(json.dumps(key, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+# A request asks for a fresh sample with "nocache"
+def wants_fresh_sample(data):
+    return str(data.get('nocache', '')).lower() in ('1', 'true', 'yes')
+
+# Bounded LRU of cache key -> generated song id, backed by generated_songs.cache_key.
+# Counters are per worker process.
+class GenerationCache:
+    def __init__(self, max_entries, persistent):
+        self.max_entries = max_entries
+        self.persistent = persistent
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'bypassed': 0, 'evictions': 0}
+    
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+    
+    def lookup(self, key):
+        with self.lock:
+            song_id = self.entries.get(key)
+            if song_id is not None:
+                self.entries.move_to_end(key)
+        
+        if song_id is not None:
+            song = db.session.get(GeneratedSong, song_id)
+            if song and song.cache_key == key:
+                self.count('memory_hits')
+                return song
+            self.evict(key)  # Song was deleted or re-tagged since it was cached
+        
+        if self.persistent:
+            song = GeneratedSong.query.filter_by(cache_key=key).order_by(GeneratedSong.id.desc()).first()
+            if song:
+                self.count('db_hits')
+                self.store(key, song.id)
+                return song
+        
+        self.count('misses')
+        return None
+    
+    def store(self, key, song_id):
+        with self.lock:
+            self.entries[key] = song_id
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+    
+    def evict(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.counters['memory_hits'] + self.counters['db_hits'] + self.counters['misses']
+            hits = self.counters['memory_hits'] + self.counters['db_hits']
+            return {
+                **self.counters,
+                'hit_rate': round(hits / lookups, 4) if lookups else 0,
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'persistent': self.persistent,
+                'pid': os.getpid()
+            }
+
+generation_cache = GenerationCache(app.config['GENERATION_CACHE_SIZE'], app.config['GENERATION_CACHE_PERSISTENT'])
+
+# Give untitled songs a default title numbered like the old count()-based one.
+# Call after adding them to generated_count in the same transaction: the counter
+# row stays locked until commit, so concurrent batches get distinct numbers.
+def number_generated_songs(songs):
+    count = db.session.query(StatCounter.value).filter_by(name='generated_count').scalar() or 0
+    for number, song in enumerate(songs, start=count - len(songs) + 1):
+        song.title = song.title or f'Generated Song {number}'
+
+# Generate songs for a list of parameter sets sharing maqam/style/model_version.
+# This is where batched model inference plugs in; songs are returned unsaved.
+def generate_batch(params_list):
+    songs = []
+    for params in params_list:
+        songs.append(GeneratedSong(
+            title=params['title'],
+            lyrics=params['lyrics'],
+            maqam=params['maqam'],
+            style=params['style'],
+            tempo=120,  # Default tempo
+            emotion=params['emotion'],
+            region=params['region'],
+            composer=params['composer'],
+            poem_bahr=params['poem_bahr'] or analyse_meter(params['lyrics'])['bahr'],
+            duration='Medium',
+            instruments='Modern',
+            creativity=params['creativity'],
+            generation_time=round(random.uniform(2.0, 5.0), 1),
+            model_version=params['model_version'],
+            training_session_id=TRAINING_SESSION_ID,
+            cache_key=generation_cache_key(params)
+        ))
+    return songs
+
+# Claim the oldest queued generation job plus up to GENERATION_BATCH_SIZE - 1
+# queued jobs with the same maqam/style/model_version. Returns their ids.
+def claim_generation_batch(worker_id):
+    now = datetime.utcnow()
+    
+    # Jobs left running by a worker that stopped heartbeating go back to the queue
+    db.session.execute(
+        db.update(GenerationJob)
+        .where(GenerationJob.status == 'running',
+               db.func.coalesce(GenerationJob.heartbeat_at, GenerationJob.started_at)
+               < now - timedelta(seconds=GENERATION_LEASE_SECONDS))
+        .values(status='queued', worker_id=None)
+    )
+    
+    first = (
+        GenerationJob.query.filter_by(status='queued')
+        .order_by(GenerationJob.created_at, GenerationJob.id)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if not first:
+        db.session.commit()
+        return None
+    
+    jobs = [first] + (
+        GenerationJob.query
+        .filter(GenerationJob.status == 'queued',
+                GenerationJob.maqam == first.maqam,
+                GenerationJob.style == first.style,
+                GenerationJob.model_version == first.model_version,
+                GenerationJob.id != first.id)
+        .order_by(GenerationJob.created_at, GenerationJob.id)
+        .limit(GENERATION_BATCH_SIZE - 1)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for job in jobs:
+        job.status = 'running'
+        job.worker_id = worker_id
+        job.started_at = now
+        job.heartbeat_at = now
+    db.session.commit()
+    return [job.id for job in jobs]
+
+# Jobs of a claimed batch that this worker still runs
+def owned_generation_jobs(job_ids, worker_id):
+    return (GenerationJob.id.in_(job_ids), GenerationJob.worker_id == worker_id, GenerationJob.status == 'running')
+
+# Refresh a claimed batch's lease from a background thread while it runs, so a
+# slow batch is not requeued and generated twice. Returns a function that stops it.
+def keep_generation_lease(job_ids, worker_id):
+    stopped = threading.Event()
+    
+    def beat():
+        while not stopped.wait(GENERATION_HEARTBEAT_SECONDS):
+            try:
+                with app.app_context():
+                    db.session.execute(
+                        db.update(GenerationJob)
+                        .where(*owned_generation_jobs(job_ids, worker_id))
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+                    db.session.commit()
+            except Exception:
+                logger.exception('Generation heartbeat failed')
+    
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    
+    def stop():
+        stopped.set()
+        thread.join()
+    return stop
+
+# Run one claimed batch of generation jobs in a generation worker process
+def run_generation_batch(job_ids, worker_id):
+    with app.app_context():
+        stop_heartbeat = keep_generation_lease(job_ids, worker_id)
+        try:
+            jobs = [(job.id, json.loads(job.params)) for job in GenerationJob.query.filter(
+                *owned_generation_jobs(job_ids, worker_id)
+            ).order_by(GenerationJob.id)]
+            db.session.commit()  # No transaction held open while generating
+            songs = generate_batch([params for _, params in jobs])
+            
+            # Complete only the jobs still ours: a job requeued after a lost lease
+            # belongs to whichever worker claimed it since
+            now = datetime.utcnow()
+            completed = []
+            for (job_id, params), song in zip(jobs, songs):
+                if db.session.execute(
+                    db.update(GenerationJob)
+                    .where(GenerationJob.id == job_id, *owned_generation_jobs(job_ids, worker_id))
+                    .values(status='completed', completed_at=now)
+                ).rowcount:
+                    completed.append((job_id, song))
+            
+            songs = [song for _, song in completed]
+            adjust_counter('generated_count', len(songs))
+            number_generated_songs(songs)
+            db.session.add_all(songs)
+            db.session.flush()
+            for job_id, song in completed:
+                db.session.execute(
+                    db.update(GenerationJob).where(GenerationJob.id == job_id).values(generated_song_id=song.id)
+                )
+                index_document('generated', song)
+            db.session.commit()
+            if completed:
+                logger.info('Generation batch completed', extra={
+                    'songs': len(songs), 'maqam': songs[0].maqam, 'style': songs[0].style,
+                    'lost_jobs': len(jobs) - len(completed)
+                })
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('Generation batch failed')
+            db.session.execute(
+                db.update(GenerationJob)
+                .where(*owned_generation_jobs(job_ids, worker_id))
+                .values(status='failed', error=str(e), completed_at=datetime.utcnow())
+            )
+            db.session.commit()
+        finally:
+            stop_heartbeat()
+
+@app.cli.command('generation-worker')
+@click.option('--processes', default=2, show_default=True, help='Batches generated in parallel.')
+@click.option('--poll-seconds', default=1.0, show_default=True, help='How often to look for queued jobs.')
+def generation_worker(processes, poll_seconds):
+    """Run queued generation jobs in batches in a pool of worker processes."""
+    run_worker_pool('Generation', processes, poll_seconds, claim_generation_batch, run_generation_batch)
+
+# AUDIO FEATURES
+# Decoders turn a complete audio file into (samples, sample_rate), samples being
+# float32 in [-1, 1] shaped (frames, channels). Formats can be added with
+# @audio_decoder('<format>'); anything without a decoder goes through
+# AUDIO_DECODER_COMMAND.
+AUDIO_DECODERS = {}
+COMMAND_DECODER_SAMPLE_RATE = 22050
+PITCH_REFERENCE_HZ = 261.6256  # C4, pitch class 0
+
+def audio_decoder(audio_format):
+    def register(decode):
+        AUDIO_DECODERS[audio_format] = decode
+        return decode
+    return register
+
+# Container format from the leading bytes, since stored audio has no filename
+def sniff_audio_format(head):
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'wav'
+    if head[:4] == b'fLaC':
+        return 'flac'
+    if head[:4] == b'OggS':
+        return 'ogg'
+    if head[:3] == b'ID3' or head[:2] in (b'\xff\xfb', b'\xff\xf3', b'\xff\xf2'):
+        return 'mp3'
+    if head[4:8] == b'ftyp':
+        return 'm4a'
+    return 'unknown'
+
+@audio_decoder('wav')
+def decode_wav(data):
+    with wave.open(io.BytesIO(data)) as wav:
+        channels, width, sample_rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        raw = wav.readframes(wav.getnframes())
+    
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 3:
+        # Packed 24-bit: assemble into int32, sign taken from the high byte
+        packed = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        high = packed[:, 2] - ((packed[:, 2] & 0x80) << 1)
+        samples = (packed[:, 0] | (packed[:, 1] << 8) | (high << 16)).astype(np.float32) / 2 ** 23
+    elif width in (2, 4):
+        samples = np.frombuffer(raw, dtype=f'<i{width}').astype(np.float32) / 2 ** (8 * width - 1)
+    else:
+        raise ValueError(f'Unsupported WAV sample width: {width} bytes')
+    return samples.reshape(-1, channels), sample_rate
+
+if soundfile:
+    @audio_decoder('flac')
+    @audio_decoder('ogg')
+    def decode_soundfile(data):
+        return soundfile.read(io.BytesIO(data), dtype='float32', always_2d=True)
+
+# Fallback decoder: pipe the file through ffmpeg (or a compatible command) as mono float32
+def decode_with_command(data):
+    command = [
+        app.config['AUDIO_DECODER_COMMAND'], '-v', 'error', '-i', 'pipe:0',
+        '-f', 'f32le', '-ac', '1', '-ar', str(COMMAND_DECODER_SAMPLE_RATE), 'pipe:1'
+    ]
+    try:
+        result = subprocess.run(command, input=data, capture_output=True)
+    except FileNotFoundError:
+        raise ValueError(f"Decoder not found: {command[0]} (install ffmpeg or set AUDIO_DECODER_COMMAND)")
+    if result.returncode != 0:
+        raise ValueError(f"Decoder failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+    return np.frombuffer(result.stdout, dtype='<f4').reshape(-1, 1), COMMAND_DECODER_SAMPLE_RATE
+
+# Decode a complete file, returning (samples, sample_rate)
+def decode_audio_bytes(data):
+    decode = AUDIO_DECODERS.get(sniff_audio_format(data[:16]), decode_with_command)
+    samples, sample_rate = decode(data)
+    if not len(samples):
+        raise ValueError('No audio samples decoded')
+    return samples, sample_rate
+
+def decode_audio(sha256):
+    content = db.session.get(AudioContent, sha256)
+    if content is None:
+        raise ValueError(f'Audio {sha256} not found')
+    return decode_audio_bytes(b''.join(iter_audio_chunks(sha256, content.chunk_size, 0, content.size)))
+
+# Frame-level spectral analysis of a mono signal in one pass. Returns the onset
+# strength per frame (spectral flux) and the quarter-tone pitch-class histogram
+# of spectral peaks, weighted by peak power and normalised to sum to 1.
+def spectral_profile(mono, sample_rate):
+    if len(mono) < FEATURE_FRAME_SIZE:
+        mono = np.pad(mono, (0, FEATURE_FRAME_SIZE - len(mono)))
+    frames = np.lib.stride_tricks.sliding_window_view(mono, FEATURE_FRAME_SIZE)[::FEATURE_HOP_SIZE]
+    window = np.hanning(FEATURE_FRAME_SIZE).astype(np.float32)
+    low, high = FEATURE_PITCH_RANGE
+    
+    onset = np.empty(len(frames), dtype=np.float32)
+    histogram = np.zeros(PITCH_CLASSES)
+    previous = None
+    for start in range(0, len(frames), FEATURE_BLOCK_FRAMES):
+        magnitude = np.abs(np.fft.rfft(frames[start:start + FEATURE_BLOCK_FRAMES] * window, axis=1)).astype(np.float32)
+        
+        # Onset strength: summed increase in log magnitude since the previous frame
+        compressed = np.log1p(100 * magnitude)
+        before = np.vstack([compressed[:1] if previous is None else previous, compressed[:-1]])
+        onset[start:start + len(magnitude)] = np.maximum(compressed - before, 0).sum(axis=1)
+        previous = compressed[-1:]
+        
+        # Spectral peaks above 1% of their frame's maximum, located to a fraction
+        # of a bin by parabolic interpolation, folded into quarter-tone classes
+        left, centre, right = magnitude[:, :-2], magnitude[:, 1:-1], magnitude[:, 2:]
+        floor = 0.01 * magnitude.max(axis=1, keepdims=True)
+        frame_index, bin_index = np.nonzero((centre > left) & (centre >= right) & (centre > floor))
+        a, b, c = left[frame_index, bin_index], centre[frame_index, bin_index], right[frame_index, bin_index]
+        curvature = a - 2 * b + c
+        offset = np.divide(0.5 * (a - c), curvature, out=np.zeros_like(curvature), where=curvature != 0)
+        frequency = (bin_index + 1 + offset) * sample_rate / FEATURE_FRAME_SIZE
+        keep = (frequency >= low) & (frequency <= high)
+        classes = np.round(PITCH_CLASSES * np.log2(frequency[keep] / PITCH_REFERENCE_HZ)).astype(np.int64) % PITCH_CLASSES
+        histogram += np.bincount(classes, weights=np.square(b[keep], dtype=np.float64), minlength=PITCH_CLASSES)
+    
+    total = histogram.sum()
+    return onset, histogram / total if total > 0 else histogram
+
+# Tempo in BPM from the onset envelope's autocorrelation, searched within
+# FEATURE_TEMPO_RANGE. None for clips too short to hold two slow beats.
+def estimate_tempo(onset, frame_rate):
+    slowest, fastest = FEATURE_TEMPO_RANGE
+    max_lag = int(frame_rate * 60 / slowest)
+    min_lag = max(1, int(frame_rate * 60 / fastest))
+    if len(onset) < 2 * max_lag:
+        return None
+    
+    envelope = onset - onset.mean()
+    spectrum = np.fft.rfft(envelope, n=2 * len(envelope))
+    autocorrelation = np.fft.irfft(spectrum * np.conj(spectrum))[:max_lag + 2]
+    if autocorrelation[0] <= 0:
+        return None
+    
+    lag = min_lag + int(np.argmax(autocorrelation[min_lag:max_lag + 1]))
+    a, b, c = autocorrelation[lag - 1:lag + 2]
+    curvature = a - 2 * b + c
+    refined = lag + (0.5 * (a - c) / curvature if curvature < 0 else 0)
+    return round(float(60 * frame_rate / refined), 1)
+
+def mono_mix(samples):
+    return samples.mean(axis=1, dtype=np.float32) if samples.shape[1] > 1 else samples[:, 0]
+
+# All stored features for decoded audio, as AudioFeature column values
+def analyse_audio(samples, sample_rate):
+    mono = mono_mix(samples)
+    rms = float(np.sqrt(np.mean(mono * mono, dtype=np.float64)))
+    onset, histogram = spectral_profile(mono, sample_rate)
+    tempo = estimate_tempo(onset, sample_rate / FEATURE_HOP_SIZE)
+    return {
+        'sample_rate': int(sample_rate),
+        'channels': int(samples.shape[1]),
+        'duration': round(len(mono) / sample_rate, 3),
+        'rms': round(rms, 6),
+        'loudness_db': round(20 * math.log10(rms), 2) if rms > 0 else None,
+        'tempo': tempo,
+        'pitch_histogram': histogram.astype('<f4').tobytes()
+    }
+
+# Min/max peaks of a mono signal at every PEAK_RESOLUTIONS, as {resolution: bytes}.
+# One pass over the samples at the finest resolution; coarser ones reduce groups
+# of its buckets, whose boundaries line up exactly.
+def compute_peaks(mono):
+    finest = max(PEAK_RESOLUTIONS)
+    if len(mono) < finest:
+        mono = np.pad(mono, (0, finest - len(mono)))
+    starts = (np.arange(finest, dtype=np.int64) * len(mono)) // finest
+    minimums = np.minimum.reduceat(mono, starts)
+    maximums = np.maximum.reduceat(mono, starts)
+    
+    peaks = {}
+    for resolution in PEAK_RESOLUTIONS:
+        group = finest // resolution
+        pairs = np.stack([minimums.reshape(resolution, group).min(axis=1),
+                          maximums.reshape(resolution, group).max(axis=1)], axis=1)
+        peaks[resolution] = np.clip(np.round(pairs * 32767), -32768, 32767).astype('<i2').tobytes()
+    return peaks
+
+# Acoustic fingerprints: spectral peaks of the mono signal resampled to
+# FINGERPRINT_SAMPLE_RATE, paired into (f1, f2, dt) landmark hashes.
+# Resampling first makes hashes comparable across encodings and sample rates.
+def fingerprint_audio(mono, sample_rate):
+    length = int(len(mono) * FINGERPRINT_SAMPLE_RATE / sample_rate)
+    if sample_rate != FINGERPRINT_SAMPLE_RATE and length > 1:
+        # Linear interpolation, computed on the output grid only
+        position = np.arange(length) * (sample_rate / FINGERPRINT_SAMPLE_RATE)
+        index = np.minimum(position.astype(np.int64), len(mono) - 2)
+        fraction = (position - index).astype(np.float32)
+        mono = mono[index] * (1 - fraction) + mono[index + 1] * fraction
+    if len(mono) < FINGERPRINT_FRAME_SIZE:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    
+    # Strongest bin of each frequency band in every frame
+    frames = np.lib.stride_tricks.sliding_window_view(mono, FINGERPRINT_FRAME_SIZE)[::FINGERPRINT_HOP_SIZE]
+    window = np.hanning(FINGERPRINT_FRAME_SIZE).astype(np.float32)
+    bands = list(zip(FINGERPRINT_BANDS[:-1], FINGERPRINT_BANDS[1:]))
+    strength = np.empty((len(frames), len(bands)), dtype=np.float32)
+    frequency = np.empty((len(frames), len(bands)), dtype=np.int64)
+    for start in range(0, len(frames), FEATURE_BLOCK_FRAMES):
+        spectrum = np.log1p(np.abs(np.fft.rfft(frames[start:start + FEATURE_BLOCK_FRAMES] * window, axis=1)))
+        stop = start + len(spectrum)
+        for band, (low, high) in enumerate(bands):
+            best = np.argmax(spectrum[:, low:high], axis=1)
+            frequency[start:stop, band] = low + best
+            strength[start:stop, band] = spectrum[np.arange(len(spectrum)), low + best]
+    
+    # Peaks: above the band's average and the maximum of their band within
+    # FINGERPRINT_PEAK_SPREAD frames either side
+    strength -= strength.mean(axis=0)
+    spread = FINGERPRINT_PEAK_SPREAD
+    padded = np.pad(strength, ((spread, spread), (0, 0)), constant_values=-np.inf)
+    local_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * spread + 1, axis=0).max(axis=2)
+    peak_time, peak_band = np.nonzero((strength > 0) & (strength == local_max))
+    peak_frequency = frequency[peak_time, peak_band]
+    
+    # Pair each peak with the next FINGERPRINT_FAN_OUT peaks
+    hashes, offsets = [], []
+    for step in range(1, FINGERPRINT_FAN_OUT + 1):
+        dt = peak_time[step:] - peak_time[:-step]
+        keep = (dt > 0) & (dt < FINGERPRINT_MAX_DT)
+        anchor = np.nonzero(keep)[0]
+        hashes.append((peak_frequency[anchor] << 18) | (peak_frequency[anchor + step] << 9) | dt[keep])
+        offsets.append(peak_time[anchor])
+    return np.concatenate(hashes), np.concatenate(offsets)
+
+# Stored files matching a clip's fingerprint, best first, as [(sha256, score)].
+# Looks up only the clip's hashes in the inverted index; score is the fraction
+# of them that line up at one time offset in the candidate.
+def match_fingerprint(hashes, offsets, exclude=None):
+    if not len(hashes):
+        return []
+    order = np.argsort(hashes, kind='stable')
+    query_hashes, query_offsets = hashes[order], offsets[order]
+    unique_hashes = np.unique(query_hashes)
+    
+    found_hashes, found_files, found_offsets = [], [], []
+    files = {}
+    for start in range(0, len(unique_hashes), FINGERPRINT_LOOKUP_BATCH):
+        batch = [int(value) for value in unique_hashes[start:start + FINGERPRINT_LOOKUP_BATCH]]
+        rows = db.session.execute(
+            db.select(AudioFingerprint.hash, AudioFingerprint.sha256, AudioFingerprint.offset)
+            .where(AudioFingerprint.hash.in_(batch))
+        ).all()
+        for value, sha256, offset in rows:
+            if sha256 != exclude:
+                found_hashes.append(value)
+                found_files.append(files.setdefault(sha256, len(files)))
+                found_offsets.append(offset)
+    if not files:
+        return []
+    
+    # Expand every indexed hit against each clip occurrence of its hash, then
+    # count hits per (file, offset difference)
+    found_hashes = np.array(found_hashes, dtype=np.int64)
+    first = np.searchsorted(query_hashes, found_hashes, 'left')
+    counts = np.searchsorted(query_hashes, found_hashes, 'right') - first
+    hit = np.repeat(np.arange(len(found_hashes)), counts)
+    query_index = np.repeat(first, counts) + np.arange(len(hit)) - np.repeat(np.cumsum(counts) - counts, counts)
+    delta = np.array(found_offsets, dtype=np.int64)[hit] - query_offsets[query_index]
+    file_index = np.array(found_files, dtype=np.int64)[hit]
+    
+    keys, aligned = np.unique(file_index * (1 << 32) + delta + (1 << 31), return_counts=True)
+    best = np.zeros(len(files), dtype=np.int64)
+    np.maximum.at(best, keys >> 32, aligned)
+    
+    names = list(files)
+    matches = [
+        (names[index], round(min(1.0, float(count) / len(hashes)), 4))
+        for index, count in enumerate(best) if count >= FINGERPRINT_MIN_MATCHES
+    ]
+    return sorted(matches, key=lambda match: -match[1])
+
+# Add a stored file's hashes to the index, unless it is already there
+def store_fingerprint(sha256, hashes, offsets):
+    if db.session.query(AudioFingerprint.sha256).filter_by(sha256=sha256).first():
+        return
+    pairs = np.unique(np.stack([hashes, offsets], axis=1), axis=0)
+    rows = [{'sha256': sha256, 'hash': int(value), 'offset': int(offset)} for value, offset in pairs]
+    for start in range(0, len(rows), FINGERPRINT_LOOKUP_BATCH):
+        db.session.execute(db.insert(AudioFingerprint), rows[start:start + FINGERPRINT_LOOKUP_BATCH])
+
+# Songs for the given files, as {sha256: [{'id', 'title'}]}
+def songs_by_audio(sha256s):
+    songs = {}
+    for song_id, title, sha256 in (
+        db.session.query(Song.id, Song.title, Song.audio_sha256)
+        .filter(Song.audio_sha256.in_(list(sha256s))).order_by(Song.id)
+    ):
+        songs.setdefault(sha256, []).append({'id': song_id, 'title': title})
+    return songs
+
+# Fingerprint the start of an upload before it is stored and return the songs
+# it matches above the threshold. Audio that cannot be decoded from that prefix
+# is not checked; the feature worker still compares the whole file later.
+def check_upload_duplicates(head):
+    try:
+        samples, sample_rate = decode_audio_bytes(head)
+        hashes, offsets = fingerprint_audio(mono_mix(samples), sample_rate)
+    except Exception as e:
+        logger.warning('Could not fingerprint upload', extra={'error': str(e)})
+        return []
+    
+    threshold = app.config['DUPLICATE_THRESHOLD']
+    scores = dict(match for match in match_fingerprint(hashes, offsets) if match[1] >= threshold)
+    matches = [
+        {**song, 'score': scores[sha256]}
+        for sha256, songs in songs_by_audio(scores).items() for song in songs
+    ]
+    return sorted(matches, key=lambda match: -match['score'])
+
+# Record the stored files matching a file's fingerprint as duplicate pairs,
+# keeping the higher score when the pair was seen from the other side
+def record_duplicates(sha256, hashes, offsets):
+    threshold = app.config['DUPLICATE_THRESHOLD']
+    for other, score in match_fingerprint(hashes, offsets, exclude=sha256):
+        if score < threshold:
+            continue
+        first, second = sorted((sha256, other))
+        pair = db.session.get(AudioDuplicate, (first, second))
+        if pair is None:
+            db.session.add(AudioDuplicate(sha256=first, other_sha256=second, score=score, found_at=datetime.utcnow()))
+        elif score > pair.score:
+            pair.score = score
+
+# Queue stored files that have no feature row yet (audio stored before the
+# feature stage existed) or are missing peaks or fingerprints, plus failed
+# ones when retry_failed is set
+def queue_feature_extraction(retry_failed=False):
+    missing = db.select(AudioContent.sha256, db.literal('pending')).where(
+        ~db.exists().where(AudioFeature.sha256 == AudioContent.sha256)
+    )
+    queued = db.session.execute(
+        db.insert(AudioFeature).from_select(['sha256', 'status'], missing)
+    ).rowcount
+    queued += db.session.execute(
+        db.update(AudioFeature)
+        .where(AudioFeature.status == 'done', db.or_(
+            ~db.exists().where(AudioPeaks.sha256 == AudioFeature.sha256),
+            ~db.exists().where(AudioFingerprint.sha256 == AudioFeature.sha256)
+        ))
+        .values(status='pending')
+    ).rowcount
+    if retry_failed:
+        queued += db.session.execute(
+            db.update(AudioFeature).where(AudioFeature.status == 'failed').values(status='pending', error=None)
+        ).rowcount
+    db.session.commit()
+    return queued
+
+# Claim one pending file, or one whose worker has held it past the lease
+def claim_feature_extraction(worker_id):
+    stale = datetime.utcnow() - timedelta(seconds=FEATURE_LEASE_SECONDS)
+    feature = (
+        AudioFeature.query
+        .filter(db.or_(
+            AudioFeature.status == 'pending',
+            db.and_(AudioFeature.status == 'running', AudioFeature.claimed_at < stale)
+        ))
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if not feature:
+        db.session.commit()
+        return None
+    
+    feature.status = 'running'
+    feature.worker_id = worker_id
+    feature.claimed_at = datetime.utcnow()
+    db.session.commit()
+    return feature.sha256
+
+# Decode one stored file once and save its features, waveform peaks,
+# fingerprint and near-duplicate pairs. Songs using the file get the measured
+# tempo and duration. Executes in a feature worker process.
+def extract_features(sha256, worker_id):
+    with app.app_context():
+        owned = db.and_(AudioFeature.sha256 == sha256, AudioFeature.worker_id == worker_id)
+        try:
+            samples, sample_rate = decode_audio(sha256)
+            features = analyse_audio(samples, sample_rate)
+            mono = mono_mix(samples)
+            peaks = compute_peaks(mono)
+            hashes, offsets = fingerprint_audio(mono, sample_rate)
+            del samples, mono
+            
+            updated = db.session.execute(
+                db.update(AudioFeature).where(owned)
+                .values(status='done', error=None, extracted_at=datetime.utcnow(), **features)
+            ).rowcount
+            if updated:
+                AudioPeaks.query.filter_by(sha256=sha256).delete(synchronize_session=False)
+                db.session.execute(db.insert(AudioPeaks), [
+                    {'sha256': sha256, 'resolution': resolution, 'data': data}
+                    for resolution, data in peaks.items()
+                ])
+                store_fingerprint(sha256, hashes, offsets)
+                record_duplicates(sha256, hashes, offsets)
+                db.session.execute(
+                    db.update(Song).where(Song.audio_sha256 == sha256).values(
+                        tempo=round(features['tempo']) if features['tempo'] else Song.tempo,
+                        duration=features['duration'],
+                        version=Song.version + 1
+                    )
+                )
+            db.session.commit()
+            logger.info('Features extracted', extra={
+                'audio_sha256': sha256, 'duration': features['duration'], 'tempo': features['tempo']
+            })
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('Feature extraction failed', extra={'audio_sha256': sha256})
+            db.session.execute(db.update(AudioFeature).where(owned).values(status='failed', error=str(e)))
+            db.session.commit()
+
+@app.cli.command('feature-worker')
+@click.option('--processes', default=2, show_default=True, help='Files analysed in parallel.')
+@click.option('--poll-seconds', default=2.0, show_default=True, help='How often to look for new audio.')
+@click.option('--retry-failed', is_flag=True, help='Queue files whose extraction failed before.')
+def feature_worker(processes, poll_seconds, retry_failed):
+    """Extract features from stored audio in a pool of worker processes."""
+    with app.app_context():
+        queued = queue_feature_extraction(retry_failed)
+    logger.info('Queued stored audio for feature extraction', extra={'files': queued})
+    run_worker_pool('Feature', processes, poll_seconds, claim_feature_extraction, extract_features)
+
+@app.cli.command('find-duplicates')
+def find_duplicates_command():
+    """Recompute near-duplicate pairs from the stored fingerprints."""
+    rebuild_duplicates()
+
+# Duplicate report over the whole catalog, a page at a time. kind=near lists
+# the pairs of stored files the feature worker matched, best first; kind=exact
+# lists groups of songs sharing one identical file.
+@app.route('/api/songs/duplicates')
+@use_replica
+def song_duplicates():
+    try:
+        kind = request.args.get('kind', 'near')
+        threshold = request.args.get('threshold', app.config['DUPLICATE_THRESHOLD'], type=float)
+        limit = max(1, min(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        
+        if kind == 'near':
+            query = AudioDuplicate.query.filter(AudioDuplicate.score >= threshold)
+            if cursor:
+                score, first, second = decode_duplicate_cursor(cursor)
+                query = query.filter(db.or_(
+                    AudioDuplicate.score < score,
+                    db.and_(AudioDuplicate.score == score,
+                            db.tuple_(AudioDuplicate.sha256, AudioDuplicate.other_sha256) > (first, second))
+                ))
+            pairs = query.order_by(
+                AudioDuplicate.score.desc(), AudioDuplicate.sha256, AudioDuplicate.other_sha256
+            ).limit(limit + 1).all()
+            next_cursor = encode_duplicate_cursor(pairs[limit - 1]) if len(pairs) > limit else None
+            pairs = pairs[:limit]
+            songs = songs_by_audio({sha256 for pair in pairs for sha256 in (pair.sha256, pair.other_sha256)})
+            duplicates = [
+                {'score': pair.score, 'exact': False, 'songs': songs[pair.sha256] + songs[pair.other_sha256]}
+                for pair in pairs if songs.get(pair.sha256) and songs.get(pair.other_sha256)
+            ]
+        elif kind == 'exact':
+            query = db.session.query(Song.audio_sha256).filter(Song.audio_sha256.isnot(None))
+            if cursor:
+                query = query.filter(Song.audio_sha256 > decode_duplicate_cursor(cursor)[1])
+            exact = [sha256 for (sha256,) in query.group_by(Song.audio_sha256).having(
+                db.func.count(Song.id) > 1).order_by(Song.audio_sha256).limit(limit + 1)]
+            next_cursor = encode_duplicate_cursor(None, exact[limit - 1]) if len(exact) > limit else None
+            exact = exact[:limit]
+            songs = songs_by_audio(exact)
+            duplicates = [{'score': 1.0, 'exact': True, 'songs': songs[sha256]} for sha256 in exact]
+        else:
+            return jsonify({'success': False, 'error': 'kind must be near or exact'}), 400
+        
+        return jsonify({
+            'success': True,
+            'kind': kind,
+            'threshold': threshold,
+            'duplicates': duplicates,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Duplicate report cursors encode (score, sha256, other_sha256) of the last pair,
+# or just the sha256 of the last exact group
+def encode_duplicate_cursor(pair, sha256=None):
+    raw = f'{pair.score!r}|{pair.sha256}|{pair.other_sha256}' if pair else f'|{sha256}|'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_duplicate_cursor(cursor):
+    try:
+        score, first, second = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return (float(score) if score else None), first, second
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+# Waveform peaks for the player: binary interleaved (min, max) pairs as int8
+# (default) or int16 with ?bits=16, or a JSON list with ?format=json
+@app.route('/api/songs/<int:song_id>/peaks')
+def get_song_peaks(song_id):
+    try:
+        resolution = request.args.get('resolution', DEFAULT_PEAK_RESOLUTION, type=int)
+        bits = request.args.get('bits', 8, type=int)
+        if resolution not in PEAK_RESOLUTIONS:
+            return jsonify({'success': False, 'error': f'resolution must be one of {list(PEAK_RESOLUTIONS)}'}), 400
+        if bits not in (8, 16):
+            return jsonify({'success': False, 'error': 'bits must be 8 or 16'}), 400
+        
+        song = db.session.get(Song, song_id)
+        if song is None or not song.audio_sha256:
+            return jsonify({'success': False, 'error': 'Audio file not found'}), 404
+        
+        peaks = db.session.get(AudioPeaks, (song.audio_sha256, resolution))
+        if peaks is None:
+            status = db.session.query(AudioFeature.status).filter_by(sha256=song.audio_sha256).scalar()
+            if status in ('pending', 'running'):
+                response = jsonify({'success': False, 'status': status, 'error': 'Peaks are still being computed'})
+                response.status_code = 202
+                response.headers['Retry-After'] = '5'
+                return response
+            return jsonify({'success': False, 'status': status, 'error': 'Peaks not available'}), 404
+        
+        output_format = request.args.get('format', 'binary')
+        values = np.frombuffer(peaks.data, dtype='<i2')
+        if bits == 8:
+            values = (values >> 8).astype(np.int8)
+        
+        if output_format == 'json':
+            response = jsonify({'success': True, 'resolution': resolution, 'bits': bits, 'peaks': values.tolist()})
+        else:
+            response = Response(values.tobytes(), mimetype='application/octet-stream')
+            response.headers['X-Peaks-Resolution'] = str(resolution)
+            response.headers['X-Peaks-Bits'] = str(bits)
+        
+        # Peaks derive from the content hash, so they can be cached for good
+        etag = f'{song.audio_sha256}-{resolution}-{bits}-{output_format}'
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = PEAKS_MAX_AGE
+        if etag_matches(request.if_none_match, etag, weak=True):
+            response.status_code = 304
+        return response
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/songs/<int:song_id>/features')
+def get_song_features(song_id):
+    try:
+        song = db.session.get(Song, song_id)
+        if song is None:
+            return jsonify({'success': False, 'error': 'Song not found'}), 404
+        
+        features = db.session.get(AudioFeature, song.audio_sha256) if song.audio_sha256 else None
+        if features is None:
+            return jsonify({'success': False, 'error': 'Song has no analysed audio'}), 404
+        
+        return jsonify({'success': True, 'features': features.to_dict()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# METER ANALYSIS
+METER_BATCH_SIZE = 500
+
+@app.cli.command('analyse-meters')
+@click.option('--all', 'reanalyse', is_flag=True, help='Re-analyse every song, not only those analysed by an older METER_VERSION.')
+@click.option('--no-fill', is_flag=True, help='Only record detected_bahr; leave poem_bahr as it is.')
+def analyse_meters(reanalyse, no_fill):
+    """Detect the bahr of songs not analysed by the current METER_VERSION and fill in poem_bahr."""
+    songs = Song.__table__
+    update_song_meter = songs.update().where(songs.c.id == db.bindparam('song_id')).values(
+        detected_bahr=db.bindparam('bahr'), bahr_confidence=db.bindparam('confidence'),
+        meter_version=METER_VERSION, version=songs.c.version + 1
+    )
+    fill_song_bahr = songs.update().where(songs.c.id == db.bindparam('song_id')).values(poem_bahr=db.bindparam('bahr'))
+    fill_search_bahr = SearchDocument.__table__.update().where(
+        SearchDocument.doc_type == 'song', SearchDocument.doc_id == db.bindparam('song_id')
+    ).values(poem_bahr=db.bindparam('bahr'))
+    
+    with app.app_context():
+        started = time.perf_counter()
+        after_id = analysed = filled = lines = 0
+        while True:
+            query = db.select(
+                songs.c.id, songs.c.lyrics, songs.c.poem_bahr, songs.c.detected_bahr
+            ).where(songs.c.id > after_id)
+            if not reanalyse:
+                query = query.where(db.or_(songs.c.meter_version.is_(None), songs.c.meter_version < METER_VERSION))
+            page = db.session.execute(query.order_by(songs.c.id).limit(METER_BATCH_SIZE)).all()
+            if not page:
+                break
+            
+            results, fills = [], []
+            for song_id, lyrics, poem_bahr, detected_bahr in page:
+                analysis = analyse_meter(lyrics)
+                lines += analysis['lines']
+                results.append({'song_id': song_id, 'bahr': analysis['bahr'], 'confidence': analysis['confidence']})
+                filled_bahr = filled_poem_bahr(poem_bahr, detected_bahr, analysis['bahr'])
+                if filled_bahr != poem_bahr and not no_fill:
+                    fills.append({'song_id': song_id, 'bahr': filled_bahr})
+            db.session.execute(update_song_meter, results)
+            if fills:
+                db.session.execute(fill_song_bahr, fills)
+                db.session.execute(fill_search_bahr, fills)
+            db.session.commit()
+            
+            analysed += len(page)
+            filled += len(fills)
+            after_id = page[-1].id
+        
+        elapsed = time.perf_counter() - started
+        logger.info('Meters analysed', extra={
+            'songs': analysed, 'filled': filled, 'lines': lines, 'seconds': round(elapsed, 2),
+            'lines_per_second': round(lines / elapsed) if elapsed else None,
+            'cache': analyse_meter_line.cache_info()._asdict()
+        })
+
+# Scan lyrics without storing anything: per-line patterns and bahrs, the overall
+# bahr, and with "poem_bahr" whether the lyrics fit that bahr
+@app.route('/api/meter/analyse', methods=['POST'])
+def analyse_lyrics_meter():
+    try:
+        data = request.get_json(silent=True) or {}
+        lyrics = data.get('lyrics')
+        if not isinstance(lyrics, str) or not lyrics.strip():
+            return jsonify({'success': False, 'error': 'No lyrics provided'}), 400
+        
+        analysis = analyse_meter(lyrics, details=True)
+        if data.get('poem_bahr'):
+            analysis['fits'] = analysis['bahr'] is not None and analysis['bahr'].lower() == str(data['poem_bahr']).lower()
+        return jsonify({'success': True, 'meter': analysis})
+    except Exception as e:
+        logger.exception('Meter analysis error')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/songs/<int:song_id>/meter')
+def get_song_meter(song_id):
+    try:
+        lyrics = db.session.query(Song.lyrics).filter_by(id=song_id).scalar()
+        if lyrics is None:
+            return jsonify({'success': False, 'error': 'Song not found'}), 404
+        return jsonify({'success': True, 'meter': analyse_meter(lyrics, details=True)})
+    except Exception as e:
+        logger.exception('Song meter error')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # GENERATION ENDPOINTS
 @app.route('/api/generation/generate', methods=['POST'])
 def generate_music():
@@ -553,53 +4001,160 @@ def generate_music():
         
         # Get parameters
         if request.content_type and request.content_type.startswith('multipart/form-data'):
-            maqam = request.form.get('maqam', 'hijaz')
-            style = request.form.get('style', 'modern')
-            emotion = request.form.get('emotion', 'neutral')
-            region = request.form.get('region', 'mixed')
-            title = request.form.get('title', f'Generated Song {GeneratedSong.query.count() + 1}')
+            data = request.form
         else:
             data = request.get_json() or {}
-            maqam = data.get('maqam', 'hijaz')
-            style = data.get('style', 'modern')
-            emotion = data.get('emotion', 'neutral')
-            region = data.get('region', 'mixed')
-            title = data.get('title', f'Generated Song {GeneratedSong.query.count() + 1}')
-        
-        generated_song = GeneratedSong(
-            title=title,
-            lyrics=lyrics_content,
-            maqam=maqam,
-            style=style,
-            tempo=120,  # Default tempo
-            emotion=emotion,
-            region=region,
-            duration='Medium',
-            instruments='Modern',
-            creativity=7,
-            generation_time=round(random.uniform(2.0, 5.0), 1),
-            model_version='v1.0',
-            training_session_id='demo'
-        )
+        params = generation_params(data)
+        params['lyrics'] = lyrics_content
+        cache_key = generation_cache_key(params)
+        
+        if wants_fresh_sample(data):
+            generation_cache.count('bypassed')
+        else:
+            cached_song = generation_cache.lookup(cache_key)
+            if cached_song:
+                return jsonify({
+                    'success': True,
+                    'message': f'Song "{cached_song.title}" loaded from cache',
+                    'song_id': cached_song.id,
+                    'generation_time': f'{cached_song.generation_time} seconds',
+                    'cached': True
+                })
         
+        generated_song = generate_batch([params])[0]
+        
+        adjust_counter('generated_count', 1)
+        number_generated_songs([generated_song])
         db.session.add(generated_song)
+        db.session.flush()
+        index_document('generated', generated_song)
         db.session.commit()
+        generation_cache.store(cache_key, generated_song.id)
         
         return jsonify({
             'success': True,
             'message': f'Song "{generated_song.title}" generated successfully!',
             'song_id': generated_song.id,
-            'generation_time': f'{generated_song.generation_time} seconds'
+            'generation_time': f'{generated_song.generation_time} seconds',
+            'cached': False
         })
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Queue one or many generations: a single parameter object, or {"items": [...]}
+# optionally with shared "defaults". Returns job ids without waiting.
+@app.route('/api/generation/jobs', methods=['POST'])
+def create_generation_jobs():
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'error': 'JSON body required'}), 400
+        
+        defaults = data.get('defaults') or {}
+        items = data['items'] if 'items' in data else [data]
+        if not isinstance(items, list) or not items:
+            return jsonify({'success': False, 'error': 'No generation requests provided'}), 400
+        if len(items) > MAX_JOBS_PER_REQUEST:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_JOBS_PER_REQUEST} generation requests per call'
+            }), 400
+        
+        rows = []
+        for index, item in enumerate(items):
+            merged = {**defaults, **item}
+            params = generation_params(merged)
+            if not params['lyrics']:
+                return jsonify({'success': False, 'error': f'Item {index}: no lyrics provided'}), 400
+            row = {
+                'job_id': str(uuid.uuid4()),
+                'status': 'queued',
+                'maqam': params['maqam'],
+                'style': params['style'],
+                'model_version': params['model_version'],
+                'params': json.dumps(params, ensure_ascii=False),
+                'cached': False,
+                'created_at': datetime.utcnow()
+            }
+            
+            # Cache hits are answered immediately and never reach the worker
+            if wants_fresh_sample(merged):
+                generation_cache.count('bypassed')
+            else:
+                cached_song = generation_cache.lookup(generation_cache_key(params))
+                if cached_song:
+                    row.update(status='completed', cached=True, generated_song_id=cached_song.id,
+                               completed_at=row['created_at'])
+            rows.append(row)
+        
+        # One multi-row insert per row shape for the whole request
+        for cached in (False, True):
+            batch = [row for row in rows if row['cached'] == cached]
+            if batch:
+                db.session.execute(db.insert(GenerationJob), batch)
+        db.session.commit()
+        
+        cached_count = sum(1 for row in rows if row['cached'])
+        return jsonify({
+            'success': True,
+            'message': f'{len(rows) - cached_count} generation job(s) queued, {cached_count} answered from cache',
+            'job_ids': [row['job_id'] for row in rows]
+        }), 202
+    except (TypeError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': f'Invalid generation request: {e}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Status of many jobs at once: ?ids=<job_id>,<job_id>,...
+@app.route('/api/generation/jobs')
+def list_generation_jobs():
+    try:
+        job_ids = [i.strip() for i in request.args.get('ids', '').split(',') if i.strip()]
+        if not job_ids:
+            return jsonify({'success': False, 'error': 'ids parameter required'}), 400
+        if len(job_ids) > MAX_JOBS_PER_REQUEST:
+            return jsonify({'success': False, 'error': f'At most {MAX_JOBS_PER_REQUEST} ids per call'}), 400
+        
+        jobs = GenerationJob.query.filter(GenerationJob.job_id.in_(job_ids)).all()
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        
+        return jsonify({'success': True, 'jobs': [job.to_dict() for job in jobs], 'counts': counts})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/generation/cache')
+def generation_cache_stats():
+    return jsonify({'success': True, 'cache': generation_cache.stats()})
+
+@app.route('/api/generation/jobs/<job_id>')
+def get_generation_job(job_id):
+    try:
+        job = GenerationJob.query.filter_by(job_id=job_id).first()
+        if not job:
+            return jsonify({'success': False, 'error': 'Generation job not found'}), 404
+        
+        result = job.to_dict()
+        if job.status == 'completed' and job.generated_song_id:
+            song = db.session.get(GeneratedSong, job.generated_song_id)
+            result['song'] = song.to_dict() if song else None
+        
+        return jsonify({'success': True, 'job': result})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/generation/list')
+@use_replica
 def list_generated_songs():
     try:
-        songs = GeneratedSong.query.order_by(GeneratedSong.created_at.desc()).all()
-        return jsonify({'success': True, 'songs': [song.to_dict() for song in songs]})
+        songs, next_cursor, fields = list_page(GeneratedSong)
+        return list_response(GeneratedSong, songs, fields, next_cursor)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -608,20 +4163,164 @@ def delete_generated_song(song_id):
     try:
         song = GeneratedSong.query.get_or_404(song_id)
         db.session.delete(song)
+        adjust_counter('generated_count', -1)
+        unindex_document('generated', song.id)
         db.session.commit()
         return jsonify({'success': True, 'message': 'Generated song deleted successfully!'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
-# Catch-all route for frontend routing
+@app.route('/api/generation/bulk', methods=['PATCH'])
+def bulk_update_generated_songs():
+    try:
+        data = request.get_json(silent=True) or {}
+        values = bulk_values(GeneratedSong, data)
+        song_ids = bulk_selection(GeneratedSong, data)
+        updated = 0
+        if song_ids:
+            # Re-tagged songs no longer answer the parameters they were cached under
+            if any(name in values for name in ('maqam', 'style', 'emotion', 'region')):
+                values['cache_key'] = None
+            updated = db.session.execute(
+                db.update(GeneratedSong)
+                .where(GeneratedSong.id.in_(song_ids))
+                .values(values)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            update_search_filters('generated', song_ids, values)
+        db.session.commit()
+        return jsonify({'success': True, 'updated': updated})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/generation/bulk_delete', methods=['POST'])
+def bulk_delete_generated_songs():
+    try:
+        song_ids = bulk_selection(GeneratedSong, request.get_json(silent=True) or {})
+        deleted = 0
+        if song_ids:
+            unindex_documents('generated', song_ids)
+            deleted = GeneratedSong.query.filter(GeneratedSong.id.in_(song_ids)).delete(synchronize_session=False)
+            adjust_counter('generated_count', -deleted)
+        db.session.commit()
+        return jsonify({'success': True, 'deleted': deleted})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# STATIC FRONTEND
+# src/static is read once at startup into a manifest of path -> StaticAsset held
+# in memory, so frontend requests never touch the disk. Compressed variants come
+# from the .br/.gz files written by `flask build-static`, or are made at load.
+STATIC_FOLDER = os.path.join(app.root_path, 'src', 'static')
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+HASHED_ASSET = re.compile(r'\.[0-9a-f]{8,}\.\w+$')  # e.g. app.3f9a1c2b.js: the name changes with the content
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+# Content-Encoding -> (file suffix, compressor), in order of preference
+STATIC_ENCODERS = {
+    **({'br': ('.br', lambda body: brotli.compress(body, quality=11))} if brotli is not None else {}),
+    'gzip': ('.gz', lambda body: gzip.compress(body, compresslevel=9, mtime=0)),
+}
+
+class StaticAsset:
+    def __init__(self, path, body, mimetype):
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.immutable = bool(HASHED_ASSET.search(path))
+        self.variants = {None: body}  # Content-Encoding -> body
+    
+    @property
+    def compressible(self):
+        return self.mimetype.startswith(COMPRESSIBLE_TYPES) and len(self.variants[None]) >= app.config['COMPRESS_MIN_BYTES']
+
+def load_static_manifest(folder):
+    manifest = {}
+    for root, _, names in os.walk(folder):
+        for name in names:
+            if name.endswith(('.br', '.gz')):
+                continue
+            filename = os.path.join(root, name)
+            with open(filename, 'rb') as f:
+                body = f.read()
+            path = os.path.relpath(filename, folder).replace(os.sep, '/')
+            asset = StaticAsset(path, body, mimetypes.guess_type(name)[0] or 'application/octet-stream')
+            if asset.compressible:
+                for encoding, (suffix, compress) in STATIC_ENCODERS.items():
+                    compressed_name = filename + suffix
+                    # A precompressed file older than its source is stale
+                    if os.path.exists(compressed_name) and os.path.getmtime(compressed_name) >= os.path.getmtime(filename):
+                        with open(compressed_name, 'rb') as f:
+                            compressed = f.read()
+                    else:
+                        compressed = compress(body)
+                    if len(compressed) < len(body):
+                        asset.variants[encoding] = compressed
+            manifest[path] = asset
+    logger.info("Static manifest loaded", extra={'assets': len(manifest), 'folder': folder})
+    return manifest
+
+static_manifest = load_static_manifest(STATIC_FOLDER)
+
+# Send the variant the client accepts, or an empty 304 when its ETag is current.
+# Content-hashed assets are cached for good; anything else is revalidated.
+def static_response(asset):
+    accepted = request.accept_encodings
+    encoding = next((name for name in asset.variants if name and accepted[name]), None)
+    etag = f'{asset.etag}-{encoding}' if encoding else asset.etag
+    
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(asset.variants[encoding], mimetype=asset.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    
+    response.set_etag(etag)
+    if len(asset.variants) > 1:
+        response.vary.add('Accept-Encoding')
+    if asset.immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+@app.cli.command('build-static')
+def build_static():
+    """Write compressed .br/.gz copies of the static files for the server to send as they are."""
+    written = 0
+    for path, asset in load_static_manifest(STATIC_FOLDER).items():
+        for encoding, (suffix, _) in STATIC_ENCODERS.items():
+            if encoding in asset.variants:
+                with open(os.path.join(STATIC_FOLDER, path) + suffix, 'wb') as f:
+                    f.write(asset.variants[encoding])
+                written += 1
+    logger.info("Static files compressed", extra={'files': written})
+
+# Catch-all route for frontend routing: known files, else the app shell for
+# client-side routes. API paths and missing files (names with an extension) 404.
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
+@admission_class(None)
 def serve(path):
-    if path != "" and os.path.exists(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
-    else:
-        return send_from_directory(app.static_folder, 'index.html')
+    asset = static_manifest.get(path)
+    if asset is None:
+        if path.startswith('api/') or '.' in path.rsplit('/', 1)[-1]:
+            return jsonify({'success': False, 'error': 'Not found'}), 404
+        asset = static_manifest.get('index.html')
+        if asset is None:
+            return jsonify({'success': False, 'error': 'Frontend not found'}), 404
+    return static_response(asset)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,343 @@
+# Benchmark and load test for the API.
+#
+# Seeds a synthetic catalog into a local database, serves the app on a local
+# port and drives concurrent requests at each endpoint, reporting latency
+# percentiles, throughput and peak RSS. Results are written as JSON and can be
+# compared against a saved baseline:
+#
+#   python benchmark.py --songs 500 --output results.json --save-baseline baseline.json
+#   python benchmark.py --songs 500 --baseline baseline.json
+#
+# By default a fresh SQLite file is used; pass --database-url to point at a
+# local Postgres instead (its tables are created but never dropped).
+import io
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import urllib.error
+import urllib.request
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+
+ENDPOINTS = ('list', 'download', 'stats', 'upload', 'generate')
+MAQAMS = ('bayati', 'hijaz', 'rast', 'saba', 'nahawand', 'kurd', 'sikah', 'ajam')
+STYLES = ('classical', 'modern', 'folk', 'tarab')
+REGIONS = ('egyptian', 'levantine', 'gulf', 'maghrebi', 'iraqi')
+LYRIC_WORDS = (
+    'يا', 'ليل', 'القمر', 'قلبي', 'الحب', 'عيونك', 'سهرت', 'الشوق', 'بحر', 'نسيم',
+    'الورد', 'غريب', 'دار', 'حبيبي', 'الفجر', 'سلام', 'نجوم', 'الهوى', 'طريق', 'أمل',
+)
+SAMPLE_RATE = 22050
+
+
+def synthetic_lyrics(rng, lines=8, words=6):
+    return '\n'.join(' '.join(rng.choice(LYRIC_WORDS) for _ in range(words)) for _ in range(lines))
+
+
+# A mono 16-bit WAV of about size_bytes, filled with seeded noise so every
+# file has distinct content (identical files would be deduplicated)
+def synthetic_wav(rng, size_bytes):
+    frames = max(1, (size_bytes - 44) // 2)
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(rng.randbytes(frames * 2))
+    return buffer.getvalue()
+
+
+def seed_catalog(app_module, songs, audio_bytes, seed):
+    rng = random.Random(seed)
+    app, db = app_module.app, app_module.db
+    with app.app_context():
+        app_module.run_migrations()
+        existing = app_module.Song.query.count()
+        for index in range(existing, songs):
+            audio = synthetic_wav(rng, audio_bytes)
+            fields = {
+                'title': f'أغنية {index}',
+                'lyrics': synthetic_lyrics(rng),
+                'maqam': rng.choice(MAQAMS),
+                'style': rng.choice(STYLES),
+                'region': rng.choice(REGIONS),
+            }
+            chunks = lambda: (audio[i:i + app_module.AUDIO_CHUNK_SIZE] for i in range(0, len(audio), app_module.AUDIO_CHUNK_SIZE))
+            app_module.add_song(fields, f'song-{index}.wav', chunks)
+            if index % 100 == 99:
+                db.session.commit()
+        db.session.commit()
+        return [song_id for (song_id,) in db.session.query(app_module.Song.id).filter(
+            app_module.Song.audio_sha256.isnot(None)
+        )]
+
+
+def multipart_body(fields, files):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8'))
+    for name, (filename, data) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode('utf-8') + data + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+# Request factories: each returns (method, path, body, headers) for one call
+def request_factory(endpoint, song_ids, audio_bytes, seed):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def next_request():
+        with lock:
+            if endpoint == 'list':
+                query = 'limit=50'
+                if rng.random() < 0.5:
+                    query += f'&maqam={rng.choice(MAQAMS)}'
+                return 'GET', f'/api/songs/list?{query}', None, {}
+            if endpoint == 'download':
+                return 'GET', f'/api/songs/{rng.choice(song_ids)}/download_audio', None, {}
+            if endpoint == 'stats':
+                return 'GET', '/api/dashboard/stats', None, {}
+            if endpoint == 'upload':
+                body, content_type = multipart_body(
+                    {'title': f'رفع {rng.randrange(10 ** 9)}', 'maqam': rng.choice(MAQAMS), 'style': rng.choice(STYLES)},
+                    {'audio_file': ('bench.wav', synthetic_wav(rng, audio_bytes)),
+                     'lyrics_file': ('lyrics.txt', synthetic_lyrics(rng).encode('utf-8'))}
+                )
+                return 'POST', '/api/songs/upload', body, {'Content-Type': content_type}
+            if endpoint == 'generate':
+                # Fresh lyrics each call, so every request misses the generation cache
+                body = json.dumps({'lyrics': synthetic_lyrics(rng), 'maqam': rng.choice(MAQAMS), 'style': rng.choice(STYLES)})
+                return 'POST', '/api/generation/generate', body.encode('utf-8'), {'Content-Type': 'application/json'}
+        raise ValueError(f'Unknown endpoint {endpoint}')
+
+    return next_request
+
+
+# Resident set size of this process in bytes (Linux), or the peak so far elsewhere
+def current_rss():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RssSampler:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.peak = max(self.peak, current_rss())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def run_endpoint(base_url, endpoint, next_request, requests, concurrency):
+    latencies = []
+    errors = 0
+    response_bytes = 0
+    lock = threading.Lock()
+
+    def call(_):
+        nonlocal errors, response_bytes
+        method, path, body, headers = next_request()
+        request = urllib.request.Request(base_url + path, data=body, method=method, headers=headers)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                size = len(response.read())
+            failed = False
+        except (urllib.error.URLError, OSError):
+            size, failed = 0, True
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            response_bytes += size
+            errors += failed
+
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(call, range(requests)))
+        wall = time.perf_counter() - started
+
+    latencies.sort()
+    to_ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    return {
+        'requests': requests,
+        'errors': errors,
+        'concurrency': concurrency,
+        'p50_ms': to_ms(percentile(latencies, 0.50)),
+        'p95_ms': to_ms(percentile(latencies, 0.95)),
+        'p99_ms': to_ms(percentile(latencies, 0.99)),
+        'mean_ms': to_ms(statistics.fmean(latencies)) if latencies else None,
+        'throughput_rps': round(requests / wall, 2) if wall else None,
+        'response_bytes': response_bytes,
+        'peak_rss_mb': round(rss.peak / (1024 * 1024), 1),
+    }
+
+
+# Lower is better for latency and memory, higher for throughput
+COMPARED_METRICS = {'p50_ms': -1, 'p95_ms': -1, 'p99_ms': -1, 'throughput_rps': 1, 'peak_rss_mb': -1}
+
+
+# Per-endpoint relative change against a baseline. A metric regresses when it
+# moved the wrong way by more than tolerance (a fraction).
+def compare(results, baseline, tolerance):
+    comparison = {}
+    regressions = []
+    for endpoint, current in results.items():
+        previous = baseline.get('results', {}).get(endpoint)
+        if not previous:
+            continue
+        changes = {}
+        for metric, direction in COMPARED_METRICS.items():
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            changes[metric] = {'baseline': old, 'current': new, 'change': round(change, 4)}
+            if change * direction < -tolerance:
+                regressions.append(f'{endpoint}.{metric}')
+        comparison[endpoint] = changes
+    return comparison, regressions
+
+
+def print_table(results, comparison):
+    click.echo(f"{'endpoint':<10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'RSS MB':>8} {'errors':>6}")
+    for endpoint, result in results.items():
+        click.echo(
+            f"{endpoint:<10} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9} "
+            f"{result['throughput_rps']:>9} {result['peak_rss_mb']:>8} {result['errors']:>6}"
+        )
+        for metric, change in comparison.get(endpoint, {}).items():
+            click.echo(f"{'':<10}   {metric}: {change['baseline']} -> {change['current']} ({change['change']:+.1%})")
+
+
+@click.command()
+@click.option('--database-url', help='Database to benchmark against (default: a new SQLite file).')
+@click.option('--songs', default=200, show_default=True, help='Songs in the seeded catalog.')
+@click.option('--audio-kb', default=256, show_default=True, help='Size of each synthetic WAV file.')
+@click.option('--requests', 'request_count', default=200, show_default=True, help='Requests per endpoint.')
+@click.option('--concurrency', default=8, show_default=True, help='Concurrent clients per endpoint.')
+@click.option('--endpoints', default=','.join(ENDPOINTS), show_default=True, help='Comma-separated endpoints to load.')
+@click.option('--seed', default=1, show_default=True, help='Random seed for the catalog and requests.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Write results as JSON to this file.')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Compare against these saved results.')
+@click.option('--save-baseline', type=click.Path(dir_okay=False), help='Also save the results as a baseline here.')
+@click.option('--tolerance', default=0.10, show_default=True, help='Relative change counted as a regression.')
+def main(database_url, songs, audio_kb, request_count, concurrency, endpoints, seed, output, baseline, save_baseline, tolerance):
+    """Load-test the API against a local database and report latency, throughput and RSS."""
+    selected = [name.strip() for name in endpoints.split(',') if name.strip()]
+    unknown = set(selected) - set(ENDPOINTS)
+    if unknown:
+        raise click.BadParameter(f'unknown endpoints: {", ".join(sorted(unknown))}', param_hint='--endpoints')
+
+    workdir = tempfile.mkdtemp(prefix='zatta-bench-')
+    os.environ['DATABASE_URL'] = database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('DUPLICATE_ACTION', 'off')  # Noise audio never matches; skip the decode
+    # Every request comes from one client, so per-client rate limits would only measure 429s
+    os.environ.setdefault('RATE_LIMIT_TRANSFER', '')
+    os.environ.setdefault('RATE_LIMIT_METADATA', '')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as app_module
+    from werkzeug.serving import make_server
+
+    audio_bytes = audio_kb * 1024
+    click.echo(f'Seeding {songs} songs ({audio_kb} KB audio each)...')
+    started = time.perf_counter()
+    song_ids = seed_catalog(app_module, songs, audio_bytes, seed)
+    click.echo(f'Seeded in {time.perf_counter() - started:.1f}s')
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # No per-request access log
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    results = {}
+    try:
+        for index, endpoint in enumerate(selected):
+            next_request = request_factory(endpoint, song_ids, audio_bytes, seed + index)
+            # One untimed warm-up call per client
+            run_endpoint(base_url, endpoint, next_request, concurrency, concurrency)
+            results[endpoint] = run_endpoint(base_url, endpoint, next_request, request_count, concurrency)
+    finally:
+        server.shutdown()
+
+    report = {
+        'config': {
+            'songs': songs, 'audio_kb': audio_kb, 'requests': request_count, 'concurrency': concurrency,
+            'seed': seed, 'database': os.environ['DATABASE_URL'].split(':', 1)[0],
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'results': results,
+    }
+
+    comparison, regressions = {}, []
+    if baseline:
+        with open(baseline) as baseline_file:
+            saved = json.load(baseline_file)
+        if saved.get('config') != report['config']:
+            click.echo(f"Warning: baseline was run with a different configuration: {saved.get('config')}")
+        comparison, regressions = compare(results, saved, tolerance)
+        report['comparison'] = comparison
+        report['regressions'] = regressions
+
+    print_table(results, comparison)
+    for path in filter(None, (output, save_baseline)):
+        with open(path, 'w') as results_file:
+            json.dump(report, results_file, indent=2, ensure_ascii=False)
+        click.echo(f'Results written to {path}')
+
+    if regressions:
+        click.echo(f'Regressions beyond {tolerance:.0%}: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import io
+import os
+import sys
+import tempfile
+import wave
+
+import numpy as np
+import pytest
+from flask.testing import FlaskClient
+
+# The app reads its configuration at import time: a throwaway SQLite database,
+# no rate limits, and enough admission slots for the test client
+DATABASE_DIR = tempfile.mkdtemp(prefix='zatta-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DATABASE_DIR, 'test.db')
+os.environ['RATE_LIMIT_TRANSFER'] = ''
+os.environ['RATE_LIMIT_METADATA'] = ''
+os.environ['RATE_LIMIT_STREAM'] = ''
+os.environ['ADMISSION_TRANSFER_CONCURRENCY'] = '100'
+os.environ['ADMISSION_METADATA_CONCURRENCY'] = '100'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as zatta  # noqa: E402
+
+
+# Buffer every response, so streamed bodies are closed and their admission
+# slots released before the test continues
+class BufferedClient(FlaskClient):
+    def open(self, *args, buffered=True, **kwargs):
+        return super().open(*args, buffered=buffered, **kwargs)
+
+
+@pytest.fixture
+def app():
+    with zatta.app.app_context():
+        zatta.db.drop_all()
+        zatta.run_migrations()
+        zatta.generation_cache.entries.clear()
+        zatta.analyse_meter_line.cache_clear()
+        zatta.rate_limit_store.counters.clear()
+        zatta.training_hub.status = None
+        yield zatta.app
+        zatta.db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    app.test_client_class = BufferedClient
+    return app.test_client()
+
+
+# Upload a song through the API and return its id
+@pytest.fixture
+def upload(client):
+    def upload(title='Song', audio=b'RIFF' + b'\0' * 4096, lyrics='كلمات الأغنية', filename='song.wav', **fields):
+        response = client.post('/api/songs/upload', data={
+            'title': title,
+            'audio_file': (io.BytesIO(audio), filename),
+            'lyrics_file': (io.BytesIO(lyrics.encode('utf-8')), 'lyrics.txt'),
+            **fields,
+        }, content_type='multipart/form-data')
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()['song_id']
+    return upload
+
+
+# Mono 16-bit WAV of a half-scale 440 Hz sine
+@pytest.fixture
+def sine_wav():
+    def sine_wav(seconds=2, sample_rate=8000):
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(sample_rate)
+            t = np.arange(seconds * sample_rate) / sample_rate
+            wav.writeframes((np.sin(2 * np.pi * 440 * t) * 16000).astype('<i2').tobytes())
+        return buffer.getvalue()
+    return sine_wav
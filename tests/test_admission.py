@@ -0,0 +1,46 @@
+import io
+
+import app as zatta
+
+
+def test_rate_limit_answers_429(client, monkeypatch):
+    monkeypatch.setitem(zatta.rate_limits, 'metadata', (2, 60))
+    statuses = [client.get('/api/songs/list').status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    response = client.get('/api/songs/list')
+    assert int(response.headers['Retry-After']) >= 1
+    
+    # Exempt endpoints are not counted
+    assert client.get('/health').status_code == 200
+
+
+def test_full_pool_answers_503(client, monkeypatch):
+    monkeypatch.setitem(zatta.admission_pools, 'metadata', zatta.AdmissionPool('metadata', 0, 1024, 0))
+    response = client.get('/api/songs/list')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(zatta.ADMISSION_RETRY_AFTER)
+
+
+def test_streamed_download_holds_its_slot(client, upload):
+    song_id = upload()
+    pool = zatta.admission_pools['transfer']
+    response = client.get(f'/api/songs/{song_id}/download_audio', buffered=False)
+    assert pool.in_flight == 1
+    response.close()
+    assert pool.in_flight == 0
+
+
+def test_chunked_upload_is_charged_the_largest_body(client, monkeypatch):
+    pool = zatta.AdmissionPool('transfer', 10, zatta.app.config['MAX_CONTENT_LENGTH'] + 1, 0)
+    monkeypatch.setitem(zatta.admission_pools, 'transfer', pool)
+    charged = []
+    acquire = pool.acquire
+    monkeypatch.setattr(pool, 'acquire', lambda size: charged.append(size) or acquire(size))
+    chunked = {'Transfer-Encoding': 'chunked', 'Content-Type': 'text/plain'}
+    
+    client.post('/api/songs/upload', input_stream=io.BytesIO(b'not a form'), headers=chunked)
+    assert charged == [zatta.app.config['MAX_CONTENT_LENGTH']]
+    
+    client.post('/api/songs/import', input_stream=io.BytesIO(b'not a form'), headers=chunked)
+    assert charged[-1] == zatta.IMPORT_ADMISSION_BYTES
+    assert pool.in_flight == 0
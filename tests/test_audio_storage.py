@@ -0,0 +1,32 @@
+import app as zatta
+
+
+def test_legacy_audio_column_is_moved_to_the_chunk_store(client):
+    audio = bytes(range(256)) * (zatta.AUDIO_CHUNK_SIZE // 128 + 3)  # Spans three chunks
+    zatta.db.session.execute(zatta.db.text('ALTER TABLE songs ADD COLUMN audio_data BLOB'))
+    zatta.db.session.execute(zatta.db.text(
+        "UPDATE songs SET audio_data = :audio, audio_sha256 = NULL, file_type = 'wav' WHERE id = 1"), {'audio': audio})
+    zatta.db.session.commit()
+    
+    zatta.migrate_audio_storage()
+    
+    columns = {column['name'] for column in zatta.db.inspect(zatta.db.engine).get_columns('songs')}
+    assert 'audio_data' not in columns
+    assert zatta.AudioChunk.query.count() == 3
+    assert client.get('/api/songs/1/download_audio').data == audio
+
+
+def test_song_queries_do_not_read_audio(client, upload):
+    upload(audio=b'RIFF' + bytes(zatta.AUDIO_CHUNK_SIZE))
+    statements = []
+    
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    
+    zatta.db.event.listen(zatta.db.engine, 'before_cursor_execute', record)
+    try:
+        assert client.get('/api/songs/list').status_code == 200
+    finally:
+        zatta.db.event.remove(zatta.db.engine, 'before_cursor_execute', record)
+    assert statements
+    assert not any('audio_chunks' in statement for statement in statements)
@@ -0,0 +1,25 @@
+import pytest
+
+import app as zatta
+import benchmark
+
+
+def test_percentile_interpolates_between_samples():
+    values = [10, 20, 30, 40]
+    assert benchmark.percentile(values, 0.5) == 25
+    assert benchmark.percentile(values, 0.99) == pytest.approx(39.7)
+    assert benchmark.percentile([], 0.5) is None
+
+
+def test_regressions_are_judged_by_direction():
+    baseline = {'results': {'list': {'p95_ms': 100, 'throughput_rps': 50, 'peak_rss_mb': 80}}}
+    results = {'list': {'p95_ms': 130, 'throughput_rps': 60, 'peak_rss_mb': 82}}
+    comparison, regressions = benchmark.compare(results, baseline, 0.10)
+    assert regressions == ['list.p95_ms']
+    assert comparison['list']['throughput_rps']['change'] == 0.2
+
+
+def test_seeded_catalog_has_distinct_audio(app):
+    song_ids = benchmark.seed_catalog(zatta, 4, 2048, seed=1)
+    assert len(song_ids) == 3  # The sample song has no audio
+    assert zatta.AudioContent.query.count() == 3
@@ -0,0 +1,78 @@
+import app as zatta
+
+
+# Statistics, facet counts and search postings as maintained incrementally
+def derived_state():
+    counters = {name: value for name, value in zatta.db.session.query(zatta.StatCounter.name, zatta.StatCounter.value) if value}
+    facets = {(facet, value): count for facet, value, count in zatta.db.session.query(
+        zatta.FacetCount.facet, zatta.FacetCount.value, zatta.FacetCount.count) if count}
+    documents = {(doc.doc_type, doc.doc_id): (doc.maqam, doc.region, doc.poem_bahr)
+                 for doc in zatta.SearchDocument.query}
+    return counters, facets, documents
+
+
+# The incremental upkeep must match a rebuild from scratch
+def assert_consistent():
+    before = derived_state()
+    zatta.rebuild_stats()
+    zatta.rebuild_search_index()
+    zatta.db.session.commit()
+    assert derived_state() == before
+
+
+def test_bulk_update_retags_and_keeps_counts(client, upload):
+    ids = [upload(title=f'Song {i}', maqam='hijaz', region='egyptian') for i in range(3)]
+    
+    response = client.patch('/api/songs/bulk', json={'ids': ids[:2], 'set': {'maqam': 'saba'}})
+    assert response.status_code == 200
+    assert response.get_json()['updated'] == 2
+    assert [client.get(f'/api/songs/{i}').get_json()['song']['maqam'] for i in ids] == ['saba', 'saba', 'hijaz']
+    assert_consistent()
+    
+    response = client.patch('/api/songs/bulk', json={'filter': {'maqam': 'saba'}, 'set': {'region': 'levant'}})
+    assert response.get_json()['updated'] == 2
+    assert_consistent()
+
+
+def test_bulk_update_rejects_unknown_fields(client, upload):
+    song_id = upload()
+    response = client.patch('/api/songs/bulk', json={'ids': [song_id], 'set': {'lyrics': 'x'}})
+    assert response.status_code == 400
+
+
+def test_bulk_delete_releases_audio(client, upload):
+    shared = b'RIFF' + b'\1' * 4096
+    ids = [upload(title='A', audio=shared), upload(title='B', audio=shared), upload(title='C')]
+    
+    response = client.post('/api/songs/bulk_delete', json={'ids': ids[:1]})
+    assert response.get_json()['deleted'] == 1
+    assert zatta.AudioContent.query.filter_by(ref_count=1).count() == 2
+    assert_consistent()
+    
+    response = client.post('/api/songs/bulk_delete', json={'ids': ids[1:]})
+    assert response.get_json()['deleted'] == 2
+    assert zatta.AudioContent.query.count() == 0
+    assert zatta.AudioChunk.query.count() == 0
+    assert_consistent()
+
+
+def test_bulk_edits_of_generated_songs(client):
+    for i in range(3):
+        client.post('/api/generation/generate', json={'lyrics': f'كلمات رقم {i}', 'maqam': 'rast'})
+    
+    response = client.patch('/api/generation/bulk', json={'filter': {'maqam': 'rast'}, 'set': {'maqam': 'bayati'}})
+    assert response.get_json()['updated'] == 3
+    assert_consistent()
+    
+    response = client.post('/api/generation/bulk_delete', json={'filter': {'maqam': ['bayati', 'hijaz']}})
+    assert response.get_json()['deleted'] == 3
+    assert zatta.GeneratedSong.query.count() == 0
+    assert_consistent()
+
+
+def test_bulk_selection_is_bounded(client, monkeypatch):
+    monkeypatch.setattr(zatta, 'MAX_BULK_ROWS', 1)
+    response = client.patch('/api/songs/bulk', json={'ids': [1, 2], 'set': {'style': 'folk'}})
+    assert response.status_code == 400
+    response = client.post('/api/songs/bulk_delete', json={'ids': [1], 'filter': {'maqam': 'saba'}})
+    assert response.status_code == 400
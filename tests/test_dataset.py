@@ -0,0 +1,37 @@
+import io
+import json
+import tarfile
+
+import app as zatta
+
+
+def test_dataset_export_streams_a_tar_of_each_song(client, upload):
+    audio = b'RIFF' + bytes(5000)
+    song_id = upload(title='Exported', audio=audio, lyrics='كلمات')
+    
+    response = client.get('/api/dataset/export', query_string={'after_id': song_id - 1})
+    assert response.mimetype == 'application/x-tar'
+    with tarfile.open(fileobj=io.BytesIO(response.data)) as tar:
+        names = tar.getnames()
+        key = f'{song_id:08d}'
+        assert names == [f'{key}.json', f'{key}.txt', f'{key}.wav']
+        assert json.loads(tar.extractfile(f'{key}.json').read())['title'] == 'Exported'
+        assert tar.extractfile(f'{key}.txt').read().decode('utf-8') == 'كلمات'
+        assert tar.extractfile(f'{key}.wav').read() == audio
+    
+    shards = client.get('/api/dataset/shards', query_string={'shard_size': 1}).get_json()['shards']
+    assert [shard['count'] for shard in shards] == [1, 1]
+
+
+def test_exported_shard_reads_back_as_samples(client, upload):
+    for i in range(3):
+        upload(title=f'Song {i}', maqam='saba', audio=b'RIFF' + bytes([i]) * 100, lyrics=f'كلمات {i}')
+    
+    response = client.get('/api/dataset/export', query_string={'maqam': 'saba'})
+    samples = list(zatta.iter_shard_samples(io.BytesIO(response.data)))
+    assert [sample['lyrics'] for sample in samples] == ['كلمات 0', 'كلمات 1', 'كلمات 2']
+    assert samples[1]['audio'] == b'RIFF' + bytes([1]) * 100
+    
+    batches = list(zatta.iter_dataset_batches(2, filters={'maqam': 'saba'}, include_audio=False))
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert [sample['key'] for batch in batches for sample in batch] == [sample['key'] for sample in samples]
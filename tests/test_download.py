@@ -0,0 +1,41 @@
+def test_download_audio_ranges(client, upload):
+    audio = bytes(range(256)) * 64
+    song_id = upload(audio=audio)
+    url = f'/api/songs/{song_id}/download_audio'
+    
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == audio
+    etag = response.headers['ETag']
+    
+    response = client.get(url, headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(audio)}'
+    assert response.data == audio[100:200]
+    
+    response = client.get(url, headers={'Range': f'bytes={len(audio) + 10}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(audio)}'
+    
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    
+    # A stale If-Range gets the whole file instead of the range
+    response = client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == audio
+
+
+def test_multiple_ranges_get_the_whole_file(client, upload):
+    audio = bytes(range(256)) * 64
+    song_id = upload(audio=audio)
+    
+    response = client.get(f'/api/songs/{song_id}/download_audio', headers={'Range': 'bytes=0-9,100-199'})
+    assert response.status_code == 200
+    assert 'Content-Range' not in response.headers
+    assert response.data == audio
+
+
+def test_download_of_song_without_audio_is_not_found(client):
+    response = client.get('/api/songs/1/download_audio')  # The sample song has no audio
+    assert response.status_code == 404
@@ -0,0 +1,115 @@
+import io
+import wave
+
+import numpy as np
+
+import app as zatta
+
+SAMPLE_RATE = 11025
+
+
+# A few seconds of tones that change every quarter second
+def melody(seed, seconds=8):
+    rng = np.random.default_rng(seed)
+    notes = rng.uniform(200, 2000, size=(seconds * 4, 3))
+    t = np.arange(SAMPLE_RATE // 4) / SAMPLE_RATE
+    return np.concatenate([np.sin(2 * np.pi * freqs[:, None] * t).sum(axis=0) / 3 for freqs in notes])
+
+
+def wav_bytes(signal):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes((signal * 20000).astype('<i2').tobytes())
+    return buffer.getvalue()
+
+
+def run_feature_worker():
+    zatta.queue_feature_extraction()
+    while True:
+        sha256 = zatta.claim_feature_extraction('test-worker')
+        if sha256 is None:
+            return
+        zatta.extract_features(sha256, 'test-worker')
+
+
+def near_pairs(client, **params):
+    pages, cursor = [], None
+    while True:
+        data = client.get('/api/songs/duplicates', query_string={**params, **({'cursor': cursor} if cursor else {})}).get_json()
+        assert data['success'], data
+        pages.append(data['duplicates'])
+        cursor = data['next_cursor']
+        if not cursor:
+            return pages
+
+
+def titles(pair):
+    return sorted(song['title'] for song in pair['songs'])
+
+
+def test_worker_records_pairs_and_report_pages_through_them(client, upload):
+    signal = melody(1)
+    upload(title='A', audio=wav_bytes(signal), filename='a.wav')
+    upload(title='B', audio=wav_bytes(signal[20 * zatta.FINGERPRINT_HOP_SIZE:] * 0.8), filename='b.wav')  # Starts 20 frames in
+    upload(title='C', audio=wav_bytes(signal * 0.5), filename='c.wav')
+    upload(title='Other', audio=wav_bytes(melody(2)), filename='other.wav')
+    run_feature_worker()
+    
+    pages = near_pairs(client, limit=2)
+    assert [len(page) for page in pages] == [2, 1]
+    pairs = [titles(pair) for page in pages for pair in page]
+    assert sorted(pairs) == [['A', 'B'], ['A', 'C'], ['B', 'C']]
+    scores = [pair['score'] for page in pages for pair in page]
+    assert scores == sorted(scores, reverse=True)
+    
+    # Pairs go with the stored file
+    song_c = next(song['id'] for song in client.get('/api/songs/list').get_json()['songs'] if song['title'] == 'C')
+    client.delete(f'/api/songs/{song_c}')
+    assert [titles(pair) for page in near_pairs(client) for pair in page] == [['A', 'B']]
+    
+    # The migration step recomputes the same pairs from stored fingerprints
+    zatta.rebuild_duplicates()
+    assert [titles(pair) for page in near_pairs(client) for pair in page] == [['A', 'B']]
+
+
+def test_exact_duplicates_are_paged_by_file(client, upload):
+    for name in ('one', 'two'):
+        audio = wav_bytes(melody(len(name) * ord(name[0]), seconds=1))
+        upload(title=f'{name} 1', audio=audio)
+        upload(title=f'{name} 2', audio=audio)
+    
+    pages = near_pairs(client, kind='exact', limit=1)
+    assert [[titles(group) for group in page] for page in pages] == sorted(
+        [[['one 1', 'one 2']], [['two 1', 'two 2']]],
+        key=lambda page: zatta.Song.query.filter_by(title=page[0][0]).one().audio_sha256)
+
+
+def test_uploads_are_not_decoded_in_the_request_by_default(client, upload, monkeypatch):
+    calls = []
+    monkeypatch.setattr(zatta, 'check_upload_duplicates', lambda head: calls.append(head) or [])
+    upload(audio=wav_bytes(melody(3)))
+    assert calls == []
+
+
+def test_opt_in_check_decodes_only_the_start_of_the_upload(client, upload, monkeypatch):
+    signal = melody(4)
+    upload(title='Original', audio=wav_bytes(signal))
+    run_feature_worker()
+    
+    monkeypatch.setitem(zatta.app.config, 'DUPLICATE_ACTION', 'reject')
+    monkeypatch.setitem(zatta.app.config, 'DUPLICATE_CHECK_BYTES', 64 * 1024)
+    heads = []
+    check = zatta.check_upload_duplicates
+    monkeypatch.setattr(zatta, 'check_upload_duplicates', lambda head: heads.append(len(head)) or check(head))
+    
+    response = client.post('/api/songs/upload', data={
+        'title': 'Copy',
+        'audio_file': (io.BytesIO(wav_bytes(signal * 0.9)), 'copy.wav'),
+        'lyrics_file': (io.BytesIO('كلمات'.encode('utf-8')), 'lyrics.txt'),
+    }, content_type='multipart/form-data')
+    assert response.status_code == 409
+    assert [match['title'] for match in response.get_json()['duplicates']] == ['Original']
+    assert heads == [64 * 1024]
@@ -0,0 +1,38 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+
+import app as zatta
+
+
+def test_wav_is_decoded_without_external_tools():
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(8000)
+        wav.writeframes((np.sin(np.arange(8000) / 10) * 16000).astype('<i2').tobytes())
+    samples, sample_rate = zatta.decode_audio_bytes(buffer.getvalue())
+    assert sample_rate == 8000
+    assert samples.shape == (8000, 1)
+
+
+def test_missing_decoder_command_is_reported(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'AUDIO_DECODER_COMMAND', 'no-such-decoder-binary')
+    with pytest.raises(ValueError, match='Decoder not found'):
+        zatta.decode_audio_bytes(b'ID3' + bytes(64))
+
+
+def test_worker_extracts_features(client, upload, sine_wav):
+    song_id = upload(audio=sine_wav())
+    assert client.get(f'/api/songs/{song_id}/features').get_json()['features']['status'] == 'pending'
+    
+    sha256 = zatta.claim_feature_extraction('test-worker')
+    zatta.extract_features(sha256, 'test-worker')
+    
+    features = client.get(f'/api/songs/{song_id}/features').get_json()['features']
+    assert features['status'] == 'done'
+    assert client.get(f'/api/songs/{song_id}').get_json()['song']['duration'] == pytest.approx(2.0, abs=0.01)
+    assert zatta.claim_feature_extraction('test-worker') is None
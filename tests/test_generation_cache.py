@@ -0,0 +1,28 @@
+REQUEST = {'lyrics': 'يا ليل الصب متى غده', 'maqam': 'saba', 'style': 'classical'}
+
+
+def test_repeated_generation_is_answered_from_cache(client):
+    first = client.post('/api/generation/generate', json=REQUEST).get_json()
+    assert first['success'] and first['cached'] is False
+    
+    again = client.post('/api/generation/generate', json=REQUEST).get_json()
+    assert again['cached'] is True
+    assert again['song_id'] == first['song_id']
+    
+    # Asking for a fresh sample bypasses the cache
+    fresh = client.post('/api/generation/generate', json={**REQUEST, 'nocache': True}).get_json()
+    assert fresh['cached'] is False
+    assert fresh['song_id'] != first['song_id']
+    assert client.get('/api/generation/cache').get_json()['cache']['bypassed'] == 1
+
+
+def test_creativity_is_part_of_the_key(client):
+    first = client.post('/api/generation/generate', json={**REQUEST, 'creativity': 7}).get_json()
+    
+    # The default creativity sent explicitly still hits the cache
+    again = client.post('/api/generation/generate', json=REQUEST).get_json()
+    assert again['cached'] is True and again['song_id'] == first['song_id']
+    
+    bolder = client.post('/api/generation/generate', json={**REQUEST, 'creativity': 9}).get_json()
+    assert bolder['cached'] is False
+    assert client.post('/api/generation/generate', json={**REQUEST, 'creativity': 9}).get_json()['song_id'] == bolder['song_id']
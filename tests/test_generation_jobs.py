@@ -0,0 +1,100 @@
+import time
+from datetime import datetime, timedelta
+
+import app as zatta
+
+
+def queue_jobs(client, count, **defaults):
+    response = client.post('/api/generation/jobs', json={
+        'defaults': {'maqam': 'rast', 'style': 'modern', **defaults},
+        'items': [{'lyrics': f'كلمات رقم {i}'} for i in range(count)],
+    })
+    assert response.status_code == 202
+    return response.get_json()['job_ids']
+
+
+def jobs_by_status(job_ids):
+    jobs = zatta.GenerationJob.query.filter(zatta.GenerationJob.job_id.in_(job_ids)).all()
+    return {(job.status, job.worker_id) for job in jobs}
+
+
+def test_queued_jobs_run_in_one_batch(client):
+    response = client.post('/api/generation/jobs', json={
+        'defaults': {'maqam': 'rast', 'style': 'modern'},
+        'items': [{'lyrics': f'كلمات رقم {i}'} for i in range(3)],
+    })
+    assert response.status_code == 202
+    job_ids = response.get_json()['job_ids']
+    
+    batch = zatta.claim_generation_batch('test-worker')
+    assert len(batch) == 3
+    zatta.run_generation_batch(batch, 'test-worker')
+    
+    data = client.get('/api/generation/jobs', query_string={'ids': ','.join(job_ids)}).get_json()
+    assert data['counts'] == {'completed': 3}
+    job = client.get(f'/api/generation/jobs/{job_ids[0]}').get_json()['job']
+    assert job['song']['maqam'] == 'rast'
+    assert client.get('/api/dashboard/stats').get_json()['stats']['generated_count'] == 3
+    
+    # The same request again is answered from the cache without a worker
+    response = client.post('/api/generation/jobs', json={'maqam': 'rast', 'style': 'modern', 'lyrics': 'كلمات رقم 0'})
+    job = client.get(f"/api/generation/jobs/{response.get_json()['job_ids'][0]}").get_json()['job']
+    assert job['status'] == 'completed' and job['cached'] is True
+
+
+def test_batch_whose_lease_was_lost_leaves_the_jobs_to_their_new_worker(client):
+    job_ids = queue_jobs(client, 2)
+    batch = zatta.claim_generation_batch('slow')
+    zatta.db.session.execute(zatta.db.update(zatta.GenerationJob).values(
+        heartbeat_at=datetime.utcnow() - timedelta(seconds=zatta.GENERATION_LEASE_SECONDS + 1)))
+    zatta.db.session.commit()
+    assert zatta.claim_generation_batch('fast') == batch
+    
+    zatta.run_generation_batch(batch, 'slow')
+    assert jobs_by_status(job_ids) == {('running', 'fast')}
+    assert zatta.GeneratedSong.query.count() == 0
+    
+    zatta.run_generation_batch(batch, 'fast')
+    assert jobs_by_status(job_ids) == {('completed', 'fast')}
+    assert zatta.GeneratedSong.query.count() == 2
+
+
+def test_failed_batch_only_fails_its_own_jobs(client, monkeypatch):
+    job_ids = queue_jobs(client, 1)
+    batch = zatta.claim_generation_batch('slow')
+    zatta.db.session.execute(zatta.db.update(zatta.GenerationJob).values(status='running', worker_id='fast'))
+    zatta.db.session.commit()
+    
+    def broken(params_list):
+        raise RuntimeError('model crashed')
+    monkeypatch.setattr(zatta, 'generate_batch', broken)
+    zatta.run_generation_batch(batch, 'slow')
+    assert jobs_by_status(job_ids) == {('running', 'fast')}
+
+
+def test_running_batch_keeps_its_lease(client, monkeypatch):
+    job_ids = queue_jobs(client, 1)
+    batch = zatta.claim_generation_batch('worker')
+    claimed_at = zatta.GenerationJob.query.one().heartbeat_at
+    monkeypatch.setattr(zatta, 'GENERATION_HEARTBEAT_SECONDS', 0.05)
+    generate_batch = zatta.generate_batch
+    heartbeats = []
+    
+    def slow(params_list):
+        time.sleep(0.3)
+        heartbeats.append(zatta.db.session.query(zatta.GenerationJob.heartbeat_at).scalar())
+        return generate_batch(params_list)
+    monkeypatch.setattr(zatta, 'generate_batch', slow)
+    zatta.run_generation_batch(batch, 'worker')
+    
+    assert heartbeats[0] > claimed_at
+    assert jobs_by_status(job_ids) == {('completed', 'worker')}
+
+
+def test_default_titles_follow_the_counter_across_batches(client):
+    queue_jobs(client, 2, maqam='rast')
+    queue_jobs(client, 2, maqam='saba')
+    for _ in range(2):
+        zatta.run_generation_batch(zatta.claim_generation_batch('worker'), 'worker')
+    titles = sorted(song.title for song in zatta.GeneratedSong.query)
+    assert titles == [f'Generated Song {number}' for number in range(1, 5)]
@@ -0,0 +1,85 @@
+import io
+import json
+import tarfile
+import zipfile
+
+import app as zatta
+
+
+def tar_archive(files, mode='w:gz'):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def zip_archive(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def manifest(*lines):
+    return '\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines).encode('utf-8')
+
+
+def post_import(client, archive, **form):
+    return client.post('/api/songs/import', data={'archive': (io.BytesIO(archive), 'dataset.tar.gz'), **form},
+                       content_type='multipart/form-data')
+
+
+def test_import_reports_bad_entries_per_row(client):
+    archive = tar_archive({
+        # Audio ahead of the lyrics and manifest that name it
+        'audio/b.wav': b'RIFF' + b'\2' * 2048,
+        'audio/a.wav': b'RIFF' + b'\1' * 2048,
+        'lyrics/a.txt': 'كلمات أ'.encode('utf-8'),
+        'manifest.jsonl': manifest(
+            {'title': 'A', 'audio': 'audio/a.wav', 'lyrics_path': 'lyrics/a.txt', 'maqam': 'saba'},
+            [1, 2],
+            '{not json',
+            {'title': 'Missing', 'audio': 'audio/missing.wav', 'lyrics': 'x'},
+            {'title': 'B', 'audio': './audio/b.wav', 'lyrics': 'كلمات ب'},
+        ),
+    })
+    data = post_import(client, archive).get_json()
+    assert data['success'], data
+    assert data['summary'] == {'imported': 2, 'skipped': 0, 'failed': 3}
+    assert [r['status'] for r in data['results']] == ['imported', 'failed', 'failed', 'failed', 'imported']
+    assert data['results'][1]['error'] == 'Manifest entry must be an object'
+    
+    song = client.get(f"/api/songs/{data['results'][0]['song_id']}").get_json()['song']
+    assert (song['title'], song['maqam'], song['lyrics']) == ('A', 'saba', 'كلمات أ')
+    
+    # Re-sending the import skips what was imported
+    again = post_import(client, archive, import_id=data['import_id']).get_json()
+    assert again['summary'] == {'imported': 0, 'skipped': 2, 'failed': 3}
+
+
+def test_import_zip_with_separate_manifest(client):
+    archive = zip_archive({'a.wav': b'RIFF' + b'\3' * 2048})
+    response = client.post('/api/songs/import', data={
+        'archive': (io.BytesIO(archive), 'dataset.zip'),
+        'manifest': (io.BytesIO(b'title,audio,lyrics\nZ,a.wav,words\n'), 'manifest.csv'),
+    }, content_type='multipart/form-data')
+    assert response.get_json()['summary']['imported'] == 1
+
+
+def test_import_is_charged_a_bounded_share_of_the_byte_budget(client, monkeypatch):
+    held = 1024 * 1024
+    pool = zatta.AdmissionPool('transfer', 10, zatta.IMPORT_ADMISSION_BYTES + held, 0)
+    monkeypatch.setitem(zatta.admission_pools, 'transfer', pool)
+    pool.acquire(held)  # Another transfer in flight
+    
+    archive = tar_archive({
+        'big.wav': b'RIFF' + bytes(zatta.IMPORT_ADMISSION_BYTES),
+        'manifest.jsonl': manifest({'title': 'Big', 'audio': 'big.wav', 'lyrics': 'x'}),
+    }, mode='w')
+    response = post_import(client, archive)
+    assert response.status_code == 200
+    assert response.get_json()['summary']['imported'] == 1
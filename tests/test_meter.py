@@ -0,0 +1,70 @@
+import pytest
+
+import app as zatta
+
+TAWEEL = 'قِفَا نَبْكِ مِنْ ذِكْرَى حَبِيبٍ وَمَنْزِلِ\nبِسِقْطِ اللِّوَى بَيْنَ الدَّخُولِ فَحَوْمَلِ'
+BASEET = 'الخَيْلُ وَاللَّيْلُ وَالبَيْدَاءُ تَعْرِفُنِي\nوَالسَّيْفُ وَالرُّمْحُ وَالقِرْطَاسُ وَالقَلَمُ'
+
+
+@pytest.mark.parametrize('line, bahr', [
+    ('قِفَا نَبْكِ مِنْ ذِكْرَى حَبِيبٍ وَمَنْزِلِ', 'Taweel'),
+    ('هَلْ غَادَرَ الشُّعَرَاءُ مِنْ مُتَرَدَّمِ', 'Kamel'),
+    ('الخَيْلُ وَاللَّيْلُ وَالبَيْدَاءُ تَعْرِفُنِي', 'Basset'),
+    ('إِذَا الشَّعْبُ يَوْمًا أَرَادَ الحَيَاةَ', 'Motaqareb'),
+    # Hamzat wasl after a proclitic or opening a word
+    ('أَلَا هُبِّي بِصَحْنِكِ فَاصْبَحِينَا', 'Wafer'),
+    ('لَيْسَ مَنْ مَاتَ فَاسْتَرَاحَ بِمَيْتٍ', 'Khafeef'),
+    ('يَا خَلِيلَيَّ ارْبَعَا وَاسْتَنْطِقَا', 'Ramal'),
+])
+def test_classical_lines_scan_to_their_bahr(line, bahr):
+    assert zatta.analyse_meter_line(zatta.normalize_meter_line(line))[1] == (bahr,)
+
+
+@pytest.mark.parametrize('word, pattern', [
+    ('فَاصْبَحِينَا', '1011010'),
+    ('فَاسْتَرَاحَ', '101101'),
+    ('وَاسْتَنْطِقَا', '1010110'),
+    ('اسْتَمِعْ', '10110'),  # Opening the line, the hamza is pronounced
+])
+def test_hamzat_wasl_is_silent(word, pattern):
+    assert zatta.scan_meter_line(zatta.normalize_meter_line(word)) == pattern
+
+
+def test_wasl_shortens_a_long_vowel_before_it():
+    # yaa + irba'aa: the alef of "yaa" is shortened, the wasl alef dropped
+    assert zatta.scan_meter_line(zatta.normalize_meter_line('يَا ارْبَعَا')) == '10110'
+
+
+def test_changed_lyrics_refill_an_auto_filled_bahr(client, upload):
+    song_id = upload(lyrics=TAWEEL)
+    song = client.get(f'/api/songs/{song_id}').get_json()['song']
+    assert (song['poem_bahr'], song['detected_bahr']) == ('Taweel', 'Taweel')
+    
+    # The edit form sends the auto-filled value back unchanged
+    client.put(f'/api/songs/{song_id}', json={'lyrics': BASEET, 'poem_bahr': 'Taweel'})
+    song = client.get(f'/api/songs/{song_id}').get_json()['song']
+    assert (song['poem_bahr'], song['detected_bahr']) == ('Basset', 'Basset')
+    
+    # A bahr chosen by hand is kept
+    client.put(f'/api/songs/{song_id}', json={'poem_bahr': 'Kamel'})
+    client.put(f'/api/songs/{song_id}', json={'lyrics': TAWEEL})
+    song = client.get(f'/api/songs/{song_id}').get_json()['song']
+    assert (song['poem_bahr'], song['detected_bahr']) == ('Kamel', 'Taweel')
+
+
+def test_analyse_meters_redoes_songs_of_older_versions(app, client, upload):
+    current_id = upload(lyrics=TAWEEL)
+    stale_id = upload(lyrics=TAWEEL)
+    zatta.db.session.execute(zatta.db.update(zatta.Song).where(zatta.Song.id == stale_id).values(
+        meter_version=zatta.METER_VERSION - 1, detected_bahr='Kamel', poem_bahr='Kamel'))
+    zatta.db.session.commit()
+    versions = {song.id: song.version for song in zatta.Song.query}
+    
+    result = app.test_cli_runner().invoke(args=['analyse-meters'])
+    assert result.exit_code == 0, result.output
+    
+    zatta.db.session.expire_all()
+    stale, current = zatta.db.session.get(zatta.Song, stale_id), zatta.db.session.get(zatta.Song, current_id)
+    assert (stale.meter_version, stale.detected_bahr, stale.poem_bahr) == (zatta.METER_VERSION, 'Taweel', 'Taweel')
+    assert current.version == versions[current_id]
+    assert zatta.SearchDocument.query.filter_by(doc_type='song', doc_id=stale_id).one().poem_bahr == 'Taweel'
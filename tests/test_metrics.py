@@ -0,0 +1,32 @@
+import app as zatta
+
+SERIES = 'http_requests_total{endpoint="/api/songs/list",method="GET",status="200"} '
+
+
+# Current value of the list endpoint's request counter (counters live for the whole process)
+def list_requests(client):
+    body = client.get('/metrics').get_data(as_text=True)
+    return next((float(line[len(SERIES):]) for line in body.splitlines() if line.startswith(SERIES)), 0), body
+
+
+def test_metrics_count_requests_by_endpoint(client):
+    before, _ = list_requests(client)
+    client.get('/api/songs/list')
+    client.get('/api/songs/list')
+    after, body = list_requests(client)
+    assert after - before == 2
+    assert 'http_request_duration_seconds_bucket' in body
+    assert 'db_pool_' in body
+
+
+def test_slow_requests_are_logged_with_their_sql(client, monkeypatch):
+    monkeypatch.setitem(client.application.config, 'SLOW_REQUEST_SECONDS', 0)
+    logged = []
+    monkeypatch.setattr(zatta.logger, 'warning', lambda message, extra: logged.append((message, extra)))
+    client.get('/api/songs/list')
+    
+    message, extra = logged[-1]
+    assert message == 'Slow request'
+    assert extra['path'] == '/api/songs/list'
+    assert extra['db_queries'] == len(extra['sql']) > 0
+    assert all('sql' in query and 'seconds' in query for query in extra['sql'])
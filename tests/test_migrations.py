@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+import app as zatta
+
+
+def test_all_migrations_recorded(app):
+    versions = {version for (version,) in zatta.db.session.query(zatta.SchemaMigration.version)}
+    assert versions == {version for version, _, _ in zatta.MIGRATIONS}
+    assert zatta.run_migrations() == []
+
+
+def test_new_database_gets_sample_song(app):
+    assert zatta.Song.query.count() == 1
+    counters = dict(zatta.db.session.query(zatta.StatCounter.name, zatta.StatCounter.value))
+    assert counters['songs_count'] == 1
+
+
+def test_importing_the_app_touches_no_database(tmp_path):
+    database = tmp_path / 'untouched.db'
+    env = {**os.environ, 'DATABASE_URL': f'sqlite:///{database}'}
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=zatta.app.root_path, env=env, check=True)
+    assert not database.exists()
+
+
+def test_db_upgrade_applies_pending_migrations(app):
+    zatta.SchemaMigration.query.filter(zatta.SchemaMigration.version == 5).delete()
+    zatta.db.session.commit()
+    result = app.test_cli_runner().invoke(args=['db-upgrade'])
+    assert result.exit_code == 0, result.output
+    assert zatta.run_migrations() == []
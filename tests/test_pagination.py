@@ -0,0 +1,41 @@
+import app as zatta
+
+
+def test_list_pages_follow_cursor(client, upload):
+    ids = {upload(title=f'Song {i}') for i in range(5)}
+    seen, cursor = [], None
+    while True:
+        response = client.get('/api/songs/list', query_string={'limit': 2, **({'cursor': cursor} if cursor else {})})
+        data = response.get_json()
+        seen += [song['id'] for song in data['songs']]
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) == 6  # Five uploads and the sample song
+    assert ids < set(seen)
+
+
+def test_rows_without_created_at_are_listed_with_the_oldest(client, upload):
+    legacy_id = upload(title='Legacy')
+    newer_id = upload(title='Newer')
+    zatta.db.session.execute(zatta.db.update(zatta.Song).where(zatta.Song.id == legacy_id).values(created_at=None))
+    zatta.db.session.commit()
+    zatta.fill_missing_created_at()
+    
+    pages = [client.get('/api/songs/list', query_string={'limit': 1}).get_json()]
+    while pages[-1]['next_cursor']:
+        pages.append(client.get('/api/songs/list', query_string={'limit': 1, 'cursor': pages[-1]['next_cursor']}).get_json())
+    order = [page['songs'][0]['id'] for page in pages]
+    assert len(order) == 3
+    assert order.index(newer_id) < order.index(legacy_id)
+
+
+def test_list_projection_and_filters(client, upload):
+    upload(title='Saba song', maqam='saba')
+    upload(title='Rast song', maqam='rast')
+    
+    data = client.get('/api/songs/list', query_string={'maqam': 'saba', 'fields': 'title,maqam'}).get_json()
+    assert data['songs'] == [{'id': data['songs'][0]['id'], 'title': 'Saba song', 'maqam': 'saba'}]
+    
+    assert client.get('/api/songs/list', query_string={'fields': 'nope'}).status_code == 400
+    assert client.get('/api/songs/list', query_string={'cursor': 'garbage'}).status_code == 400
@@ -0,0 +1,26 @@
+import app as zatta
+
+
+def test_worker_computes_peaks(client, upload, sine_wav):
+    song_id = upload(audio=sine_wav())
+    url = f'/api/songs/{song_id}/peaks'
+    assert client.get(url).status_code == 202  # Queued for the worker
+    zatta.extract_features(zatta.claim_feature_extraction('test-worker'), 'test-worker')
+    
+    response = client.get(url, query_string={'resolution': 256})
+    assert response.mimetype == 'application/octet-stream'
+    assert len(response.data) == 2 * 256
+    assert min(response.data[1::2]) > 50  # Half-scale sine: every bucket peaks near 0.5
+    assert client.get(url, headers={'If-None-Match': response.headers['ETag']}, query_string={'resolution': 256}).status_code == 304
+    
+    data = client.get(url, query_string={'format': 'json', 'bits': 16}).get_json()
+    assert len(data['peaks']) == 2 * zatta.DEFAULT_PEAK_RESOLUTION
+    assert client.get(url, query_string={'resolution': 7}).status_code == 400
+
+
+def test_peaks_of_failed_extraction_are_not_found(client, upload):
+    song_id = upload(audio=b'not audio at all')
+    zatta.extract_features(zatta.claim_feature_extraction('test-worker'), 'test-worker')
+    response = client.get(f'/api/songs/{song_id}/peaks')
+    assert response.status_code == 404
+    assert response.get_json()['status'] == 'failed'
@@ -0,0 +1,55 @@
+import pytest
+
+import app as zatta
+
+LONG_LYRICS = 'يا ليل الصب متى غده\n' * 100
+
+
+def test_json_responses_are_serialised_with_orjson(client, monkeypatch):
+    pytest.importorskip('orjson')
+    calls = []
+    dumps_bytes = zatta.FastJSONProvider.dumps_bytes
+    monkeypatch.setattr(zatta.FastJSONProvider, 'dumps_bytes', lambda self, obj: calls.append(obj) or dumps_bytes(self, obj))
+    
+    response = client.get('/health')
+    assert calls == [{'status': 'healthy'}]
+    assert response.data == b'{"status":"healthy"}\n'
+    assert response.mimetype == 'application/json'
+
+
+def test_compressed_song_has_its_own_etag(client, upload):
+    song_id = upload(lyrics=LONG_LYRICS)
+    plain = client.get(f'/api/songs/{song_id}')
+    compressed = client.get(f'/api/songs/{song_id}', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    etag = compressed.headers['ETag']
+    assert etag == plain.headers['ETag'][:-1] + '-gzip"'
+    
+    # Either validator revalidates and authorises an update
+    response = client.get(f'/api/songs/{song_id}', headers={'If-None-Match': etag, 'Accept-Encoding': 'gzip'})
+    assert response.status_code == 304
+    response = client.get(f'/api/songs/{song_id}', headers={'If-None-Match': plain.headers['ETag']})
+    assert response.status_code == 304
+    response = client.put(f'/api/songs/{song_id}', json={'title': 'Renamed'}, headers={'If-Match': etag})
+    assert response.status_code == 200
+    response = client.put(f'/api/songs/{song_id}', json={'title': 'Again'}, headers={'If-Match': etag})
+    assert response.status_code == 412
+
+
+def test_etag_matches_strips_only_known_codings(app):
+    from werkzeug.http import parse_etags
+    assert zatta.etag_matches(parse_etags('"abc-br"'), 'abc')
+    assert zatta.etag_matches(parse_etags('W/"abc-gzip"'), 'abc', weak=True)
+    assert not zatta.etag_matches(parse_etags('W/"abc-gzip"'), 'abc')
+    assert not zatta.etag_matches(parse_etags('"abc-zstd"'), 'abc')
+    assert zatta.etag_matches(parse_etags('*'), 'abc')
+
+
+def test_list_in_columns(client, upload):
+    upload(title='Saba song', maqam='saba')
+    upload(title='Rast song', maqam='rast')
+    
+    data = client.get('/api/songs/list', query_string={'fields': 'title', 'format': 'columns'}).get_json()
+    assert data['fields'] == ['id', 'title']
+    assert [row[1] for row in data['rows']][:2] == ['Rast song', 'Saba song']
@@ -0,0 +1,61 @@
+import math
+
+import app as zatta
+
+
+def test_search_matches_normalised_arabic(client, upload):
+    song_id = upload(title='Night', lyrics='يا لَيْلُ الصَّبُّ مَتَى غَدُهُ\nأَقِيامُ السّاعَةِ مَوْعِدُهُ')
+    
+    # Without diacritics, and with the hamza variant of alef
+    results = client.get('/api/search', query_string={'q': 'اقيام الساعة'}).get_json()['results']
+    assert results[0]['id'] == song_id
+    assert results[0]['snippet'] == 'أَقِيامُ السّاعَةِ مَوْعِدُهُ'
+    
+    client.delete(f'/api/songs/{song_id}')
+    assert client.get('/api/search', query_string={'q': 'موعده'}).get_json()['results'] == []
+
+
+def test_rebuilding_stats_keeps_the_search_counters(client, upload):
+    upload(lyrics='كلمات الأغنية الجديدة')
+    before = dict(zatta.db.session.query(zatta.StatCounter.name, zatta.StatCounter.value))
+    zatta.rebuild_stats()
+    after = dict(zatta.db.session.query(zatta.StatCounter.name, zatta.StatCounter.value))
+    assert after['search_documents'] == before['search_documents'] == 2
+    assert after['search_terms'] == before['search_terms']
+    assert client.get('/api/search', query_string={'q': 'الجديده'}).get_json()['results']
+
+
+def reference_bm25(doc_terms, query_terms):
+    total_docs = len(doc_terms)
+    avg_length = sum(len(terms) for terms in doc_terms.values()) / total_docs
+    scores = {}
+    for term in query_terms:
+        matching = [key for key, terms in doc_terms.items() if term in terms]
+        idf = math.log(1 + (total_docs - len(matching) + 0.5) / (len(matching) + 0.5))
+        for key in matching:
+            tf, length = doc_terms[key].count(term), len(doc_terms[key])
+            scores[key] = scores.get(key, 0) + idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * length / avg_length))
+    return scores
+
+
+def test_ranking_and_limit_run_in_the_database(client, upload):
+    ids = [upload(title=f'Song {i}', lyrics='يا الله ' * (i + 1) + 'كلمات') for i in range(4)]
+    rare_id = upload(title='Rare', lyrics='يا الله يا قمر')
+    
+    data = client.get('/api/search', query_string={'q': 'الله قمر', 'limit': 3}).get_json()
+    results = data['results']
+    assert len(results) == 3
+    assert results[0]['id'] == rare_id
+    assert results[0]['matched_terms'] == data['terms']
+    
+    docs = {(doc.doc_type, doc.doc_id): [] for doc in zatta.SearchDocument.query}
+    for posting in zatta.SearchPosting.query:
+        docs[(posting.doc_type, posting.doc_id)] += [posting.term] * posting.tf
+    expected = reference_bm25(docs, data['terms'])
+    assert [result['score'] for result in results] == sorted(
+        (round(score, 4) for score in expected.values()), reverse=True)[:3]
+    
+    matched_all = client.get('/api/search', query_string={'q': 'الله قمر', 'match': 'all'}).get_json()['results']
+    assert [result['id'] for result in matched_all] == [rare_id]
+    assert {result['id'] for result in client.get(
+        '/api/search', query_string={'q': 'كلمات', 'limit': 100}).get_json()['results']} == set(ids)
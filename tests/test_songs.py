@@ -0,0 +1,36 @@
+def test_get_song_revalidates_with_etag(client, upload):
+    song_id = upload()
+    response = client.get(f'/api/songs/{song_id}')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    
+    response = client.get(f'/api/songs/{song_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+
+def test_update_with_stale_if_match_is_refused(client, upload):
+    song_id = upload()
+    etag = client.get(f'/api/songs/{song_id}').headers['ETag']
+    
+    response = client.put(f'/api/songs/{song_id}', json={'title': 'First'}, headers={'If-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    
+    response = client.put(f'/api/songs/{song_id}', json={'title': 'Second'}, headers={'If-Match': etag})
+    assert response.status_code == 412
+    assert client.get(f'/api/songs/{song_id}').get_json()['song']['title'] == 'First'
+
+
+def test_get_missing_song_is_not_found(client):
+    assert client.get('/api/songs/999').status_code == 404
+
+
+def test_update_without_if_match_bumps_the_version(client, upload):
+    song_id = upload()
+    etag = client.get(f'/api/songs/{song_id}').headers['ETag']
+    
+    response = client.put(f'/api/songs/{song_id}', json={'title': 'Renamed'})
+    assert response.status_code == 200
+    response = client.get(f'/api/songs/{song_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['song']['title'] == 'Renamed'
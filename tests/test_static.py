@@ -0,0 +1,31 @@
+import gzip
+import os
+
+import app as zatta
+
+
+def test_frontend_is_served_compressed_and_revalidated(client):
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    response = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    
+    # Client-side routes get the page; unknown files and API paths do not
+    assert client.get('/library').status_code == 200
+    assert client.get('/missing.js').status_code == 404
+    assert client.get('/api/nope').status_code == 404
+
+
+def test_hashed_assets_are_immutable_and_stale_precompressed_files_ignored(client, tmp_path, monkeypatch):
+    script = b'console.log("zatta");\n' * 100
+    (tmp_path / 'app.3f9a1c2b.js').write_bytes(script)
+    (tmp_path / 'app.3f9a1c2b.js.gz').write_bytes(b'stale')
+    os.utime(tmp_path / 'app.3f9a1c2b.js.gz', (0, 0))  # Older than its source
+    monkeypatch.setattr(zatta, 'static_manifest', zatta.load_static_manifest(str(tmp_path)))
+    
+    response = client.get('/app.3f9a1c2b.js', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Cache-Control'] == f'public, max-age={zatta.STATIC_IMMUTABLE_MAX_AGE}, immutable'
+    assert gzip.decompress(response.data) == script
+    assert client.get('/app.3f9a1c2b.js').data == script
@@ -0,0 +1,25 @@
+import app as zatta
+
+
+def counters():
+    return {name: value for name, value in zatta.db.session.query(zatta.StatCounter.name, zatta.StatCounter.value)}
+
+
+def test_dashboard_stats_follow_uploads_edits_and_deletes(client, upload):
+    song_id = upload(maqam='saba', region='gulf', audio=b'RIFF' + bytes(1000))
+    stats = client.get('/api/dashboard/stats').get_json()['stats']
+    assert stats['songs_count'] == 2  # With the sample song
+    assert stats['maqam_counts']['saba'] == 1
+    
+    client.put(f'/api/songs/{song_id}', json={'maqam': 'rast'})
+    stats = client.get('/api/dashboard/stats').get_json()['stats']
+    assert 'saba' not in stats['maqam_counts']
+    assert stats['maqam_counts']['rast'] == 1
+    
+    client.delete(f'/api/songs/{song_id}')
+    stats = client.get('/api/dashboard/stats').get_json()['stats']
+    assert stats['songs_count'] == 1
+    assert 'rast' not in stats['maqam_counts']
+    before = counters()
+    zatta.rebuild_stats()
+    assert {k: v for k, v in counters().items() if v} == {k: v for k, v in before.items() if v}
@@ -0,0 +1,53 @@
+import uuid
+
+import app as zatta
+
+
+def add_session(status):
+    session = zatta.TrainingSession(session_id=str(uuid.uuid4()), status=status)
+    zatta.db.session.add(session)
+    zatta.db.session.commit()
+    return session
+
+
+def events(response):
+    return [block for block in response.get_data(as_text=True).split('\n\n') if block]
+
+
+def test_stream_ends_on_terminal_status(client):
+    add_session('completed')
+    response = client.get('/api/training/stream')
+    blocks = events(response)
+    assert blocks[0].startswith('retry: ')
+    assert blocks[1].startswith('event: progress\nid: ')
+    assert '"completed"' in blocks[1]
+    assert blocks[-1].startswith('event: end')
+
+
+def test_reconnect_after_end_closes_at_once(client):
+    add_session('stopped')
+    token = zatta.status_token(zatta.read_training_status())
+    response = client.get('/api/training/stream', headers={'Last-Event-ID': token})
+    blocks = events(response)
+    assert [block.split('\n')[0] for block in blocks] == [blocks[0], 'event: end']
+
+
+def test_stream_of_active_session_is_bounded(client, monkeypatch):
+    monkeypatch.setattr(zatta, 'TRAINING_STREAM_SECONDS', 2)
+    add_session('training')
+    blocks = events(client.get('/api/training/stream'))
+    assert blocks[1].startswith('event: progress')
+    assert not any(block.startswith('event: end') for block in blocks)
+
+
+def test_streams_beyond_the_limit_are_refused(client, monkeypatch):
+    monkeypatch.setitem(zatta.admission_pools, 'stream', zatta.AdmissionPool('stream', 1, 0, 0))
+    add_session('training')
+    first = client.get('/api/training/stream', buffered=False)
+    try:
+        response = client.get('/api/training/stream')
+        assert response.status_code == 503
+        assert 'Retry-After' in response.headers
+    finally:
+        first.close()
+    assert zatta.admission_pools['stream'].in_flight == 0
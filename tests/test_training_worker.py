@@ -0,0 +1,48 @@
+import json
+
+import app as zatta
+
+
+def test_claimed_session_trains_to_completion_with_checkpoints(client, monkeypatch):
+    monkeypatch.setattr(zatta, 'TRAINING_STEP_SECONDS', 0)
+    session_id = client.post('/api/training/start', json={'epochs': 2, 'batch_size': 1}).get_json()['session_id']
+    
+    assert zatta.claim_training_session('worker') == session_id
+    assert zatta.claim_training_session('other') is None
+    zatta.train_session(session_id, 'worker')
+    
+    session = zatta.TrainingSession.query.filter_by(session_id=session_id).one()
+    assert (session.status, session.progress) == ('completed', 100)
+    assert json.loads(session.checkpoint)['epoch'] == 2
+
+
+def test_one_active_session_per_model(client):
+    assert client.post('/api/training/start', json={}).status_code == 200
+    response = client.post('/api/training/start', json={})
+    assert response.status_code == 409
+    assert client.post('/api/training/start', json={'model_name': 'other'}).status_code == 200
+
+
+def test_stopped_session_is_resumed_from_its_checkpoint(client):
+    session_id = client.post('/api/training/start', json={'epochs': 3}).get_json()['session_id']
+    zatta.claim_training_session('worker')
+    zatta.report_training_progress(session_id, 'worker', current_epoch=1, checkpoint=json.dumps({'epoch': 1}))
+    assert client.post('/api/training/stop').status_code == 200
+    assert not zatta.report_training_progress(session_id, 'worker', progress=50)  # The worker sees the stop
+    
+    assert client.post('/api/training/resume', json={}).get_json()['session_id'] == session_id
+    assert zatta.claim_training_session('next') == session_id
+
+
+def test_legacy_training_sessions_are_stopped_before_the_index(app):
+    zatta.db.session.execute(zatta.db.text('DROP INDEX uq_training_sessions_active_model'))
+    for session_id in ('legacy-1', 'legacy-2'):
+        zatta.db.session.add(zatta.TrainingSession(session_id=session_id, status='training'))
+    zatta.SchemaMigration.query.filter(zatta.SchemaMigration.version.in_([4, 10])).delete()
+    zatta.db.session.commit()
+    
+    assert zatta.run_migrations() == [4, 10]
+    assert {session.status for session in zatta.TrainingSession.query} == {'stopped'}
+    assert 'uq_training_sessions_active_model' in {
+        index['name'] for index in zatta.db.inspect(zatta.db.engine).get_indexes('training_sessions')}
+    assert zatta.claim_training_session('worker') is None
@@ -0,0 +1,30 @@
+import io
+
+import app as zatta
+
+
+def test_identical_uploads_share_one_stored_file(client, upload):
+    audio = b'RIFF' + bytes(range(256)) * 300
+    first = upload(title='First', audio=audio)
+    response = client.post('/api/songs/upload', data={
+        'title': 'Second',
+        'audio_file': (io.BytesIO(audio), 'second.wav'),
+        'lyrics_file': (io.BytesIO('كلمات'.encode('utf-8')), 'lyrics.txt'),
+    }, content_type='multipart/form-data')
+    assert response.get_json()['deduplicated'] is True
+    
+    assert zatta.AudioContent.query.count() == 1
+    assert zatta.AudioContent.query.one().ref_count == 2
+    client.delete(f'/api/songs/{first}')
+    assert zatta.AudioContent.query.one().ref_count == 1
+    assert client.get(f"/api/songs/{response.get_json()['song_id']}/download_audio").data == audio
+
+
+def test_large_upload_is_stored_in_chunks(client, upload):
+    audio = bytes(range(256)) * (2 * zatta.AUDIO_CHUNK_SIZE // 256 + 1)
+    song_id = upload(audio=audio)
+    
+    sha256 = zatta.db.session.get(zatta.Song, song_id).audio_sha256
+    chunks = zatta.AudioChunk.query.filter_by(sha256=sha256).order_by(zatta.AudioChunk.seq).all()
+    assert [len(chunk.data) for chunk in chunks] == [zatta.AUDIO_CHUNK_SIZE, zatta.AUDIO_CHUNK_SIZE, 256]
+    assert zatta.db.session.get(zatta.AudioContent, sha256).size == len(audio)